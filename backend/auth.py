@@ -0,0 +1,193 @@
+"""auth.py — HMAC-signed session tokens checked on every request
+
+Signature, expiry and revocation are checked in memory. Logouts are stored
+in the revoked_tokens table; each worker process keeps the revocations in a
+bounded LRU and reads the rows added by other workers at most every
+REVOCATION_REFRESH_INTERVAL seconds, so a token check never waits on SQLite.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from flask import g, jsonify, request
+from werkzeug.exceptions import Forbidden, Unauthorized
+from db import get_db_connection
+
+# Set MARKETPLACE_TOKEN_SECRET in production: the random fallback changes on
+# every restart (logging everyone out) and is only shared by workers forked
+# from the process that imported this module.
+TOKEN_SECRET = os.environ.get('MARKETPLACE_TOKEN_SECRET', '').encode() or secrets.token_bytes(32)
+TOKEN_TTL = int(os.environ.get('MARKETPLACE_TOKEN_TTL', str(24 * 60 * 60)))
+REVOKED_TOKENS_MAX = int(os.environ.get('MARKETPLACE_REVOKED_TOKENS_MAX', '10000'))
+# Longest a logout in one worker goes unnoticed by the others
+REVOCATION_REFRESH_INTERVAL = float(
+    os.environ.get('MARKETPLACE_REVOCATION_REFRESH_INTERVAL', '1')
+)
+REQUIRE_AUTH = os.environ.get('MARKETPLACE_REQUIRE_AUTH', '').lower() in ('1', 'true', 'yes')
+
+
+def _sign(payload):
+    digest = hmac.digest(TOKEN_SECRET, payload.encode(), hashlib.sha256)
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+
+def issue_token(user_id, ttl=None):
+    """Signed token '<user id>.<expires>.<token id>.<signature>'; returns (token, expires)"""
+    expires = int(time.time()) + (TOKEN_TTL if ttl is None else ttl)
+    payload = f'{user_id}.{expires}.{secrets.token_hex(8)}'
+    return f'{payload}.{_sign(payload)}', expires
+
+
+def verify_token(token):
+    """(user_id, token_id, expires) for a valid, unexpired, unrevoked token, else None"""
+    payload, _, signature = token.rpartition('.')
+    # Compared as bytes: compare_digest refuses str with non-ASCII characters
+    if not hmac.compare_digest(_sign(payload).encode(), signature.encode('utf-8', 'replace')):
+        return None
+    try:
+        user_id, expires, token_id = payload.split('.')
+        user_id, expires = int(user_id), int(expires)
+    except ValueError:
+        return None
+    if expires < time.time():
+        return None
+    revoked_tokens.refresh()
+    if token_id in revoked_tokens:
+        return None
+    return user_id, token_id, expires
+
+
+class RevokedTokens:
+    """LRU of revoked token ids, each kept until the token would have expired anyway
+
+    Only the newest max_entries revocations are remembered; tokens are
+    short-lived, so the bound is sized for revocations within one TTL.
+    """
+
+    def __init__(self, max_entries=REVOKED_TOKENS_MAX):
+        self.max_entries = max_entries
+        # Newest revoked_tokens id read, and when that was (monotonic)
+        self.synced_id = 0
+        self.synced_at = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._syncing = threading.Lock()
+
+    def add(self, token_id, expires):
+        """Remember a revoked token id until expires"""
+        with self._lock:
+            self._entries[token_id] = expires
+            self._entries.move_to_end(token_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def refresh(self, interval=REVOCATION_REFRESH_INTERVAL):
+        """Read the revocations other processes stored, if not done in the last interval seconds
+
+        One request per interval does the read; the others carry on with what
+        is already in memory rather than wait for it.
+        """
+        now = time.monotonic()
+        if self.synced_at is not None and now - self.synced_at < interval:
+            return
+        if not self._syncing.acquire(blocking=False):
+            return
+        try:
+            conn = get_db_connection()
+            try:
+                rows = conn.execute(
+                    'SELECT id, token_id, expires FROM revoked_tokens WHERE id > ? ORDER BY id',
+                    (self.synced_id,)
+                ).fetchall()
+            finally:
+                conn.close()
+            for row_id, token_id, expires in rows:
+                self.add(token_id, expires)
+                self.synced_id = row_id
+            self.synced_at = now
+        finally:
+            self._syncing.release()
+
+    def __contains__(self, token_id):
+        with self._lock:
+            expires = self._entries.get(token_id)
+            if expires is None:
+                return False
+            if expires < time.time():
+                del self._entries[token_id]
+                return False
+            self._entries.move_to_end(token_id)
+            return True
+
+    def __len__(self):
+        return len(self._entries)
+
+
+revoked_tokens = RevokedTokens()
+
+
+def revoke_token(token_id, expires):
+    """Refuse token_id in every process until it expires, pruning expired revocations"""
+    conn = get_db_connection()
+    try:
+        with conn:
+            conn.execute('DELETE FROM revoked_tokens WHERE expires < ?', (int(time.time()),))
+            conn.execute('INSERT OR REPLACE INTO revoked_tokens (token_id, expires) VALUES (?, ?)',
+                         (token_id, expires))
+    finally:
+        conn.close()
+    revoked_tokens.add(token_id, expires)
+
+
+def load_token_user():
+    """before_request: put the bearer token's user on g.user_id (None without a token)"""
+    g.user_id = g.token_id = None
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+
+    claims = verify_token(token.strip())
+    if claims is None:
+        return jsonify({"message": "Invalid or expired token"}), 401
+    g.user_id, g.token_id, g.token_expires = claims
+    return None
+
+
+def token_allows(user_id):
+    """Whether this request may act as user_id
+
+    Requests with a token may only act as its user. Requests without one
+    keep trusting the ids in their body unless MARKETPLACE_REQUIRE_AUTH is set.
+    """
+    if g.get('user_id') is None:
+        return not REQUIRE_AUTH
+    try:
+        return int(user_id) == g.user_id
+    except (TypeError, ValueError):
+        return False
+
+
+def authorize(user_id):
+    """Abort with 401/403 unless this request may act as user_id"""
+    if token_allows(user_id):
+        return
+    if g.get('user_id') is None:
+        raise Unauthorized("Authentication required")
+    raise Forbidden("This token belongs to another user")
+
+
+def auth_error(error):
+    """JSON body for the 401/403 raised by authorize"""
+    return jsonify({"message": error.description}), error.code
+
+
+def init_app(app):
+    """Verify bearer tokens before every request of app"""
+    app.before_request(load_token_user)
+    app.register_error_handler(Unauthorized, auth_error)
+    app.register_error_handler(Forbidden, auth_error)
@@ -0,0 +1,269 @@
+"""browse.py — Filtered browsing of available listings with facet counts
+
+/browse-listings pages through the available listings matching any mix of
+category, condition, location, seller and price filters, and counts the
+listings per value of each filter for a browse sidebar. Facet counts are
+cached per filter set until a listing changes.
+"""
+
+import json
+import sqlite3
+from flask import Blueprint, jsonify, request
+from db import get_db_connection
+from versioning import current_versions, versioned
+from cache import cached, response_cache
+from listings import listing_json, spliced_response
+from pagination import DEFAULT_PAGE_SIZE, decode_cursor, encode_cursor, parse_page_args
+
+browse_bp = Blueprint('browse', __name__)
+
+# /browse-listings filters: query parameter -> items column. Each can be
+# repeated to match any of its values
+BROWSE_FILTERS = {'category': 'category', 'condition': 'condition',
+                  'location': 'location', 'seller_id': 'seller_id'}
+PRICE_FILTERS = ('min_price', 'max_price')
+# Upper bounds of the price facet's buckets; the last bucket is open-ended
+PRICE_BUCKETS = (25, 50, 100, 250, 500)
+# Most values listed per facet, the most common first
+FACET_LIMIT = 20
+# Covering partial indexes counted by a facet when no other column filter
+# applies (price is in each). The planner would otherwise walk
+# idx_items_status_date_posted and sort
+FACET_INDEXES = {'category': 'idx_items_available_category',
+                 'condition': 'idx_items_available_condition',
+                 'location': 'idx_items_available_location',
+                 'seller_id': 'idx_items_available_seller',
+                 'price': 'idx_items_available_condition'}
+
+
+def parse_browse_filters(args):
+    """The /browse-listings filters in args as a hashable signature
+
+    A tuple of (name, value) pairs in a fixed order with multi-valued
+    filters sorted, so the same filters always give the same signature.
+    Raises ValueError for a seller_id or price that is not a number.
+    """
+    filters = []
+    for name in BROWSE_FILTERS:
+        values = args.getlist(name)
+        if name == 'seller_id':
+            try:
+                values = [int(value) for value in values]
+            except ValueError as error:
+                raise ValueError("seller_id must be an integer") from error
+        if values:
+            filters.append((name, tuple(sorted(set(values)))))
+    for name in PRICE_FILTERS:
+        if args.get(name) is not None:
+            try:
+                filters.append((name, float(args[name])))
+            except ValueError as error:
+                raise ValueError(f"{name} must be a number") from error
+    return tuple(filters)
+
+
+def filter_conditions(filters, skip=()):
+    """(SQL, parameters) of the filters as AND conditions on items i, except those in skip"""
+    sql, params = '', []
+    for name, value in filters:
+        if name in skip:
+            continue
+        if name in PRICE_FILTERS:
+            sql += f" AND i.price {'>=' if name == 'min_price' else '<='} ?"
+            params.append(value)
+        else:
+            sql += f" AND i.{BROWSE_FILTERS[name]} IN ({', '.join('?' for _ in value)})"
+            params.extend(value)
+    return sql, params
+
+
+def facet_source(facet, filters):
+    """FROM clause of a facet count, pinned to its covering index when it can answer it"""
+    if any(name not in (facet, *PRICE_FILTERS) for name, _ in filters):
+        return 'items i'
+    return f'items i INDEXED BY {FACET_INDEXES[facet]}'
+
+
+def browse_facets(conn, filters):
+    """Available listings counted per value of each filter, as JSON text
+
+    Each dimension is counted with every filter but its own applied, so the
+    counts say what picking another value of it would give.
+    """
+    facets = {}
+    for name, column in BROWSE_FILTERS.items():
+        where, params = filter_conditions(filters, (name,))
+        rows = conn.execute(
+            f'''SELECT i.{column} AS value, COUNT(*) AS count FROM {facet_source(name, filters)}
+                WHERE i.status = 'available' AND i.{column} IS NOT NULL{where}
+                GROUP BY i.{column} ORDER BY count DESC, value LIMIT ?''',
+            [*params, FACET_LIMIT]
+        ).fetchall()
+        facets[name] = [dict(row) for row in rows]
+
+    sellers = facets['seller_id']
+    names = dict(conn.execute(
+        f"SELECT id, username FROM users WHERE id IN ({', '.join('?' for _ in sellers)})",
+        [seller['value'] for seller in sellers]
+    ).fetchall())
+    for seller in sellers:
+        seller['seller_name'] = names.get(seller['value'])
+
+    bucket = ' '.join(f'WHEN i.price < {bound} THEN {number}'
+                      for number, bound in enumerate(PRICE_BUCKETS))
+    where, params = filter_conditions(filters, PRICE_FILTERS)
+    counts = dict(conn.execute(
+        f'''SELECT CASE {bucket} ELSE {len(PRICE_BUCKETS)} END AS bucket, COUNT(*)
+            FROM {facet_source('price', filters)} WHERE i.status = 'available'{where}
+            GROUP BY bucket''',
+        params
+    ).fetchall())
+    bounds = (0, *PRICE_BUCKETS, None)
+    facets['price'] = [{'min': bounds[number], 'max': bounds[number + 1],
+                        'count': counts.get(number, 0)}
+                       for number in range(len(PRICE_BUCKETS) + 1)]
+    return json.dumps(facets)
+
+
+def cached_browse_facets(conn, filters):
+    """browse_facets, from response_cache while no listing has changed
+
+    Keyed by the filters alone, so every page and page size of a browse
+    shares one computation.
+    """
+    key = ('browse-facets', filters)
+    versions = tuple(current_versions(['items']))
+    facets = response_cache.get(key, versions)
+    if facets is None:
+        facets = browse_facets(conn, filters)
+        response_cache.put(key, versions, facets)
+    return facets
+
+
+@browse_bp.route('/browse-listings', methods=['GET'])
+@versioned(lambda: ['items'])
+@cached(lambda: ['items'])
+def browse_listings():
+    """
+    Browse Listings
+    ---
+    tags:
+      - Listings
+    summary: Filter available listings, with facet counts for a browse sidebar
+    description: >
+      Available listings matching every given filter, newest first, paged
+      like /get-all-listings. category, condition, location and seller_id
+      can be repeated to match any of their values. facets counts the
+      listings per value of each filter (and per price bucket) with all the
+      other filters applied.
+    parameters:
+      - name: category
+        in: query
+        type: string
+        required: false
+        example: "Electronics"
+      - name: condition
+        in: query
+        type: string
+        required: false
+        example: "Good"
+      - name: location
+        in: query
+        type: string
+        required: false
+        example: "Campus Library"
+      - name: seller_id
+        in: query
+        type: integer
+        required: false
+      - name: min_price
+        in: query
+        type: number
+        required: false
+        example: 10
+      - name: max_price
+        in: query
+        type: number
+        required: false
+        example: 100
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Page size (1-100, default 20)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Opaque cursor taken from next_cursor of the previous page
+    responses:
+      200:
+        description: Matching listings and facet counts
+        schema:
+          type: object
+          properties:
+            listings:
+              type: array
+              description: Listings, as returned by /get-all-listings
+              items:
+                type: object
+            facets:
+              type: object
+              description: >
+                category, condition, location and seller_id map to lists of
+                {value, count} (seller_id entries also carry seller_name);
+                price is a list of {min, max, count} buckets
+            total_count:
+              type: integer
+              example: 20
+            next_cursor:
+              type: string
+              description: Cursor for the next page, null on the last page
+      304:
+        description: Not modified since the ETag sent in If-None-Match
+      400:
+        description: Invalid filter, limit or cursor
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "min_price must be a number"
+      500:
+        description: Database error
+    """
+    try:
+        filters = parse_browse_filters(request.args)
+        limit, page_cursor = parse_page_args(request.args, DEFAULT_PAGE_SIZE)
+
+        conn = get_db_connection()
+        where, params = filter_conditions(filters)
+        sql = f'''
+        SELECT i.id, i.date_posted, i.listing_json
+        FROM items i
+        WHERE i.status = 'available'{where}
+        '''
+        if page_cursor:
+            sql += ' AND (i.date_posted, i.id) < (?, ?)'
+            params.extend(decode_cursor(page_cursor, 2))
+        sql += ' ORDER BY i.date_posted DESC, i.id DESC LIMIT ?'
+        params.append(limit + 1)
+        items = conn.execute(sql, params).fetchall()
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor(items[-1]['date_posted'], items[-1]['id'])
+        facets = cached_browse_facets(conn, filters)
+        conn.close()
+        return spliced_response(
+            "listings", [listing_json(item) for item in items],
+            raw_fields={"facets": facets},
+            total_count=len(items),
+            next_cursor=next_cursor
+        )
+    except ValueError as filter_error:
+        # PaginationError included
+        return jsonify({"error": str(filter_error)}), 400
+    except sqlite3.Error as db_error:
+        return jsonify({"error": f"Database error: {str(db_error)}"}), 500
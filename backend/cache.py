@@ -0,0 +1,127 @@
+"""cache.py — In-process TTL + LRU cache for rendered JSON responses"""
+
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import Response, request
+from versioning import current_versions
+
+CACHE_TTL = float(os.environ.get('MARKETPLACE_CACHE_TTL', '30'))
+CACHE_MAX_ENTRIES = int(os.environ.get('MARKETPLACE_CACHE_MAX_ENTRIES', '1024'))
+CACHE_MAX_BYTES = int(os.environ.get('MARKETPLACE_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+
+
+class ResponseCache:
+    """Bounded cache of response bodies tagged with the data versions they were built from
+
+    An entry is only served while its versions still match the current
+    data_versions counters, so any write to the underlying data (from this
+    process or another one) invalidates exactly the entries built from it.
+    """
+
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._counters = dict.fromkeys(
+            ('hits', 'misses', 'evictions', 'invalidations', 'expirations'), 0
+        )
+
+    def get(self, key, versions):
+        """Return the cached body for key if it is fresh and built from versions"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            stored_versions, expires_at, body = entry
+            if stored_versions != versions:
+                self._drop(key)
+                self._counters['invalidations'] += 1
+                self._counters['misses'] += 1
+                return None
+            if expires_at < time.monotonic():
+                self._drop(key)
+                self._counters['expirations'] += 1
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return body
+
+    def put(self, key, versions, body):
+        """Store a body, evicting least recently used entries to stay within bounds"""
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (versions, time.monotonic() + self.ttl, body)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._counters['evictions'] += 1
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Counters for tuning the cache size and TTL"""
+        with self._lock:
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl
+            }
+
+    def _drop(self, key):
+        _, _, body = self._entries.pop(key)
+        self._bytes -= len(body)
+
+
+response_cache = ResponseCache()
+
+
+def cached(scopes_for_request):
+    """Serve a view's 200 JSON responses from response_cache
+
+    The key is the endpoint, its path arguments and the query arguments;
+    scopes_for_request() names the data_versions scopes the body depends on.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            scopes = scopes_for_request()
+            if not scopes:
+                return view(*args, **kwargs)
+
+            key = (
+                request.endpoint,
+                tuple(sorted(kwargs.items())),
+                tuple(sorted(request.args.items(multi=True)))
+            )
+            versions = tuple(current_versions(scopes))
+
+            body = response_cache.get(key, versions)
+            if body is not None:
+                return Response(body, status=200, mimetype='application/json')
+
+            response = view(*args, **kwargs)
+            # Streamed bodies are never buffered just to be cached
+            if (isinstance(response, Response) and response.status_code == 200
+                    and not response.is_streamed):
+                response_cache.put(key, versions, response.get_data())
+            return response
+        return wrapper
+    return decorator
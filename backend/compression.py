@@ -0,0 +1,86 @@
+"""compression.py — Negotiated gzip/brotli compression of text responses"""
+
+import gzip
+import hashlib
+import os
+from flask import request
+from cache import ResponseCache
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.environ.get('MARKETPLACE_COMPRESS_MIN_SIZE', '1024'))
+COMPRESS_LEVEL = int(os.environ.get('MARKETPLACE_COMPRESS_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('MARKETPLACE_BROTLI_QUALITY', '5'))
+COMPRESSED_CACHE_MAX_BYTES = int(os.environ.get('MARKETPLACE_COMPRESSED_CACHE_MAX_BYTES',
+                                                str(16 * 1024 * 1024)))
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/javascript', 'text/html', 'text/css',
+    'text/plain', 'image/svg+xml',
+}
+
+
+def _gzip(body):
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0)
+
+
+def _brotli(body):
+    return brotli.compress(body, quality=BROTLI_QUALITY)
+
+
+# Content-Encoding -> compressor, in order of preference when the client
+# accepts several equally
+ENCODINGS = {'br': _brotli, 'gzip': _gzip} if brotli is not None else {'gzip': _gzip}
+
+# Compressed bodies keyed by encoding and a hash of the uncompressed body, so
+# a feed served to many clients is compressed once per change (the hash costs
+# a fraction of the compression it saves). Content-keyed entries never go
+# stale; the TTL only lets bodies nobody asks for any more age out
+compressed_cache = ResponseCache(ttl=24 * 60 * 60, max_bytes=COMPRESSED_CACHE_MAX_BYTES)
+
+
+def compress(body, encoding):
+    """body compressed with encoding, from compressed_cache when possible"""
+    key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+    compressed = compressed_cache.get(key, None)
+    if compressed is None:
+        compressed = ENCODINGS[encoding](body)
+        compressed_cache.put(key, None, compressed)
+    return compressed
+
+
+def compress_response(response):
+    """after_request: compress a text body for clients that accept gzip or brotli
+
+    File responses (which the server may sendfile) and streamed ones are
+    left alone, as are bodies under COMPRESS_MIN_SIZE bytes.
+    """
+    if (response.mimetype not in COMPRESSIBLE_MIMETYPES or response.direct_passthrough
+            or response.is_streamed or 'Content-Encoding' in response.headers):
+        return response
+
+    # The body differs by Accept-Encoding even when this client gets it plain
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    if encoding is None or response.status_code != 200:
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.set_data(compress(body, encoding) if request.method == 'GET'
+                      else ENCODINGS[encoding](body))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # A strong tag names exact bytes, which now depend on the encoding
+        response.set_etag(f'{etag}-{encoding}')
+    return response
+
+
+def init_app(app):
+    """Compress the responses of app"""
+    app.after_request(compress_response)
@@ -0,0 +1,132 @@
+"""counters.py — Per-user dashboard counters and their reconciliation job
+
+user_counters holds each user's active listings, pending requests on their
+items and open requests as a buyer. Triggers on items and requests keep it
+current in the same transaction as every write (see init_db.USER_COUNTERS),
+so /get-user-counters is one primary-key read.
+
+    python backend/counters.py [--db PATH] [--dry-run]
+
+rebuilds the table from items and requests and reports any counter that
+had drifted (e.g. after rows were changed with the triggers missing).
+"""
+
+import argparse
+import sqlite3
+from flask import Blueprint, jsonify
+from db import DB_PATH, get_db_connection
+from init_db import COUNT_USER_COUNTERS, USER_COUNTERS
+
+counters_bp = Blueprint('counters', __name__)
+
+COUNTER_COLUMNS = ', '.join(USER_COUNTERS)
+
+
+def reconcile_user_counters(conn, dry_run=False):
+    """Rebuild user_counters from scratch; returns the drifted values
+
+    Each drift is {"user_id", "counter", "stored", "actual"}. The rebuild
+    holds the write lock, so no write lands between counting and storing.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        actual = {row[0]: tuple(row[1:]) for row in conn.execute(COUNT_USER_COUNTERS)}
+        stored = {row[0]: tuple(row[1:]) for row in conn.execute(
+            f'SELECT user_id, {COUNTER_COLUMNS} FROM user_counters'
+        )}
+        zeros = (0,) * len(USER_COUNTERS)
+        drift = [
+            {"user_id": user_id, "counter": counter, "stored": old, "actual": new}
+            for user_id in sorted(actual.keys() | stored.keys())
+            for counter, old, new in zip(USER_COUNTERS, stored.get(user_id, zeros),
+                                         actual.get(user_id, zeros))
+            if old != new
+        ]
+        if drift and not dry_run:
+            conn.execute('DELETE FROM user_counters')
+            conn.execute(f'INSERT INTO user_counters {COUNT_USER_COUNTERS}')
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+    conn.commit()
+    return drift
+
+
+@counters_bp.route('/get-user-counters/<int:user_id>', methods=['GET'])
+def get_user_counters(user_id):
+    """
+    Get User Counters
+    ---
+    tags:
+      - User
+    summary: Dashboard badge counts for a user
+    description: >
+      Active listings, pending requests on the user's items and the user's
+      own open requests as a buyer, read from precomputed counters.
+    parameters:
+      - name: user_id
+        in: path
+        type: integer
+        required: true
+    responses:
+      200:
+        description: The user's counters (zeros for a user with no activity)
+        schema:
+          type: object
+          properties:
+            user_id:
+              type: integer
+              example: 1
+            active_listings:
+              type: integer
+              example: 4
+            pending_requests:
+              type: integer
+              example: 2
+            open_requests:
+              type: integer
+              example: 1
+      500:
+        description: Database error
+    """
+    try:
+        conn = get_db_connection()
+        row = conn.execute(
+            f'SELECT {COUNTER_COLUMNS} FROM user_counters WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        conn.close()
+
+        counters = dict(row) if row else dict.fromkeys(USER_COUNTERS, 0)
+        return jsonify({"user_id": user_id, **counters}), 200
+
+    except sqlite3.Error as error:
+        return jsonify({"message": f"Database error: {str(error)}"}), 500
+
+
+def main(argv=None):
+    """Rebuild user_counters from items and requests and report drifted counters"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--db', default=DB_PATH, help='database file')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='only report drift, leave the counters as they are')
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        drift = reconcile_user_counters(conn, args.dry_run)
+    finally:
+        conn.close()
+
+    for entry in drift:
+        print(f"user {entry['user_id']}: {entry['counter']} was {entry['stored']}, "
+              f"counted {entry['actual']}")
+    users = len({entry['user_id'] for entry in drift})
+    action = 'found' if args.dry_run else 'fixed'
+    print(f"Reconciled user counters in {args.db}: {action} {len(drift)} drifted "
+          f"counters across {users} users")
+    return drift
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,176 @@
 """Database connection utility"""
 
-import sqlite3
 import os
+import queue
+import sqlite3
+import threading
+from flask import g, has_app_context
+
+DB_PATH = os.environ.get(
+    'MARKETPLACE_DB_PATH',
+    os.path.join(os.path.dirname(__file__), 'marketplace.db')
+)
+POOL_SIZE = int(os.environ.get('MARKETPLACE_DB_POOL_SIZE', '8'))
+POOL_TIMEOUT = float(os.environ.get('MARKETPLACE_DB_POOL_TIMEOUT', '5'))
+
+# Applied once to every connection when it is opened, not per request
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA cache_size = -20000',
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA temp_store = MEMORY',
+)
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to its pool"""
+
+    pool = None
+    request_bound = False
+
+    def close(self):
+        """Return the connection to the pool (deferred to teardown inside a request)"""
+        if self.request_bound:
+            return
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+    def discard(self):
+        """Really close the underlying sqlite3 connection"""
+        super().close()
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived, pre-tuned SQLite connections"""
+
+    def __init__(self, db_path, size, timeout=POOL_TIMEOUT):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._opened = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            factory=PooledConnection,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        conn.pool = self
+        return conn
+
+    def acquire(self):
+        """Take an idle connection, opening a new one while under the size limit"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return self._connect()
+            except sqlite3.Error:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty as exc:
+            raise sqlite3.OperationalError('Database connection pool exhausted') from exc
+
+    def release(self, conn):
+        """Roll back anything left uncommitted and put the connection back"""
+        conn.request_bound = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except (sqlite3.Error, queue.Full):
+            conn.discard()
+            with self._lock:
+                self._opened -= 1
+
+    def prefill(self):
+        """Open every connection now instead of on first use (worker warmup)"""
+        conns = [self.acquire() for _ in range(self.size)]
+        for conn in conns:
+            self.release(conn)
+
+    def close_all(self):
+        """Close every idle connection (used on shutdown and in tests)"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.discard()
+            with self._lock:
+                self._opened -= 1
+
+
+_POOL = {'current': None}
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool():
+    """Get the process-wide connection pool, creating it on first use"""
+    with _POOL_LOCK:
+        if _POOL['current'] is None:
+            _POOL['current'] = ConnectionPool(DB_PATH, POOL_SIZE)
+        return _POOL['current']
+
+
+def configure_pool(db_path=None, size=None):
+    """Replace the connection pool, e.g. to point the app at another database"""
+    with _POOL_LOCK:
+        if _POOL['current'] is not None:
+            _POOL['current'].close_all()
+        _POOL['current'] = ConnectionPool(db_path or DB_PATH, size or POOL_SIZE)
+        return _POOL['current']
+
 
 def get_db_connection():
-    """Get database connection"""
-    db_path = os.path.join(os.path.dirname(__file__), 'marketplace.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
+    """Get database connection
+
+    Inside a Flask app context the same pooled connection is reused for the
+    whole request and returned to the pool by the teardown hook, so the
+    handlers' own conn.close() calls are harmless.
+    """
+    if not has_app_context():
+        return get_pool().acquire()
+
+    conn = g.get('db_conn')
+    if conn is None:
+        conn = get_pool().acquire()
+        conn.request_bound = True
+        g.db_conn = conn
     return conn
+
+
+def release_db_connection(_exc=None):
+    """Teardown hook: give the request's connection back to the pool"""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        conn.pool.release(conn)
+
+
+def init_app(app):
+    """Size the pool from app config and register the teardown hook"""
+    db_path = app.config.get('DATABASE')
+    size = app.config.get('DB_POOL_SIZE')
+    if db_path or size:
+        configure_pool(db_path, size)
+    app.teardown_appcontext(release_db_connection)
@@ -0,0 +1,462 @@
+"""events.py — Server-sent events pushing purchase request changes to sellers
+
+send_request, update_request_status and /moderate-requests record each change
+in the request_events table, in the transaction that makes it, so every
+worker process sees it and its id orders it. GET /request-events keeps a
+stream open per seller and writes the seller's new rows: streams in the
+writing process are woken at once, those of other workers read them within
+EVENT_POLL_INTERVAL. A client resuming with a Last-Event-ID older than the
+EVENT_HISTORY retained rows is told to resync, i.e. refetch its requests once.
+
+Under backend/serve.py a stream holds no request thread: once its headers
+are sent the connection is handed to stream_hub, one thread per worker that
+reads new events for all of its streams with a single query. Other servers
+write the stream on the request thread (stream_events).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from flask import Blueprint, Response, g, jsonify, request
+from auth import authorize, verify_token
+from db import get_db_connection
+
+events_bp = Blueprint('events', __name__)
+
+# request_events rows kept (for all sellers) for clients resuming a stream
+EVENT_HISTORY = int(os.environ.get('MARKETPLACE_EVENT_HISTORY', '10000'))
+EVENT_HEARTBEAT = float(os.environ.get('MARKETPLACE_EVENT_HEARTBEAT', '15'))
+# Longest a stream goes without reading events committed by another worker
+EVENT_POLL_INTERVAL = float(os.environ.get('MARKETPLACE_EVENT_POLL_INTERVAL', '1'))
+# Streams end after this long; EventSource reconnects (with Last-Event-ID)
+EVENT_STREAM_MAX_AGE = float(os.environ.get('MARKETPLACE_EVENT_STREAM_MAX_AGE', '300'))
+EVENT_RETRY_MS = 2000
+# request_events rows read per query
+EVENT_BATCH = 500
+
+RESYNC_MESSAGE = 'event: resync\ndata: {}\n\n'
+# Comment line: keeps proxies from timing the stream out and surfaces
+# disconnected clients
+KEEP_ALIVE_MESSAGE = ': keep-alive\n\n'
+
+
+class Subscription:
+    """Wake-up flag of one open stream or long-poll
+
+    Carries no events: whoever waits rereads the database once woken, so
+    nothing can pile up behind a slow subscriber.
+    """
+
+    def __init__(self, topic):
+        self.topic = topic
+        self.closed = False
+        self._pending = False
+        self._ready = threading.Condition()
+
+    def notify(self):
+        """Wake the waiter (or make its next wait return at once)"""
+        with self._ready:
+            self._pending = True
+            self._ready.notify()
+
+    def close(self):
+        """Wake the stream so it ends"""
+        with self._ready:
+            self.closed = True
+            self._ready.notify()
+
+    def wait(self, timeout):
+        """Whether notified before timeout passed, clearing the notification"""
+        with self._ready:
+            self._ready.wait_for(lambda: self._pending or self.closed, timeout)
+            notified, self._pending = self._pending, False
+            return notified
+
+
+class EventBroker:
+    """In-process pub/sub waking the streams and long-polls of this process"""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, topic):
+        """Wake the subscribers of topic"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscription in subscribers:
+            subscription.notify()
+
+    def subscribe(self, topic):
+        """Open a Subscription to topic"""
+        subscription = Subscription(topic)
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Stop waking subscription"""
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.topic, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.topic, None)
+
+    def close(self):
+        """End every open stream (on shutdown, so draining is not held up)"""
+        with self._lock:
+            subscribers = [sub for subs in self._subscribers.values() for sub in subs]
+        for subscription in subscribers:
+            subscription.close()
+
+
+# Wakes the streams written on request threads in this process; nothing is
+# replayed, a woken stream rereads request_events
+request_events = EventBroker()
+
+
+def seller_topic(seller_id):
+    """request_events topic of one seller"""
+    return f'seller:{seller_id}'
+
+
+def record_request_events(conn, seller_id, events):
+    """Add (name, data) events for seller_id to conn's open transaction
+
+    The caller commits them along with its change, then calls
+    announce_request_events. Rows beyond the newest EVENT_HISTORY go.
+    """
+    conn.executemany(
+        'INSERT INTO request_events (seller_id, name, data) VALUES (?, ?, ?)',
+        [(seller_id, name, json.dumps(data)) for name, data in events]
+    )
+    conn.execute(
+        'DELETE FROM request_events WHERE id <= (SELECT max(id) FROM request_events) - ?',
+        (EVENT_HISTORY,)
+    )
+
+
+def announce_request_events(seller_id):
+    """Wake this process's streams of seller_id once its events are committed"""
+    request_events.publish(seller_topic(seller_id))
+    stream_hub.wake()
+
+
+def replay_start(conn, last_event_id):
+    """(cursor, needs_resync) of a stream resuming after last_event_id
+
+    A new stream starts after the newest event. An id that is not retained
+    (pruned, or from another database) resyncs.
+    """
+    newest, oldest = conn.execute(
+        '''SELECT (SELECT max(id) FROM request_events),
+                  (SELECT min(id) FROM request_events)'''
+    ).fetchone()
+    newest = newest or 0
+    if not last_event_id:
+        return newest, False
+    if last_event_id.isdigit() and (oldest or newest + 1) - 1 <= int(last_event_id) <= newest:
+        return int(last_event_id), False
+    return newest, True
+
+
+def fetch_request_events(conn, after, seller_id=None):
+    """Up to EVENT_BATCH events after id `after`, of seller_id or of every seller"""
+    if seller_id is None:
+        return conn.execute(
+            '''SELECT id, seller_id, name, data FROM request_events
+               WHERE id > ? ORDER BY id LIMIT ?''',
+            (after, EVENT_BATCH)
+        ).fetchall()
+    return conn.execute(
+        '''SELECT id, seller_id, name, data FROM request_events
+           WHERE seller_id = ? AND id > ? ORDER BY id LIMIT ?''',
+        (seller_id, after, EVENT_BATCH)
+    ).fetchall()
+
+
+def format_event(row):
+    """One text/event-stream message from a request_events row"""
+    return f'id: {row["id"]}\nevent: {row["name"]}\ndata: {row["data"]}\n\n'
+
+
+def read_events(after, seller_id):
+    """fetch_request_events on a pooled connection held only for the read"""
+    conn = get_db_connection()
+    try:
+        return fetch_request_events(conn, after, seller_id)
+    finally:
+        conn.close()
+
+
+def stream_events(seller_id, cursor, resync=False):
+    """Generator writing seller_id's events after cursor until the stream gets too old"""
+    # Subscribed on the first write, so a response that is never sent
+    # leaves no subscription behind
+    subscription = request_events.subscribe(seller_topic(seller_id))
+    deadline = time.monotonic() + EVENT_STREAM_MAX_AGE
+    last_write = time.monotonic()
+    try:
+        yield f'retry: {EVENT_RETRY_MS}\n\n'
+        if resync:
+            yield RESYNC_MESSAGE
+        while not subscription.closed and time.monotonic() < deadline:
+            rows = read_events(cursor, seller_id)
+            for row in rows:
+                yield format_event(row)
+            if rows:
+                cursor, last_write = rows[-1]['id'], time.monotonic()
+                if len(rows) == EVENT_BATCH:
+                    continue
+            elif time.monotonic() - last_write >= EVENT_HEARTBEAT:
+                yield KEEP_ALIVE_MESSAGE
+                last_write = time.monotonic()
+            subscription.wait(EVENT_POLL_INTERVAL)
+    finally:
+        request_events.unsubscribe(subscription)
+
+
+class DetachedStream:
+    """A /request-events connection written by stream_hub"""
+
+    def __init__(self, sock, seller_id, cursor, resync):
+        self.sock = sock
+        self.seller_id = seller_id
+        self.cursor = cursor
+        self.needs_resync = resync
+        self.deadline = time.monotonic() + EVENT_STREAM_MAX_AGE
+        self.last_write = time.monotonic()
+
+    def send(self, text):
+        """Write text as one chunk of the body; False if the client is gone or not keeping up"""
+        data = text.encode()
+        frame = b'%x\r\n%s\r\n' % (len(data), data)
+        try:
+            sent = self.sock.send(frame)
+        except OSError:
+            return False
+        self.last_write = time.monotonic()
+        return sent == len(frame)
+
+    def close(self, finish=False):
+        """Close the connection, first ending the body cleanly if finish"""
+        if finish:
+            try:
+                self.sock.send(b'0\r\n\r\n')
+            except OSError:
+                pass
+        self.sock.close()
+
+
+class StreamHub:
+    """One thread writing every detached stream of this process
+
+    Each tick reads the events committed since the previous one with a
+    single query for all sellers and writes them to their sellers' streams.
+    A stream whose client cannot take a write without blocking is dropped;
+    the client reconnects with its Last-Event-ID and catches up.
+    """
+
+    def __init__(self):
+        self._streams = {}
+        self._adopted = []
+        self._cursor = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._closed = False
+
+    def adopt(self, sock, seller_id, cursor, resync=False):
+        """Take over a stream whose headers are sent; it gets the events after cursor
+
+        sock must be non-blocking and is closed by the hub.
+        """
+        stream = DetachedStream(sock, seller_id, cursor, resync)
+        with self._lock:
+            if not self._closed:
+                self._adopted.append(stream)
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='event-stream-hub',
+                                                    daemon=True)
+                    self._thread.start()
+                stream = None
+        if stream is not None:
+            stream.close(finish=True)
+        self.wake()
+
+    def wake(self):
+        """Read new events now instead of at the next poll"""
+        self._wakeup.set()
+
+    def close(self):
+        """End every stream and stop the thread (on shutdown)"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        self.wake()
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(EVENT_POLL_INTERVAL)
+            self._wakeup.clear()
+            try:
+                self._tick()
+            except sqlite3.Error:
+                pass  # e.g. the pool is exhausted; streams are a tick late
+        with self._lock:
+            streams = self._adopted + [s for streams in self._streams.values() for s in streams]
+            self._adopted, self._streams = [], {}
+        for stream in streams:
+            stream.close(finish=True)
+
+    def _tick(self):
+        conn = get_db_connection()
+        try:
+            if self._cursor is None:
+                self._cursor = replay_start(conn, None)[0]
+            with self._lock:
+                adopted, self._adopted = self._adopted, []
+            for stream in adopted:
+                self._start(conn, stream)
+            while True:
+                rows = fetch_request_events(conn, self._cursor)
+                for row in rows:
+                    self._cursor = row['id']
+                    for stream in list(self._streams.get(row['seller_id'], ())):
+                        self._deliver(stream, row)
+                if len(rows) < EVENT_BATCH:
+                    break
+        finally:
+            conn.close()
+
+        now = time.monotonic()
+        for stream in [s for streams in self._streams.values() for s in streams]:
+            if now >= stream.deadline:
+                self._drop(stream, finish=True)
+            elif now - stream.last_write >= EVENT_HEARTBEAT:
+                if not stream.send(KEEP_ALIVE_MESSAGE):
+                    self._drop(stream)
+
+    def _start(self, conn, stream):
+        """Catch a new stream up to the hub's cursor and start delivering to it"""
+        if stream.needs_resync and not stream.send(RESYNC_MESSAGE):
+            stream.close()
+            return
+        rows = conn.execute(
+            '''SELECT id, seller_id, name, data FROM request_events
+               WHERE seller_id = ? AND id > ? AND id <= ? ORDER BY id''',
+            (stream.seller_id, stream.cursor, self._cursor)
+        ).fetchall()
+        for row in rows:
+            if not stream.send(format_event(row)):
+                stream.close()
+                return
+            stream.cursor = row['id']
+        self._streams.setdefault(stream.seller_id, set()).add(stream)
+
+    def _deliver(self, stream, row):
+        if row['id'] <= stream.cursor:
+            return  # the stream started after it
+        if stream.send(format_event(row)):
+            stream.cursor = row['id']
+        else:
+            self._drop(stream)
+
+    def _drop(self, stream, finish=False):
+        streams = self._streams.get(stream.seller_id, set())
+        streams.discard(stream)
+        if not streams:
+            self._streams.pop(stream.seller_id, None)
+        stream.close(finish)
+
+
+stream_hub = StreamHub()
+
+
+class EventStream:  # pylint: disable=too-few-public-methods
+    """Response body of GET /request-events
+
+    Given a detach callable by the server (backend/serve.py passes one as
+    environ['marketplace.detach']), it sends the headers and the retry hint,
+    then hands the connection to stream_hub and ends. Otherwise it is
+    stream_events, written on the request thread.
+    """
+
+    def __init__(self, seller_id, cursor, resync=False, detach=None):
+        self.seller_id = seller_id
+        self.cursor = cursor
+        self.resync = resync
+        self.detach = detach
+
+    def __iter__(self):
+        if self.detach is None:
+            yield from stream_events(self.seller_id, self.cursor, self.resync)
+            return
+        yield f'retry: {EVENT_RETRY_MS}\n\n'
+        stream_hub.adopt(self.detach(), self.seller_id, self.cursor, self.resync)
+
+
+@events_bp.route('/request-events', methods=['GET'])
+def get_request_events():
+    """
+    Stream Request Events
+    ---
+    tags:
+      - Requests
+    summary: Server-sent events for a seller's incoming purchase requests
+    description: >
+      A text/event-stream of request-created and request-updated events for
+      the authenticated seller (bearer token, ?token= for EventSource, or
+      ?seller_id= when tokens are not required). Reconnecting with
+      Last-Event-ID replays missed events; a resync event means some were
+      lost and the client should refetch its requests.
+    produces:
+      - text/event-stream
+    parameters:
+      - name: seller_id
+        in: query
+        type: integer
+        required: false
+      - name: token
+        in: query
+        type: string
+        required: false
+      - name: Last-Event-ID
+        in: header
+        type: string
+        required: false
+    responses:
+      200:
+        description: >
+          Event stream, e.g. "event: request-created" with data
+          {"request_id": 7, "item_id": 3, "buyer_id": 2, "status": "pending"}
+      400:
+        description: No seller given
+      401:
+        description: Invalid token, or a token is required
+      403:
+        description: The token belongs to another user
+    """
+    # EventSource cannot send headers, so the token may come as ?token=
+    token = request.args.get('token')
+    if token:
+        claims = verify_token(token)
+        if claims is None:
+            return jsonify({"message": "Invalid or expired token"}), 401
+        seller_id = claims[0]
+    else:
+        seller_id = request.args.get('seller_id', type=int) or g.get('user_id')
+        if seller_id is None:
+            return jsonify({"message": "seller_id or a token is required"}), 400
+        authorize(seller_id)
+
+    cursor, resync = replay_start(get_db_connection(), request.headers.get('Last-Event-ID'))
+    body = EventStream(seller_id, cursor, resync, request.environ.get('marketplace.detach'))
+    return Response(body, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
@@ -0,0 +1,265 @@
+"""images.py — Listing image storage and resized JPEG/WebP derivatives cached on disk
+
+A listing image is either a file bundled under /static/images/<name> or an
+uploaded image stored by id (see uploads.py) and served from /images/<id>;
+both routes answer Range and conditional requests (see static_files.py).
+Both get one derivative per preset and format, served from
+/image-derivatives/<preset>/<name or id>.<format>.
+Each derivative is rendered on first access (or ahead of time with
+generate_derivatives) and cached under a name derived from the hash of the
+original's bytes, so a replaced original never serves a stale derivative.
+
+Pillow comes with requirements.txt; where it is missing, or for originals
+it cannot decode, the derivative URLs redirect to the original image.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from flask import Blueprint, jsonify, redirect
+from werkzeug.security import safe_join
+from static_files import IMMUTABLE_MAX_AGE, file_response
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - depends on the environment
+    Image = ImageOps = None
+
+images_bp = Blueprint('images', __name__)
+
+# Originals, served by Flask's static route as IMAGE_URL_PREFIX + name
+IMAGE_DIR = os.path.join(os.path.dirname(__file__), 'static', 'images')
+UPLOAD_DIR = os.environ.get(
+    'MARKETPLACE_UPLOAD_DIR',
+    os.path.join(os.path.dirname(__file__), 'uploads')
+)
+IMAGE_CACHE_DIR = os.environ.get(
+    'MARKETPLACE_IMAGE_CACHE_DIR',
+    os.path.join(os.path.dirname(__file__), 'image_cache')
+)
+IMAGE_QUALITY = int(os.environ.get('MARKETPLACE_IMAGE_QUALITY', '80'))
+# For bundled images and renditions, whose URLs do not change with their content;
+# uploaded images are named by their hash and cached for IMMUTABLE_MAX_AGE
+IMAGE_MAX_AGE = int(os.environ.get('MARKETPLACE_IMAGE_MAX_AGE', str(24 * 60 * 60)))
+
+IMAGE_URL_PREFIX = '/static/images/'
+UPLOADED_URL_PREFIX = '/images/'
+# An uploaded image's id: the sha256 of its bytes and an extension from its type
+IMAGE_ID = re.compile(r'[0-9a-f]{64}\.(?:jpg|png|gif|webp)')
+DERIVATIVE_URL_PREFIX = '/image-derivatives/'
+# Preset name -> maximum width in pixels (narrower originals are not upscaled)
+IMAGE_PRESETS = {'thumbnail': 320, 'medium': 800}
+# URL extension -> (Pillow format, mimetype)
+IMAGE_FORMATS = {'jpg': ('JPEG', 'image/jpeg'), 'webp': ('WEBP', 'image/webp')}
+
+
+DIGEST_CHUNK_SIZE = 64 * 1024
+
+# (path, size, mtime) of an original -> sha256 of its bytes
+_source_digests = {}
+_source_digests_lock = threading.Lock()
+
+
+def source_digest(path):
+    """Hex sha256 of the original at path, rehashed only when it changes on disk"""
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    with _source_digests_lock:
+        digest = _source_digests.get(key)
+    if digest is None:
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as source:
+            # hashlib.file_digest only exists from Python 3.11
+            for chunk in iter(lambda: source.read(DIGEST_CHUNK_SIZE), b''):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        with _source_digests_lock:
+            _source_digests[key] = digest
+    return digest
+
+
+def derivative_path(digest, preset, extension):
+    """Cache file for one derivative of the original with this content digest"""
+    name = f'{digest}-{IMAGE_PRESETS[preset]}w-q{IMAGE_QUALITY}.{extension}'
+    return os.path.join(IMAGE_CACHE_DIR, digest[:2], name)
+
+
+def render_derivative(source, target, preset, extension):
+    """Resize source to the preset width and write it to target atomically"""
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        width = IMAGE_PRESETS[preset]
+        if image.width > width:
+            image.thumbnail((width, image.height), Image.Resampling.LANCZOS)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Concurrent renders of the same derivative each write their own
+        # temporary file; whichever rename lands last wins with identical bytes
+        temporary = f'{target}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            image.save(temporary, IMAGE_FORMATS[extension][0],
+                       quality=IMAGE_QUALITY, optimize=True)
+            os.replace(temporary, target)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+
+def derivative(source, preset, extension):
+    """Path of the cached derivative of source, rendering it if needed (None if impossible)"""
+    if Image is None:
+        return None
+    target = derivative_path(source_digest(source), preset, extension)
+    if not os.path.exists(target):
+        try:
+            render_derivative(source, target, preset, extension)
+        except (OSError, KeyError, ValueError):
+            # Undecodable original, or a Pillow build without this encoder
+            return None
+    return target
+
+
+def uploaded_image_path(image_id):
+    """Where the uploaded image image_id is (or would be) stored"""
+    return os.path.join(UPLOAD_DIR, image_id[:2], image_id)
+
+
+def image_source(name):
+    """(path, url) of the original image named name, an upload id or a bundled file
+
+    Returns (None, None) when there is no such image.
+    """
+    if IMAGE_ID.fullmatch(name):
+        path, url = uploaded_image_path(name), UPLOADED_URL_PREFIX + name
+    else:
+        path, url = safe_join(IMAGE_DIR, name), IMAGE_URL_PREFIX + name
+    if path is None or not os.path.isfile(path):
+        return None, None
+    return path, url
+
+
+def generate_derivatives(name):
+    """Render every preset and format of an image ahead of the first request"""
+    source, _ = image_source(name)
+    if source is None:
+        raise FileNotFoundError(name)
+    return {(preset, extension): derivative(source, preset, extension)
+            for preset in IMAGE_PRESETS for extension in IMAGE_FORMATS}
+
+
+@images_bp.route(f'{IMAGE_URL_PREFIX}<path:name>')
+def get_bundled_image(name):
+    """
+    Get A Bundled Image
+    ---
+    tags:
+      - Images
+    summary: An image shipped under backend/static/images
+    description: >
+      Supports Range requests and revalidation with If-None-Match (the
+      ETag is the hash of the file) or If-Modified-Since.
+    parameters:
+      - name: name
+        in: path
+        type: string
+        required: true
+        example: bike1.jpg
+    responses:
+      200:
+        description: The image
+      206:
+        description: The requested byte range of the image
+      304:
+        description: The cached copy is still current
+      404:
+        description: No such image
+      416:
+        description: The requested range is outside the image
+    """
+    path = safe_join(IMAGE_DIR, name)
+    if path is None or not os.path.isfile(path):
+        return jsonify({"message": "Image not found"}), 404
+    return file_response(path, source_digest(path), IMAGE_MAX_AGE)
+
+
+@images_bp.route(f'{UPLOADED_URL_PREFIX}<image_id>')
+def get_uploaded_image(image_id):
+    """
+    Get An Uploaded Image
+    ---
+    tags:
+      - Images
+    summary: Original bytes of an image stored by /upload-image
+    description: >
+      The id is the hash of the image, so responses are cacheable for a
+      year as immutable. Supports Range and conditional requests.
+    parameters:
+      - name: image_id
+        in: path
+        type: string
+        required: true
+        example: 9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08.jpg
+    responses:
+      200:
+        description: The image
+      206:
+        description: The requested byte range of the image
+      304:
+        description: The cached copy is still current
+      404:
+        description: No image with this id
+      416:
+        description: The requested range is outside the image
+    """
+    path = uploaded_image_path(image_id) if IMAGE_ID.fullmatch(image_id) else None
+    if path is None or not os.path.isfile(path):
+        return jsonify({"message": "Image not found"}), 404
+    return file_response(path, image_id, IMMUTABLE_MAX_AGE, immutable=True)
+
+
+@images_bp.route(f'{DERIVATIVE_URL_PREFIX}<preset>/<path:name>')
+def get_image_derivative(preset, name):
+    """
+    Get A Resized Listing Image
+    ---
+    tags:
+      - Images
+    summary: Thumbnail or medium rendition of a listing image
+    description: >
+      Returns a bundled /static/images/ file or an uploaded image scaled down to the preset width
+      (thumbnail 320px, medium 800px) as JPEG or WebP. Renditions are
+      rendered once and cached on disk. Redirects to the original image
+      when it cannot be resized.
+    parameters:
+      - name: preset
+        in: path
+        type: string
+        enum: [thumbnail, medium]
+        required: true
+      - name: name
+        in: path
+        type: string
+        required: true
+        description: Bundled image name or upload id, followed by .jpg or .webp
+        example: bike1.jpg.webp
+    responses:
+      200:
+        description: The resized image
+      302:
+        description: Resizing is unavailable; redirects to the original image
+      404:
+        description: Unknown preset or format, or no such original image
+    """
+    source_name, _, extension = name.rpartition('.')
+    source, original_url = image_source(source_name)
+    if preset not in IMAGE_PRESETS or extension not in IMAGE_FORMATS or source is None:
+        return jsonify({"message": "Image not found"}), 404
+
+    target = derivative(source, preset, extension)
+    if target is None:
+        return redirect(original_url)
+    return file_response(target, os.path.basename(target), IMAGE_MAX_AGE,
+                         mimetype=IMAGE_FORMATS[extension][1])
@@ -1,15 +1,477 @@
 """Database initialization module for the marketplace application."""
-import sqlite3
+import argparse
+import itertools
+import math
 import os
+import random
+import sqlite3
+import time
+from db import DB_PATH
+from images import DERIVATIVE_URL_PREFIX, IMAGE_URL_PREFIX, UPLOADED_URL_PREFIX
+from passwords import hash_password
 
-def init_database():
-    """Initialize SQLite database with marketplace tables"""
+# Secondary indexes, created after the tables so they can be (re)built on
+# existing databases as well
+INDEXES = (
+    # Home page feed: WHERE status = 'available' ORDER BY date_posted DESC, id DESC
+    '''CREATE INDEX IF NOT EXISTS idx_items_status_date_posted
+       ON items (status, date_posted DESC, id DESC)''',
+    # get_seller_requests: WHERE seller_id = ? ORDER BY created_at DESC
+    '''CREATE INDEX IF NOT EXISTS idx_requests_seller_created
+       ON requests (seller_id, created_at DESC)''',
+    # get_buyer_requests: WHERE buyer_id = ? [AND status = ?] ORDER BY created_at DESC
+    '''CREATE INDEX IF NOT EXISTS idx_requests_buyer_status_created
+       ON requests (buyer_id, status, created_at DESC)''',
+    # send_request duplicate check, answered from the index alone
+    '''CREATE INDEX IF NOT EXISTS idx_requests_item_buyer_status
+       ON requests (item_id, buyer_id, status)''',
+    # get_incoming_requests: only the pending slice, newest first
+    """CREATE INDEX IF NOT EXISTS idx_requests_pending_created
+       ON requests (created_at DESC) WHERE status = 'pending'""",
+    # get_approved_requests: only the approved slice, most recently updated first
+    """CREATE INDEX IF NOT EXISTS idx_requests_approved_updated
+       ON requests (updated_at DESC) WHERE status = 'approved'""",
+    # /browse-listings facets: GROUP BY each filter column over available
+    # items, with price alongside so price filters and buckets need no row
+    """CREATE INDEX IF NOT EXISTS idx_items_available_category
+       ON items (category, condition, price) WHERE status = 'available'""",
+    """CREATE INDEX IF NOT EXISTS idx_items_available_condition
+       ON items (condition, price) WHERE status = 'available'""",
+    """CREATE INDEX IF NOT EXISTS idx_items_available_location
+       ON items (location, price) WHERE status = 'available'""",
+    """CREATE INDEX IF NOT EXISTS idx_items_available_seller
+       ON items (seller_id, price) WHERE status = 'available'""",
+    # Message history pages and long-polls: WHERE conversation_id = ? AND id < / > ?
+    '''CREATE INDEX IF NOT EXISTS idx_messages_conversation_id
+       ON messages (conversation_id, id)''',
+    # /request-events catch-up: WHERE seller_id = ? AND id > ?
+    '''CREATE INDEX IF NOT EXISTS idx_request_events_seller_id
+       ON request_events (seller_id, id)''',
+)
+
+def _content_index(table, source, columns, tokenize):
+    """DDL for an external-content FTS5 table over source plus its sync triggers"""
+    cols = ', '.join(columns)
+    new_vals = ', '.join(f'new.{col}' for col in columns)
+    old_vals = ', '.join(f'old.{col}' for col in columns)
+    return (
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+               {cols},
+               content='{source}', content_rowid='id',
+               tokenize='{tokenize}'
+           )""",
+        f'''CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON {source} BEGIN
+               INSERT INTO {table} (rowid, {cols}) VALUES (new.id, {new_vals});
+           END''',
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON {source} BEGIN
+               INSERT INTO {table} ({table}, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+           END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE OF {cols} ON {source} BEGIN
+               INSERT INTO {table} ({table}, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+               INSERT INTO {table} (rowid, {cols}) VALUES (new.id, {new_vals});
+           END""",
+    )
 
-    # Database will be created in the backend directory
-    db_path = os.path.join(os.path.dirname(__file__), 'marketplace.db')
+# Full-text indexes (external content, so items/users stay the single copy of
+# the text); their triggers keep them in step with every write
+SEARCH_SCHEMA = {
+    # /search-listings: ranked word search over listings
+    'items_fts': _content_index(
+        'items_fts', 'items', ('title', 'description', 'category', 'location'),
+        'porter unicode61 remove_diacritics 2'
+    ),
+    # /search-requests: substring (LIKE '%q%') search on item titles and usernames
+    'items_title_trigram': _content_index(
+        'items_title_trigram', 'items', ('title',), 'trigram'
+    ),
+    'users_username_trigram': _content_index(
+        'users_username_trigram', 'users', ('username',), 'trigram'
+    ),
+}
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+# Every items column except the derived listing_json, whose own
+# re-render UPDATE must not count as a second change
+VISIBLE_ITEM_COLUMNS = ('title, description, price, category, condition, seller_id, status, '
+                        'location, images, date_posted, created_at')
+
+# Monotonic change counters, one row per scope ('items', 'items:<seller_id>',
+# 'requests'), bumped by triggers so every write path is covered. Read paths
+# turn them into ETags (see versioning.py).
+CHANGE_TRACKING = (
+    '''CREATE TABLE IF NOT EXISTS data_versions (
+           scope TEXT PRIMARY KEY,
+           version INTEGER NOT NULL DEFAULT 0
+       ) WITHOUT ROWID''',
+    """CREATE TRIGGER IF NOT EXISTS items_version_insert AFTER INSERT ON items BEGIN
+           INSERT INTO data_versions (scope, version)
+           VALUES ('items', 1), ('items:' || new.seller_id, 1)
+           ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS items_version_update
+       AFTER UPDATE OF {VISIBLE_ITEM_COLUMNS} ON items BEGIN
+           INSERT INTO data_versions (scope, version)
+           VALUES ('items', 1), ('items:' || old.seller_id, 1)
+           ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+           INSERT INTO data_versions (scope, version)
+           SELECT 'items:' || new.seller_id, 1 WHERE new.seller_id IS NOT old.seller_id
+           ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS items_version_delete AFTER DELETE ON items BEGIN
+           INSERT INTO data_versions (scope, version)
+           VALUES ('items', 1), ('items:' || old.seller_id, 1)
+           ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+       END""",
+    # Listings show their seller's username
+    """CREATE TRIGGER IF NOT EXISTS users_version_update AFTER UPDATE OF username ON users BEGIN
+           INSERT INTO data_versions (scope, version)
+           VALUES ('items', 1), ('items:' || new.id, 1)
+           ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS requests_version_insert AFTER INSERT ON requests BEGIN
+           INSERT INTO data_versions (scope, version) VALUES ('requests', 1)
+           ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS requests_version_update AFTER UPDATE ON requests BEGIN
+           INSERT INTO data_versions (scope, version) VALUES ('requests', 1)
+           ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS requests_version_delete AFTER DELETE ON requests BEGIN
+           INSERT INTO data_versions (scope, version) VALUES ('requests', 1)
+           ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+       END""",
+)
+
+# Per-user dashboard counters: name -> (table, owning user column, condition
+# on the row aliased {row}). Conditions use IS so they are never NULL
+USER_COUNTERS = {
+    'active_listings': ('items', 'seller_id', "{row}.status IS 'available'"),
+    'pending_requests': ('requests', 'seller_id', "{row}.status IS 'pending'"),
+    'open_requests': ('requests', 'buyer_id', "{row}.status IS 'pending'"),
+}
+
+def _counter_change(counter, row, delta, unless=None):
+    """Statement adding delta to counter for {row}'s owner when its condition holds"""
+    _, owner, condition = USER_COUNTERS[counter]
+    where = condition.format(row=row)
+    if unless:
+        where += f' AND NOT ({unless})'
+    return f"""INSERT INTO user_counters (user_id, {counter})
+               SELECT {row}.{owner}, {delta} WHERE {where}
+               ON CONFLICT (user_id) DO UPDATE SET {counter} = {counter} + excluded.{counter};"""
+
+def _counter_triggers(table):
+    """Triggers keeping the USER_COUNTERS over table current on every write"""
+    counters = [name for name, spec in USER_COUNTERS.items() if spec[0] == table]
+    columns = sorted({'status', *(USER_COUNTERS[name][1] for name in counters)})
+
+    def unchanged(counter):
+        # Still counted for the same user: neither side needs a write
+        _, owner, condition = USER_COUNTERS[counter]
+        return (f"{condition.format(row='old')} AND {condition.format(row='new')}"
+                f" AND new.{owner} IS old.{owner}")
+
+    def body(*changes):
+        return '\n               '.join(changes)
+
+    return (
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_counters_insert AFTER INSERT ON {table} BEGIN
+               {body(*(_counter_change(name, 'new', 1) for name in counters))}
+           END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_counters_delete AFTER DELETE ON {table} BEGIN
+               {body(*(_counter_change(name, 'old', -1) for name in counters))}
+           END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_counters_update
+           AFTER UPDATE OF {', '.join(columns)} ON {table} BEGIN
+               {body(*(change for name in counters for change in (
+                   _counter_change(name, 'old', -1, unchanged(name)),
+                   _counter_change(name, 'new', 1, unchanged(name)))))}
+           END""",
+    )
+
+# One PRIMARY KEY row per user with any non-zero counter, changed in the
+# same transaction as the write that moves it
+COUNTER_SCHEMA = (
+    f'''CREATE TABLE IF NOT EXISTS user_counters (
+           user_id INTEGER PRIMARY KEY,
+           {', '.join(f'{name} INTEGER NOT NULL DEFAULT 0' for name in USER_COUNTERS)}
+       )''',
+    *_counter_triggers('items'),
+    *_counter_triggers('requests'),
+)
+
+# Every user's counters computed from scratch, as (user_id, *USER_COUNTERS)
+COUNT_USER_COUNTERS = (
+    f"SELECT user_id, {', '.join(f'sum({name}) AS {name}' for name in USER_COUNTERS)} FROM ("
+    + ' UNION ALL '.join(
+        f"""SELECT {owner} AS user_id, {', '.join(
+                ('count(*)' if other == name else '0') + f' AS {other}'
+                for other in USER_COUNTERS)}
+            FROM {table} WHERE {condition.format(row=table)} GROUP BY {owner}"""
+        for name, (table, owner, condition) in USER_COUNTERS.items()
+    )
+    + ') GROUP BY user_id'
+)
+
+# Per-category price summaries of available listings: count, sum (in cents,
+# so adding and removing prices never drifts) and a log-bucketed quantile
+# sketch. Sketch bucket i counts prices in (gamma^(i-1), gamma^i], so the
+# bucket's estimate is within PRICE_SKETCH_ACCURACY of every price in it
+PRICE_SKETCH_ACCURACY = 0.02
+PRICE_SKETCH_GAMMA = (1 + PRICE_SKETCH_ACCURACY) / (1 - PRICE_SKETCH_ACCURACY)
+PRICE_SKETCH_ZERO_BUCKET = -(1 << 20)  # free listings
+PRICED = "{row}.status IS 'available' AND {row}.category IS NOT NULL AND {row}.price IS NOT NULL"
+PRICE_CENTS = 'CAST(round({row}.price * 100) AS INTEGER)'
+PRICE_BUCKET = (f'CASE WHEN {{row}}.price > 0 THEN CAST(ceil(ln({{row}}.price) / '
+                f'{math.log(PRICE_SKETCH_GAMMA)!r}) AS INTEGER) '
+                f'ELSE {PRICE_SKETCH_ZERO_BUCKET} END')
+
+def _price_change(row, delta, unless=None):
+    """Statements adding {row}'s price to its category summary delta times"""
+    where = PRICED.format(row=row)
+    if unless:
+        where += f' AND NOT ({unless})'
+    return f"""INSERT INTO category_price_stats (category, listing_count, price_cents_sum)
+               SELECT {row}.category, {delta}, {delta} * {PRICE_CENTS.format(row=row)}
+               WHERE {where}
+               ON CONFLICT (category) DO UPDATE SET
+                   listing_count = listing_count + excluded.listing_count,
+                   price_cents_sum = price_cents_sum + excluded.price_cents_sum;
+               INSERT INTO category_price_sketch (category, bucket, count)
+               SELECT {row}.category, {PRICE_BUCKET.format(row=row)}, {delta} WHERE {where}
+               ON CONFLICT (category, bucket) DO UPDATE SET count = count + excluded.count;"""
+
+# Still summarised under the same category and price: no write needed
+_PRICE_UNCHANGED = (f"{PRICED.format(row='old')} AND {PRICED.format(row='new')}"
+                    " AND new.category IS old.category AND new.price IS old.price")
+
+# A handful of rows per category however many listings there are: at most
+# a few hundred sketch buckets cover every price from a cent to millions
+PRICE_STATS_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS category_price_stats (
+           category TEXT PRIMARY KEY,
+           listing_count INTEGER NOT NULL DEFAULT 0,
+           price_cents_sum INTEGER NOT NULL DEFAULT 0
+       ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS category_price_sketch (
+           category TEXT NOT NULL,
+           bucket INTEGER NOT NULL,
+           count INTEGER NOT NULL DEFAULT 0,
+           PRIMARY KEY (category, bucket)
+       ) WITHOUT ROWID''',
+    f"""CREATE TRIGGER IF NOT EXISTS items_price_stats_insert AFTER INSERT ON items BEGIN
+           {_price_change('new', 1)}
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS items_price_stats_delete AFTER DELETE ON items BEGIN
+           {_price_change('old', -1)}
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS items_price_stats_update
+       AFTER UPDATE OF status, category, price ON items BEGIN
+           {_price_change('old', -1, _PRICE_UNCHANGED)}
+           {_price_change('new', 1, _PRICE_UNCHANGED)}
+       END""",
+)
+
+# Both price summary tables computed from scratch
+COUNT_PRICE_STATS = (
+    f"""SELECT category, count(*), sum({PRICE_CENTS.format(row='items')})
+        FROM items WHERE {PRICED.format(row='items')} GROUP BY category""",
+    f"""SELECT category, {PRICE_BUCKET.format(row='items')} AS bucket, count(*)
+        FROM items WHERE {PRICED.format(row='items')} GROUP BY category, bucket""",
+)
+
+# messages is append-only. Inserting one bumps the recipient's unread count
+# and moves both members' last_message_id; the sender has read everything
+# up to their own message
+MESSAGING = (
+    """CREATE TRIGGER IF NOT EXISTS messages_no_update BEFORE UPDATE ON messages BEGIN
+           SELECT RAISE(ABORT, 'messages are append-only');
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_no_delete BEFORE DELETE ON messages BEGIN
+           SELECT RAISE(ABORT, 'messages are append-only');
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_unread_insert AFTER INSERT ON messages BEGIN
+           UPDATE conversation_members
+           SET unread_count = unread_count + 1, last_message_id = new.id
+           WHERE user_id = new.recipient_id AND peer_id = new.sender_id;
+           UPDATE conversation_members
+           SET unread_count = 0, last_read_id = new.id, last_message_id = new.id
+           WHERE user_id = new.sender_id AND peer_id = new.recipient_id;
+       END""",
+)
+
+# Whether image.value is an uploaded image id (images.IMAGE_ID) rather than a URL
+IS_IMAGE_ID = """(substr(image.value, 65) IN ('.jpg', '.png', '.gif', '.webp')
+    AND substr(image.value, 1, 64) NOT GLOB '*[^0-9a-f]*')"""
+
+# URL of image.value: uploaded image ids are served under UPLOADED_URL_PREFIX
+IMAGE_URL = f"""CASE WHEN {IS_IMAGE_ID} THEN '{UPLOADED_URL_PREFIX}' || image.value
+    ELSE image.value END"""
+
+# The images of the item aliased {row}, as a json_each table named image
+ITEM_IMAGES = """json_each(CASE WHEN json_valid({row}.images) THEN {row}.images ELSE '[]' END)
+    AS image"""
+
+def _renditions(name):
+    """SQL json_object of the original and resized URLs of the image whose name is the SQL name"""
+    urls = ', '.join(
+        f"'{key}', '{DERIVATIVE_URL_PREFIX}{preset}/' || {name} || '.{extension}'"
+        for key, preset, extension in (('thumbnail', 'thumbnail', 'jpg'),
+                                       ('thumbnail_webp', 'thumbnail', 'webp'),
+                                       ('medium', 'medium', 'jpg'),
+                                       ('medium_webp', 'medium', 'webp'))
+    )
+    return f"json_object('original', {IMAGE_URL}, {urls})"
+
+# Resized renditions of each image of the item aliased {row}, in image order.
+# Only uploaded images and files under IMAGE_URL_PREFIX can be resized;
+# others point every rendition back at the original URL
+IMAGE_VARIANTS = f"""(
+    SELECT json_group_array(CASE
+        WHEN {IS_IMAGE_ID} THEN {_renditions('image.value')}
+        WHEN image.value LIKE '{IMAGE_URL_PREFIX}%'
+            THEN {_renditions(f'substr(image.value, {len(IMAGE_URL_PREFIX) + 1})')}
+        ELSE json_object('original', image.value, 'thumbnail', image.value,
+                         'thumbnail_webp', image.value, 'medium', image.value,
+                         'medium_webp', image.value)
+    END)
+    FROM {ITEM_IMAGES}
+)"""
+
+# Public listing JSON for the item aliased {row}, rendered by SQLite so the
+# read endpoints can splice items.listing_json straight into responses
+LISTING_JSON = """json_object(
+    'id', {row}.id,
+    'title', {row}.title,
+    'description', {row}.description,
+    'price', CAST({row}.price AS REAL),
+    'category', {row}.category,
+    'condition', {row}.condition,
+    'seller_id', {row}.seller_id,
+    'seller_name', (SELECT username FROM users WHERE users.id = {row}.seller_id),
+    'location', {row}.location,
+    'status', {row}.status,
+    'date_posted', {row}.date_posted,
+    'images', json((SELECT json_group_array(""" + IMAGE_URL + """) FROM """ + ITEM_IMAGES + """)),
+    'image_variants', json(""" + IMAGE_VARIANTS + """)
+)"""
+
+# Keep items.listing_json rendered on every write that changes what it shows
+PRESERIALIZED_LISTINGS = (
+    f"""CREATE TRIGGER IF NOT EXISTS items_listing_json_insert AFTER INSERT ON items BEGIN
+            UPDATE items SET listing_json = {LISTING_JSON.format(row='new')} WHERE id = new.id;
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS items_listing_json_update
+        AFTER UPDATE OF title, description, price, category, condition, seller_id,
+                        location, status, images, date_posted ON items BEGIN
+            UPDATE items SET listing_json = {LISTING_JSON.format(row='new')} WHERE id = new.id;
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS users_listing_json_update
+        AFTER UPDATE OF username ON users BEGIN
+            UPDATE items SET listing_json = {LISTING_JSON.format(row='items')}
+            WHERE seller_id = new.id;
+        END""",
+)
+
+def create_indexes(cursor):
+    """Create every secondary index that does not exist yet"""
+    for statement in INDEXES:
+        cursor.execute(statement)
+
+def create_search_index(cursor):
+    """Create the full-text indexes, backfilling any new one from its source table"""
+    for table, statements in SEARCH_SCHEMA.items():
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        already_exists = cursor.fetchone() is not None
+
+        for statement in statements:
+            cursor.execute(statement)
+
+        if not already_exists:
+            cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+
+def create_change_tracking(cursor):
+    """Create the data_versions table and the triggers that bump it
+
+    A trigger whose stored definition differs from CHANGE_TRACKING (left by
+    an older version) is dropped and created again.
+    """
+    for statement in CHANGE_TRACKING:
+        name = statement.split('IF NOT EXISTS', 1)[1].split()[0]
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                       (name,))
+        stored = cursor.fetchone()
+        if stored and stored[0] != statement.replace(' IF NOT EXISTS', '', 1):
+            cursor.execute(f'DROP TRIGGER {name}')
+        cursor.execute(statement)
+
+def create_user_counters(cursor):
+    """Create user_counters and its triggers, filling it when it is new"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_counters'")
+    already_exists = cursor.fetchone() is not None
+
+    for statement in COUNTER_SCHEMA:
+        cursor.execute(statement)
+
+    if not already_exists:
+        cursor.execute(f'INSERT INTO user_counters {COUNT_USER_COUNTERS}')
+
+def create_price_stats(cursor):
+    """Create the category price summaries and their triggers, filling them when new
+
+    The sketch triggers call ln(), so check for SQLite's math functions here
+    rather than have every later listing insert fail without them.
+    """
+    cursor.execute('SELECT ln(1)')
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'category_price_stats'"
+    )
+    already_exists = cursor.fetchone() is not None
+
+    for statement in PRICE_STATS_SCHEMA:
+        cursor.execute(statement)
+
+    if not already_exists:
+        stats, sketch = COUNT_PRICE_STATS
+        cursor.execute(f'INSERT INTO category_price_stats {stats}')
+        cursor.execute(f'INSERT INTO category_price_sketch {sketch}')
+
+def create_messaging(cursor):
+    """Create the triggers keeping messages append-only and unread counts current"""
+    for statement in MESSAGING:
+        cursor.execute(statement)
+
+def create_preserialized_listings(cursor):
+    """Add items.listing_json if missing, its triggers, and render any unrendered rows
+
+    Triggers left by an older LISTING_JSON are replaced and every row is
+    rendered again in the current shape.
+    """
+    cursor.execute('PRAGMA table_info(items)')
+    if 'listing_json' not in [column[1] for column in cursor.fetchall()]:
+        cursor.execute('ALTER TABLE items ADD COLUMN listing_json TEXT')
+
+    # SQLite keeps each trigger's CREATE statement minus its IF NOT EXISTS
+    cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%listing_json%'"
+    )
+    stored = {row[0] for row in cursor.fetchall()}
+    current = {statement.replace(' IF NOT EXISTS', '', 1) for statement in PRESERIALIZED_LISTINGS}
+    outdated = bool(stored) and stored != current
+    if outdated:
+        for name in ('items_listing_json_insert', 'items_listing_json_update',
+                     'users_listing_json_update'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+    for statement in PRESERIALIZED_LISTINGS:
+        cursor.execute(statement)
+
+    cursor.execute(
+        f"UPDATE items SET listing_json = {LISTING_JSON.format(row='items')} "
+        + ("" if outdated else "WHERE listing_json IS NULL")
+    )
+
+def create_tables(cursor):
+    """Create the users, items, requests, messaging and revoked token tables"""
 
     # Create users table
     cursor.execute('''
@@ -37,6 +499,7 @@ def init_database():
         images TEXT,
         date_posted TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        listing_json TEXT,
         FOREIGN KEY (seller_id) REFERENCES users (id)
     )
     ''')
@@ -58,11 +521,261 @@ def init_database():
     )
     ''')
 
+    # One row per pair of users talking, stored as (lower id, higher id)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS conversations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_low INTEGER NOT NULL,
+        user_high INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (user_low, user_high),
+        FOREIGN KEY (user_low) REFERENCES users (id),
+        FOREIGN KEY (user_high) REFERENCES users (id)
+    )
+    ''')
+
+    # Each member's side of a conversation, kept current by the MESSAGING triggers
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS conversation_members (
+        user_id INTEGER NOT NULL,
+        peer_id INTEGER NOT NULL,
+        conversation_id INTEGER NOT NULL,
+        unread_count INTEGER NOT NULL DEFAULT 0,
+        last_read_id INTEGER NOT NULL DEFAULT 0,
+        last_message_id INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, peer_id),
+        FOREIGN KEY (conversation_id) REFERENCES conversations (id)
+    ) WITHOUT ROWID
+    ''')
+
+    # Append-only, so ids only grow and double as the pagination key
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        conversation_id INTEGER NOT NULL,
+        sender_id INTEGER NOT NULL,
+        recipient_id INTEGER NOT NULL,
+        body TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (conversation_id) REFERENCES conversations (id),
+        FOREIGN KEY (sender_id) REFERENCES users (id),
+        FOREIGN KEY (recipient_id) REFERENCES users (id)
+    )
+    ''')
+
+    # Logged-out token ids, shared by every worker process (see auth.revoke_token);
+    # ids only grow, so each process reads just the rows added since it last looked
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS revoked_tokens (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        token_id TEXT NOT NULL UNIQUE,
+        expires INTEGER NOT NULL
+    )
+    ''')
+
+    # Recent purchase request changes, read by the /request-events streams of
+    # every worker process (see events.record_request_events)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS request_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        seller_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        data TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+def create_derived_schema(cursor):
+    """Create the indexes, search tables and triggers built on top of the base tables"""
+    create_indexes(cursor)
+    create_search_index(cursor)
+    create_change_tracking(cursor)
+    create_user_counters(cursor)
+    create_price_stats(cursor)
+    create_messaging(cursor)
+    create_preserialized_listings(cursor)
+
+def init_database(db_path=DB_PATH):
+    """Initialize SQLite database with marketplace tables"""
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    create_tables(cursor)
+    create_derived_schema(cursor)
+
     conn.commit()
     conn.close()
 
     print(f"Database initialized successfully at: {db_path}")
     return db_path
 
+def migrate_database(db_path=DB_PATH):
+    """Bring an existing database up to date with the current tables, indexes and triggers"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    create_tables(cursor)
+    create_derived_schema(cursor)
+
+    conn.commit()
+    conn.close()
+
+    print(f"Database migrated successfully at: {db_path}")
+    return db_path
+
+# Synthetic data for scale testing (see seed_database)
+SEED_BATCH_SIZE = 100_000
+SEED_PASSWORD = 'password123'
+SEED_START = 1735689600  # 2025-01-01 00:00:00 UTC; item n is posted SEED_POST_INTERVAL * n later
+SEED_POST_INTERVAL = 60
+# Zipf exponents: how strongly listings concentrate on top sellers and requests on hot items
+SEED_SELLER_SKEW = 1.1
+SEED_ITEM_SKEW = 1.2
+SEED_CATEGORIES = ('Electronics', 'Books', 'Furniture', 'Clothing', 'Sports', 'Home')
+SEED_CONDITIONS = ('New', 'Like New', 'Good', 'Fair')
+SEED_LOCATIONS = ('Campus Library', 'Student Center', 'North Dorms', 'South Dorms', 'Gym')
+SEED_WORDS = ('macbook', 'textbook', 'lamp', 'bike', 'desk', 'chair', 'calculator', 'monitor',
+              'jacket', 'speaker', 'camera', 'guitar', 'kettle', 'backpack', 'printer')
+SEED_REQUEST_STATUSES = (('pending', 'approved', 'rejected'), (60, 10, 30))
+SEED_MESSAGES = ('Is this still available?', 'Can you do a lower price?',
+                 'I can pick it up today.', 'Does it come with a charger?')
+
+def zipf_weights(count, exponent):
+    """Cumulative Zipf weights for ranks 1..count (rank 1 is the most popular)"""
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+def _insert_batched(conn, statement, rows):
+    """executemany rows in transactions of SEED_BATCH_SIZE rows"""
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, SEED_BATCH_SIZE))
+        if not batch:
+            break
+        with conn:
+            conn.executemany(statement, batch)
+
+def _seed_items(rng, sellers, sold):
+    """Item rows; sellers[n - 1] is the seller of item n and the items in sold are sold"""
+    count = len(sellers)
+    names = [(first, second) for first in SEED_WORDS for second in SEED_WORDS]
+    for item_id, (first, second), seller_id, price, category, condition, location in zip(
+            itertools.count(1), rng.choices(names, k=count), sellers,
+            (round(rng.lognormvariate(3.5, 1.0), 2) for _ in range(count)),
+            rng.choices(SEED_CATEGORIES, k=count), rng.choices(SEED_CONDITIONS, k=count),
+            rng.choices(SEED_LOCATIONS, k=count)):
+        yield (item_id, f'{first} {second} {item_id}',
+               f'A {first} {second} in good shape, barely used', price, category, condition,
+               seller_id, 'sold' if item_id in sold else 'available', location,
+               f'["{first}_{second}_{item_id}.jpg"]', SEED_START + item_id * SEED_POST_INTERVAL)
+
+def _seed_requests(rng, users, sellers, request_items, request_statuses):
+    """Request rows for the given items and statuses from random buyers"""
+    count = len(request_items)
+    for item_id, status, buyer_id, message, delay, decided in zip(
+            request_items, request_statuses, rng.choices(range(1, users + 1), k=count),
+            rng.choices(SEED_MESSAGES, k=count), rng.choices(range(60, 14 * 86400), k=count),
+            rng.choices(range(60, 3 * 86400), k=count)):
+        seller_id = sellers[item_id - 1]
+        if buyer_id == seller_id:
+            buyer_id = buyer_id % users + 1
+        created = SEED_START + item_id * SEED_POST_INTERVAL + delay
+        yield (item_id, buyer_id, seller_id, status, message, created,
+               created if status == 'pending' else created + decided)
+
+def seed_database(db_path, users, items, requests, seed=0):
+    """Create a new database at db_path filled with synthetic users, items and requests
+
+    Sellers follow a Zipf distribution (a few users post most listings) and
+    so do requests over a shuffled ranking of items (a few hot items get
+    most of them). Items with an approved request are sold. Rows are
+    loaded with executemany in large transactions into bare tables; the
+    indexes, full-text tables and triggers are built once afterwards,
+    which is much faster than maintaining them row by row.
+    """
+    if os.path.exists(db_path):
+        raise FileExistsError(f"Refusing to seed existing database: {db_path}")
+    if users < 2 and items and requests:
+        raise ValueError("Seeding requests needs at least 2 users")
+    requests = requests if items else 0
+    rng = random.Random(seed)
+
+    sellers = rng.choices(range(1, users + 1), cum_weights=zipf_weights(users, SEED_SELLER_SKEW),
+                          k=items)
+    hot_items = list(range(1, items + 1))
+    rng.shuffle(hot_items)
+    request_items = rng.choices(
+        hot_items, cum_weights=zipf_weights(items, SEED_ITEM_SKEW), k=requests
+    ) if requests else []
+    request_statuses = rng.choices(SEED_REQUEST_STATUSES[0], SEED_REQUEST_STATUSES[1],
+                                   k=requests)
+    sold = {item_id for item_id, status in zip(request_items, request_statuses)
+            if status == 'approved'}
+
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA cache_size = -200000')
+    create_tables(conn.cursor())
+
+    password_hash = hash_password(SEED_PASSWORD)
+    _insert_batched(
+        conn, 'INSERT INTO users (id, username, email, password_hash) VALUES (?, ?, ?, ?)',
+        ((n, f'user_{n}', f'user_{n}@example.com', password_hash) for n in range(1, users + 1))
+    )
+    # listing_json is rendered on the way in rather than backfilled afterwards
+    _insert_batched(
+        conn,
+        f"""INSERT INTO items (id, title, description, price, category, condition, seller_id,
+                              status, location, images, date_posted, created_at, listing_json)
+            SELECT *, date_posted, {LISTING_JSON.format(row='seeded')}
+            FROM (SELECT ? AS id, ? AS title, ? AS description, ? AS price, ? AS category,
+                         ? AS condition, ? AS seller_id, ? AS status, ? AS location,
+                         ? AS images, datetime(?, 'unixepoch') AS date_posted) AS seeded""",
+        _seed_items(rng, sellers, sold)
+    )
+    _insert_batched(
+        conn,
+        '''INSERT INTO requests (item_id, buyer_id, seller_id, status, message,
+                                  created_at, updated_at)
+           VALUES (?, ?, ?, ?, ?, datetime(?, 'unixepoch'), datetime(?, 'unixepoch'))''',
+        _seed_requests(rng, users, sellers, request_items, request_statuses)
+    )
+
+    with conn:
+        create_derived_schema(conn.cursor())
+        conn.execute('PRAGMA analysis_limit = 1000')
+        conn.execute('ANALYZE')
+    conn.close()
+    return {'users': users, 'items': items, 'requests': requests}
+
+def main(argv=None):
+    """Create (or migrate) the database; with --items, seed a new one with synthetic data"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--db', default=DB_PATH, help='database file')
+    parser.add_argument('--users', type=int, help='synthetic users to seed (default: items/10)')
+    parser.add_argument('--items', type=int, help='synthetic items to seed')
+    parser.add_argument('--requests', type=int, help='synthetic requests to seed (default: items)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--replace', action='store_true', help='delete --db before seeding')
+    args = parser.parse_args(argv)
+
+    if args.items is None:
+        init_database(args.db)
+        return
+
+    if os.path.exists(args.db):
+        if not args.replace:
+            parser.error(f"{args.db} already exists; pass --replace to overwrite it")
+        os.remove(args.db)
+    started = time.perf_counter()
+    counts = seed_database(
+        args.db, args.users or max(10, args.items // 10), args.items,
+        args.items if args.requests is None else args.requests, args.seed
+    )
+    print(f"Seeded {counts['users']} users, {counts['items']} items and "
+          f"{counts['requests']} requests into {args.db} "
+          f"in {time.perf_counter() - started:.1f}s")
+
 if __name__ == '__main__':
-    init_database()
+    main()
@@ -1,15 +1,93 @@
 """listings.py — Database API endpoints for marketplace listings"""
 
 import json
+import math
+import os
 import sqlite3
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from werkzeug.exceptions import BadRequest
 from db import get_db_connection
+from auth import authorize, token_allows
+from versioning import versioned
+from cache import cached
+from streaming import stream_json_rows, wants_stream
+from pagination import (DEFAULT_PAGE_SIZE, PaginationError, decode_cursor, encode_cursor,
+                        parse_page_args)
 
 
 listings_bp = Blueprint('listings_api', __name__)
 
+REQUIRED_LISTING_FIELDS = ['title', 'description', 'price', 'category',
+                           'condition', 'seller_id', 'location']
+MAX_BATCH_LISTINGS = int(os.environ.get('MARKETPLACE_MAX_BATCH_LISTINGS', '500'))
+
+def seller_scopes(seller_id):
+    """Version scopes for one seller's listings (none when the id is missing)"""
+    return [f'items:{seller_id}'] if seller_id else []
+
+def listing_json(item):
+    """Stored JSON text of a listing (items.listing_json, kept current by triggers)"""
+    return item['listing_json']
+
+def spliced_response(key, fragments, status=200, raw_fields=None, **fields):
+    """JSON response {key: [fragments], **fields} built around pre-serialized fragments
+
+    raw_fields maps further keys to values that are already JSON text.
+    """
+    body = f'{{{json.dumps(key)}: [{",".join(fragments)}]'
+    for name, text in (raw_fields or {}).items():
+        body += f', {json.dumps(name)}: {text}'
+    for name, value in fields.items():
+        body += f', {json.dumps(name)}: {json.dumps(value)}'
+    return Response(body + '}', status=status, mimetype='application/json')
+
+def feed_tail(count, has_more, last_item):
+    """Closing keys of a streamed /get-all-listings body"""
+    next_cursor = encode_cursor(last_item['date_posted'], last_item['id']) if has_more else None
+    return f'], "total_count": {count}, "next_cursor": {json.dumps(next_cursor)}}}'
+
+def parse_price(value):
+    """A listing's price as a finite float; raises ValueError when it is not one"""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"Invalid price: {value!r}")
+    try:
+        price = float(value)
+    except ValueError as error:
+        raise ValueError(f"Invalid price: {value!r}") from error
+    if not math.isfinite(price):
+        raise ValueError(f"Invalid price: {value!r}")
+    return price
+
+def listing_values(data):
+    """INSERT parameters for one /post-listings entry; raises ValueError when it is invalid"""
+    if not isinstance(data, dict):
+        raise ValueError("Listing must be a JSON object")
+    missing_fields = [field for field in REQUIRED_LISTING_FIELDS if field not in data]
+    if missing_fields:
+        raise ValueError(f"Missing required fields: {missing_fields}")
+    if not isinstance(data['seller_id'], int) or isinstance(data['seller_id'], bool):
+        raise ValueError("seller_id must be an integer")
+    price = parse_price(data['price'])
+
+    return (data['title'], data['description'], price, data['category'], data['condition'],
+            data['seller_id'], data['location'], json.dumps(data.get('images', [])), 'available')
+
+def existing_user_ids(conn, user_ids):
+    """The subset of user_ids that belong to a user, looked up in one query"""
+    if not user_ids:
+        return set()
+    placeholders = ', '.join('?' for _ in user_ids)
+    rows = conn.execute(f'SELECT id FROM users WHERE id IN ({placeholders})', list(user_ids))
+    return {row['id'] for row in rows}
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query that matches every word as a prefix"""
+    terms = [term.replace('"', '') for term in text.split()]
+    return ' '.join(f'"{term}"*' for term in terms if term)
+
 @listings_bp.route('/get-all-listings', methods=['GET'])
+@versioned(lambda: ['items'])
+@cached(lambda: ['items'])
 def get_all_listings():
     """
     Get All Listings
@@ -17,7 +95,29 @@ def get_all_listings():
     tags:
       - Listings
     summary: Retrieve all available listings
-    description: Returns a list of all available listings in the marketplace
+    description: >
+      Returns available listings in the marketplace, newest first. Pass
+      limit to page through the feed and hand back next_cursor as cursor
+      to get the following page. Without limit every listing is returned.
+    parameters:
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Page size (1-100)
+        example: 20
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Opaque cursor taken from next_cursor of the previous page
+      - name: stream
+        in: query
+        type: boolean
+        required: false
+        description: >
+          Stream the body as it is read from the database (same JSON shape),
+          keeping server memory flat for large feeds
     responses:
       200:
         description: List of all available listings in the marketplace
@@ -59,43 +159,62 @@ def get_all_listings():
             total_count:
               type: integer
               example: 4
+            next_cursor:
+              type: string
+              description: Cursor for the next page, null on the last page
+      304:
+        description: Not modified since the ETag sent in If-None-Match
+      400:
+        description: Invalid limit or cursor
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Invalid cursor"
     """
     try:
+        limit, page_cursor = parse_page_args(request.args)
+
         conn = get_db_connection()
         cursor = conn.cursor()
         sql = '''
-        SELECT i.id, i.title, i.description, i.price, i.category, i.condition,
-               i.seller_id, u.username as seller_name, i.location, i.status, 
-               i.images, i.date_posted
+        SELECT i.id, i.date_posted, i.listing_json
         FROM items i
-        JOIN users u ON i.seller_id = u.id
         WHERE i.status = 'available'
-        ORDER BY i.date_posted DESC
         '''
-        cursor.execute(sql)
+        params = []
+
+        # Keyset pagination: seek past the last (date_posted, id) already seen
+        if page_cursor:
+            sql += ' AND (i.date_posted, i.id) < (?, ?)'
+            params.extend(decode_cursor(page_cursor, 2))
+
+        sql += ' ORDER BY i.date_posted DESC, i.id DESC'
+
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit + 1)
+
+        cursor.execute(sql, params)
+
+        if wants_stream():
+            return stream_json_rows(cursor, listing_json, '{"listings": [', feed_tail, limit)
+
         items = cursor.fetchall()
-        listings = []
-        for item in items:
-            listing = {
-                'id': item['id'],
-                'title': item['title'],
-                'description': item['description'],
-                'price': float(item['price']),
-                'category': item['category'],
-                'condition': item['condition'],
-                'seller_id': item['seller_id'],
-                'seller_name': item['seller_name'],
-                'location': item['location'],
-                'status': item['status'],
-                'date_posted': item['date_posted'],
-                'images': json.loads(item['images']) if item['images'] else []
-            }
-            listings.append(listing)
+
+        next_cursor = None
+        if limit is not None and len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor(items[-1]['date_posted'], items[-1]['id'])
         conn.close()
-        return jsonify({
-            "listings": listings,
-            "total_count": len(listings)
-        })
+        return spliced_response(
+            "listings", [listing_json(item) for item in items],
+            total_count=len(items),
+            next_cursor=next_cursor
+        )
+    except PaginationError as page_error:
+        return jsonify({"error": str(page_error)}), 400
     except sqlite3.Error as db_error:
         return jsonify({"error": f"Database error: {str(db_error)}"}), 500
     except (TypeError, KeyError) as data_error:
@@ -196,12 +315,11 @@ def post_listing():
             return jsonify({"error": "No data provided"}), 400
 
         # Validate required fields
-        required_fields = ['title', 'description', 'price', 'category',
-                           'condition', 'seller_id', 'location']
-
-        missing_fields = [field for field in required_fields if field not in data]
+        missing_fields = [field for field in REQUIRED_LISTING_FIELDS if field not in data]
         if missing_fields:
             return jsonify({"error": f"Missing required fields: {missing_fields}"}), 400
+        price = parse_price(data['price'])
+        authorize(data['seller_id'])
 
         # Verify seller exists
         conn = get_db_connection()
@@ -220,7 +338,7 @@ def post_listing():
                (title, description, price, category, condition, seller_id,
                 location, images, status)
                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-            (data['title'], data['description'], float(data['price']),
+            (data['title'], data['description'], price,
              data['category'], data['condition'], data['seller_id'],
              data['location'], images_json, 'available')
         )
@@ -228,45 +346,181 @@ def post_listing():
         listing_id = cursor.lastrowid
         conn.commit()
 
-        # Fetch the newly created listing with seller info
-        cursor.execute(
-            '''SELECT i.id, i.title, i.description, i.price, i.category, i.condition,
-                      i.seller_id, u.username as seller_name, i.location, i.status,
-                      i.images, i.date_posted
-               FROM items i
-               JOIN users u ON i.seller_id = u.id
-               WHERE i.id = ?''',
-            (listing_id,)
-        )
+        # Fetch the newly created listing, rendered with seller info by the insert trigger
+        cursor.execute('SELECT listing_json FROM items WHERE id = ?', (listing_id,))
         item = cursor.fetchone()
         conn.close()
 
-        listing = {
-            'id': item['id'],
-            'title': item['title'],
-            'description': item['description'],
-            'price': float(item['price']),
-            'category': item['category'],
-            'condition': item['condition'],
-            'seller_id': item['seller_id'],
-            'seller_name': item['seller_name'],
-            'location': item['location'],
-            'status': item['status'],
-            'date_posted': item['date_posted'],
-            'images': json.loads(item['images']) if item['images'] else []
-        }
+        return Response(
+            f'{{"message": "Listing created successfully", "listing": {listing_json(item)}}}',
+            status=201, mimetype='application/json'
+        )
+
+    except sqlite3.Error as db_error:
+        return jsonify({"error": f"Database error: {str(db_error)}"}), 500
+    except (KeyError, BadRequest, ValueError) as error:
+        return jsonify({"error": f"Invalid request data: {str(error)}"}), 400
+
+@listings_bp.route('/post-listings', methods=['POST'])
+def post_listings():
+    """
+    Post Listings In Bulk
+    ---
+    tags:
+      - Listings
+    summary: Create many listings in one call
+    description: >
+      Takes an array of listings shaped like the /post-listing body. Every
+      seller is checked once and all valid listings are inserted in a single
+      transaction. Invalid entries are reported by their index in errors
+      without stopping the rest of the batch.
+    parameters:
+      - name: listings
+        in: body
+        required: true
+        schema:
+          type: array
+          items:
+            type: object
+            required:
+              - title
+              - description
+              - price
+              - category
+              - condition
+              - seller_id
+              - location
+            properties:
+              title:
+                type: string
+                example: "iPhone 12"
+              description:
+                type: string
+                example: "Barely used iPhone 12 in excellent condition"
+              price:
+                type: number
+                example: 500.00
+              category:
+                type: string
+                example: "Electronics"
+              condition:
+                type: string
+                example: "Excellent"
+              seller_id:
+                type: integer
+                example: 1
+              location:
+                type: string
+                example: "Student Center"
+              images:
+                type: array
+                items:
+                  type: string
+                example: ["image1.jpg"]
+    responses:
+      201:
+        description: At least one listing was created
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+              example: "Created 2 of 3 listings"
+            created:
+              type: array
+              items:
+                type: object
+                properties:
+                  index:
+                    type: integer
+                    example: 0
+                  id:
+                    type: integer
+                    example: 5
+            errors:
+              type: array
+              items:
+                type: object
+                properties:
+                  index:
+                    type: integer
+                    example: 2
+                  error:
+                    type: string
+                    example: "Seller 99 not found"
+      400:
+        description: Not an array, or no listing in it was valid (see errors)
+      413:
+        description: More than MARKETPLACE_MAX_BATCH_LISTINGS listings
+      500:
+        description: Database error
+    """
+    try:
+        data = request.get_json()
+
+        if not isinstance(data, list) or not data:
+            return jsonify({"error": "Expected a non-empty array of listings"}), 400
+        if len(data) > MAX_BATCH_LISTINGS:
+            return jsonify({"error": f"At most {MAX_BATCH_LISTINGS} listings per call"}), 413
+
+        valid, errors = [], []
+        for index, listing in enumerate(data):
+            try:
+                values = listing_values(listing)
+            except ValueError as error:
+                errors.append({"index": index, "error": str(error)})
+                continue
+            if token_allows(values[5]):
+                valid.append((index, values))
+            else:
+                errors.append({"index": index,
+                               "error": f"Not allowed to post as seller {values[5]}"})
+
+        conn = get_db_connection()
+        # Take the write lock up front so the seller check and the inserts are one unit
+        # and the AUTOINCREMENT ids handed out below are consecutive
+        conn.execute('BEGIN IMMEDIATE')
+
+        known_sellers = existing_user_ids(conn, {values[5] for _, values in valid})
+
+        accepted = []
+        for index, values in valid:
+            if values[5] in known_sellers:
+                accepted.append((index, values))
+            else:
+                errors.append({"index": index, "error": f"Seller {values[5]} not found"})
 
+        created = []
+        if accepted:
+            conn.executemany(
+                '''INSERT INTO items
+                   (title, description, price, category, condition, seller_id,
+                    location, images, status)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                [values for _, values in accepted]
+            )
+            last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+            first_id = last_id - len(accepted) + 1
+            created = [{"index": index, "id": first_id + offset}
+                       for offset, (index, _) in enumerate(accepted)]
+        conn.commit()
+        conn.close()
+
+        errors.sort(key=lambda error: error['index'])
         return jsonify({
-            "message": "Listing created successfully",
-            "listing": listing
-        }), 201
+            "message": f"Created {len(created)} of {len(data)} listings",
+            "created": created,
+            "errors": errors
+        }), 201 if created else 400
 
     except sqlite3.Error as db_error:
         return jsonify({"error": f"Database error: {str(db_error)}"}), 500
-    except (KeyError, BadRequest, ValueError) as error:
+    except BadRequest as error:
         return jsonify({"error": f"Invalid request data: {str(error)}"}), 400
 
 @listings_bp.route('/get-my-listings', methods=['GET'])
+@versioned(lambda: seller_scopes(request.args.get('user_id', type=int)))
+@cached(lambda: seller_scopes(request.args.get('user_id', type=int)))
 def get_my_listings():
     """
     Get Current User's Listings
@@ -314,6 +568,8 @@ def get_my_listings():
             user_id:
               type: integer
               example: 1
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       400:
         description: Missing user_id parameter
         schema:
@@ -341,8 +597,7 @@ def get_my_listings():
         cursor = conn.cursor()
 
         cursor.execute(
-            '''SELECT id, title, description, price, category, condition,
-                      seller_id, location, status, images, date_posted
+            '''SELECT listing_json
                FROM items
                WHERE seller_id = ?
                ORDER BY date_posted DESC''',
@@ -350,28 +605,12 @@ def get_my_listings():
         )
         items = cursor.fetchall()
 
-        user_listings = []
-        for item in items:
-            listing = {
-                'id': item['id'],
-                'title': item['title'],
-                'description': item['description'],
-                'price': float(item['price']),
-                'category': item['category'],
-                'condition': item['condition'],
-                'location': item['location'],
-                'status': item['status'],
-                'date_posted': item['date_posted'],
-                'images': json.loads(item['images']) if item['images'] else []
-            }
-            user_listings.append(listing)
-
         conn.close()
-        return jsonify({
-            "user_listings": user_listings,
-            "total_count": len(user_listings),
-            "user_id": user_id
-        })
+        return spliced_response(
+            "user_listings", [listing_json(item) for item in items],
+            total_count=len(items),
+            user_id=user_id
+        )
 
     except sqlite3.Error as db_error:
         return jsonify({"error": f"Database error: {str(db_error)}"}), 500
@@ -379,6 +618,7 @@ def get_my_listings():
         return jsonify({"error": f"Data error: {str(data_error)}"}), 500
 
 @listings_bp.route('/get-item-listing', methods=['GET'])
+@cached(lambda: ['items'])
 def get_item_listing():
     """
     Get Item Listing by ID
@@ -457,39 +697,144 @@ def get_item_listing():
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        cursor.execute(
-            '''SELECT i.id, i.title, i.description, i.price, i.category, i.condition,
-                      i.seller_id, u.username as seller_name, i.location, i.status,
-                      i.images, i.date_posted
-               FROM items i
-               JOIN users u ON i.seller_id = u.id
-               WHERE i.id = ?''',
-            (item_id,)
-        )
+        cursor.execute('SELECT listing_json FROM items WHERE id = ?', (item_id,))
         item = cursor.fetchone()
         conn.close()
 
         if not item:
             return jsonify({"error": "Item not found"}), 404
 
-        listing = {
-            'id': item['id'],
-            'title': item['title'],
-            'description': item['description'],
-            'price': float(item['price']),
-            'category': item['category'],
-            'condition': item['condition'],
-            'seller_id': item['seller_id'],
-            'seller_name': item['seller_name'],
-            'location': item['location'],
-            'status': item['status'],
-            'date_posted': item['date_posted'],
-            'images': json.loads(item['images']) if item['images'] else []
-        }
-
-        return jsonify(listing)
+        return Response(listing_json(item), mimetype='application/json')
 
     except sqlite3.Error as db_error:
         return jsonify({"error": f"Database error: {str(db_error)}"}), 500
     except (TypeError, KeyError) as data_error:
         return jsonify({"error": f"Data error: {str(data_error)}"}), 500
+
+@listings_bp.route('/search-listings', methods=['GET'])
+def search_listings():
+    """
+    Search Listings
+    ---
+    tags:
+      - Listings
+    summary: Full-text search over available listings
+    description: >
+      Matches every word of q (as a prefix) against title, description,
+      category and location. Results are ranked by relevance (bm25) and
+      paged with limit and cursor, like /get-all-listings.
+    parameters:
+      - name: q
+        in: query
+        type: string
+        required: true
+        description: Search text
+        example: "macbook"
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Page size (1-100, default 20)
+        example: 20
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Opaque cursor taken from next_cursor of the previous page
+    responses:
+      200:
+        description: Matching listings, best match first
+        schema:
+          type: object
+          properties:
+            listings:
+              type: array
+              items:
+                type: object
+                properties:
+                  id:
+                    type: integer
+                    example: 1
+                  title:
+                    type: string
+                    example: "MacBook Pro 13-inch"
+                  price:
+                    type: number
+                    example: 800.00
+                  seller_name:
+                    type: string
+                    example: "John Doe"
+                  snippet:
+                    type: string
+                    example: "Gently used <mark>MacBook</mark> Pro, perfect for students"
+            total_count:
+              type: integer
+              example: 1
+            next_cursor:
+              type: string
+              description: Cursor for the next page, null on the last page
+      400:
+        description: Missing search text or invalid limit/cursor
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "q parameter is required"
+      500:
+        description: Database error
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Database error: connection failed"
+    """
+    try:
+        match_query = build_match_query(request.args.get('q', ''))
+        if not match_query:
+            return jsonify({"error": "q parameter is required"}), 400
+
+        limit, page_cursor = parse_page_args(request.args, DEFAULT_PAGE_SIZE)
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        sql = '''
+        SELECT i.id,
+               json_set(i.listing_json, '$.snippet',
+                        snippet(items_fts, -1, '<mark>', '</mark>', '…', 16)) as listing_json,
+               bm25(items_fts) as score
+        FROM items_fts
+        JOIN items i ON i.id = items_fts.rowid
+        WHERE items_fts MATCH ? AND i.status = 'available'
+        '''
+        params = [match_query]
+
+        # Keyset pagination on (score, id); lower bm25 scores are better matches
+        if page_cursor:
+            sql += ' AND (bm25(items_fts), i.id) > (?, ?)'
+            params.extend(decode_cursor(page_cursor, 2))
+
+        sql += ' ORDER BY score, i.id LIMIT ?'
+        params.append(limit + 1)
+
+        cursor.execute(sql, params)
+        items = cursor.fetchall()
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor(items[-1]['score'], items[-1]['id'])
+
+        conn.close()
+        return spliced_response(
+            "listings", [listing_json(item) for item in items],
+            total_count=len(items),
+            next_cursor=next_cursor
+        )
+    except PaginationError as page_error:
+        return jsonify({"error": str(page_error)}), 400
+    except sqlite3.Error as db_error:
+        return jsonify({"error": f"Database error: {str(db_error)}"}), 500
+    except (TypeError, KeyError) as data_error:
+        return jsonify({"error": f"Data error: {str(data_error)}"}), 500
@@ -4,23 +4,31 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 from flasgger import Swagger
 from requesting import requests_bp
+from moderation import moderation_bp
 from listings import listings_bp
+from browse import browse_bp
+from images import images_bp
+from uploads import uploads_bp
+from events import events_bp
+from messaging import messaging_bp
+from counters import counters_bp
+from price_stats import price_stats_bp
 from user import user_bp
-from init_db import init_database
+from init_db import init_database, migrate_database
+from cache import response_cache
+import db
+import auth
+import compression
 
 # Initialize database on first run
 def initialize_app():
     """Initialize the application and database."""
-    db_path = os.path.join(os.path.dirname(__file__), 'marketplace.db')
-    if not os.path.exists(db_path):
+    if not os.path.exists(db.DB_PATH):
         print("First run detected - initializing database...")
         init_database()
     else:
-        print("Database already exists - skipping initialization")
-
-# Create a new Flask web application instance
-app = Flask(__name__)
-CORS(app)  # Enable Cross-Origin Resource Sharing (CORS) for the app
+        print("Database already exists - applying migrations")
+        migrate_database()
 
 # Configure Swagger
 swagger_config = {
@@ -38,15 +46,6 @@ swagger_config = {
     "specs_route": "/apidocs/"
 }
 
-swagger = Swagger(app, config=swagger_config)
-
-# Register blueprints
-app.register_blueprint(requests_bp, url_prefix='/')
-app.register_blueprint(listings_bp, url_prefix='/')
-app.register_blueprint(user_bp, url_prefix='/')
-
-# Define a URL path; this one responds to the homepage.
-@app.route('/')
 def home():
     """Handle requests to the root URL ('/').
 
@@ -55,6 +54,56 @@ def home():
     """
     return jsonify({"message": "Group Project - Market Place API running!"})
 
+def cache_stats():
+    """Report the listing response cache counters.
+
+    Returns:
+        jsonify: Hits, misses, evictions, invalidations, expirations and size,
+        plus the same counters for compressed bodies under "compressed".
+    """
+    return jsonify({**response_cache.stats(),
+                    "compressed": compression.compressed_cache.stats()})
+
+def create_app(config=None):
+    """Create and configure a Flask application instance.
+
+    Args:
+        config (dict): Optional Flask config overrides (e.g. DATABASE, DB_POOL_SIZE).
+
+    Returns:
+        Flask: The application with every blueprint registered.
+    """
+    # Create a new Flask web application instance
+    flask_app = Flask(__name__)
+    flask_app.config.update(config or {})
+    # Enable Cross-Origin Resource Sharing (CORS) for the app
+    CORS(flask_app, expose_headers=['X-Next-Cursor'])
+    db.init_app(flask_app)  # Pooled SQLite connections, returned on request teardown
+    auth.init_app(flask_app)  # Bearer tokens checked in memory, user id on g.user_id
+    compression.init_app(flask_app)  # gzip/brotli for clients that accept it
+
+    Swagger(flask_app, config=swagger_config)
+
+    # Register blueprints
+    flask_app.register_blueprint(requests_bp, url_prefix='/')
+    flask_app.register_blueprint(moderation_bp, url_prefix='/')
+    flask_app.register_blueprint(listings_bp, url_prefix='/')
+    flask_app.register_blueprint(browse_bp, url_prefix='/')
+    flask_app.register_blueprint(images_bp, url_prefix='/')
+    flask_app.register_blueprint(uploads_bp, url_prefix='/')
+    flask_app.register_blueprint(events_bp, url_prefix='/')
+    flask_app.register_blueprint(messaging_bp, url_prefix='/')
+    flask_app.register_blueprint(counters_bp, url_prefix='/')
+    flask_app.register_blueprint(price_stats_bp, url_prefix='/')
+    flask_app.register_blueprint(user_bp, url_prefix='/')
+
+    # Define a URL path; this one responds to the homepage.
+    flask_app.add_url_rule('/', view_func=home)
+    flask_app.add_url_rule('/cache-stats', view_func=cache_stats)
+    return flask_app
+
+app = create_app()
+
 # Start the Flask development server when the script is run
 if __name__ == "__main__":
     initialize_app()
@@ -0,0 +1,524 @@
+"""messaging.py — Direct messages between users with keyset-paginated history
+
+Messages are append-only and their ids only grow, so a page of history is
+an index range on (conversation_id, id): "before id X" for older pages and
+"after id X" for new ones, however long the conversation. Unread counts
+live in conversation_members and are bumped by a trigger on insert
+(see init_db.MESSAGING), so reading them never counts messages.
+
+GET /messages with after and wait long-polls: it answers as soon as a
+message arrives in this process, and re-checks the database every
+MESSAGE_POLL_INTERVAL seconds for messages sent through other workers.
+"""
+
+import os
+import sqlite3
+import time
+from flask import Blueprint, g, jsonify, request
+from werkzeug.exceptions import BadRequest
+from db import get_db_connection, release_db_connection
+from auth import authorize
+from events import EventBroker
+from pagination import MAX_PAGE_SIZE
+
+messaging_bp = Blueprint('messaging', __name__)
+
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_LENGTH = int(os.environ.get('MARKETPLACE_MAX_MESSAGE_LENGTH', '4000'))
+MAX_MESSAGE_WAIT = float(os.environ.get('MARKETPLACE_MAX_MESSAGE_WAIT', '25'))
+MESSAGE_POLL_INTERVAL = float(os.environ.get('MARKETPLACE_MESSAGE_POLL_INTERVAL', '1'))
+
+# Wakes long-polls in this process; nothing is replayed, a woken poll rereads
+message_events = EventBroker()
+
+MESSAGE_FIELDS = ('id', 'conversation_id', 'sender_id', 'recipient_id', 'body', 'created_at')
+MESSAGE_COLUMNS = ', '.join(f'm.{field}' for field in MESSAGE_FIELDS)
+
+
+class MessagingError(Exception):
+    """A messaging call that must be refused"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.body = {"message": message}
+
+
+def conversation_pair(user_id, peer_id):
+    """The (user_low, user_high) key of the conversation between two users"""
+    return (user_id, peer_id) if user_id < peer_id else (peer_id, user_id)
+
+
+def conversation_topic(pair):
+    """message_events topic of one conversation"""
+    return f'conversation:{pair[0]}-{pair[1]}'
+
+
+def message_from_row(row):
+    """Message as returned by /messages"""
+    return {
+        'id': row['id'],
+        'conversation_id': row['conversation_id'],
+        'from': row['sender_id'],
+        'to': row['recipient_id'],
+        'text': row['body'],
+        'created_at': row['created_at']
+    }
+
+
+def int_arg(name):
+    """Integer query parameter name, or None when absent"""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError as error:
+        raise MessagingError(400, f"{name} must be an integer") from error
+
+
+def parse_message(data):
+    """Validate a POST /messages body into (sender_id, recipient_id, text)"""
+    if not isinstance(data, dict):
+        raise MessagingError(400, "Invalid/Missing fields.")
+    sender_id, recipient_id, text = (data.get('sender_id'), data.get('recipient_id'),
+                                     data.get('text'))
+    if (not isinstance(sender_id, int) or not isinstance(recipient_id, int)
+            or not isinstance(text, str) or not text.strip()):
+        raise MessagingError(400, "Invalid/Missing fields.")
+    if sender_id == recipient_id:
+        raise MessagingError(400, "You cannot message yourself")
+    if len(text) > MAX_MESSAGE_LENGTH:
+        raise MessagingError(413, f"Messages are limited to {MAX_MESSAGE_LENGTH} characters")
+    return sender_id, recipient_id, text
+
+
+def store_message(conn, sender_id, recipient_id, text):
+    """Append a message, creating the conversation on first contact; returns its row"""
+    pair = conversation_pair(sender_id, recipient_id)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Foreign keys are not enforced, so neither side may be a phantom user
+        found = {row['id'] for row in conn.execute(
+            'SELECT id FROM users WHERE id IN (?, ?)', (sender_id, recipient_id)
+        )}
+        if sender_id not in found:
+            raise MessagingError(404, "Sender not found")
+        if recipient_id not in found:
+            raise MessagingError(404, "Recipient not found")
+        created = conn.execute(
+            'INSERT OR IGNORE INTO conversations (user_low, user_high) VALUES (?, ?)', pair
+        ).rowcount
+        conversation_id = conn.execute(
+            'SELECT id FROM conversations WHERE user_low = ? AND user_high = ?', pair
+        ).fetchone()['id']
+        if created:
+            conn.execute(
+                '''INSERT INTO conversation_members (user_id, peer_id, conversation_id)
+                   VALUES (?, ?, ?), (?, ?, ?)''',
+                (sender_id, recipient_id, conversation_id,
+                 recipient_id, sender_id, conversation_id)
+            )
+        message = conn.execute(
+            f'''INSERT INTO messages (conversation_id, sender_id, recipient_id, body)
+                VALUES (?, ?, ?, ?)
+                RETURNING {', '.join(MESSAGE_FIELDS)}''',
+            (conversation_id, sender_id, recipient_id, text)
+        ).fetchall()[0]
+    except (MessagingError, sqlite3.Error):
+        conn.rollback()
+        raise
+
+    conn.commit()
+    return message
+
+
+def fetch_messages(conn, pair, limit, before=None, after=None):
+    """Up to limit messages between pair, oldest first
+
+    With after, the oldest messages newer than it; otherwise the newest
+    ones older than before (or the newest of all).
+    """
+    if after is not None:
+        return conn.execute(
+            f'''SELECT {MESSAGE_COLUMNS} FROM conversations c
+                JOIN messages m ON m.conversation_id = c.id
+                WHERE c.user_low = ? AND c.user_high = ? AND m.id > ?
+                ORDER BY m.id LIMIT ?''',
+            (*pair, after, limit)
+        ).fetchall()
+    rows = conn.execute(
+        f'''SELECT {MESSAGE_COLUMNS} FROM conversations c
+            JOIN messages m ON m.conversation_id = c.id
+            WHERE c.user_low = ? AND c.user_high = ? {'' if before is None else 'AND m.id < ?'}
+            ORDER BY m.id DESC LIMIT ?''',
+        (*pair, limit) if before is None else (*pair, before, limit)
+    ).fetchall()
+    return rows[::-1]
+
+
+def wait_for_messages(pair, after, limit, timeout):
+    """fetch_messages after `after`, waiting up to timeout seconds for the first one"""
+    # Subscribed before the first read, so a message sent in between still wakes us
+    subscription = message_events.subscribe(conversation_topic(pair))
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            rows = fetch_messages(get_db_connection(), pair, limit, after=after)
+            remaining = deadline - time.monotonic()
+            if rows or remaining <= 0 or subscription.closed:
+                return rows
+            # Don't hold a pooled connection while sleeping
+            release_db_connection()
+            subscription.wait(min(remaining, MESSAGE_POLL_INTERVAL))
+    finally:
+        message_events.unsubscribe(subscription)
+
+
+@messaging_bp.route('/messages', methods=['POST'])
+def send_message():
+    """
+    Send a Message
+    ---
+    tags:
+      - Messages
+    summary: Send a direct message to another user
+    description: >
+      Appends a message to the conversation between sender and recipient,
+      starting the conversation on first contact, and adds one to the
+      recipient's unread count.
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          required:
+            - sender_id
+            - recipient_id
+            - text
+          properties:
+            sender_id:
+              type: integer
+              example: 1
+            recipient_id:
+              type: integer
+              example: 2
+            text:
+              type: string
+              example: "Is the bike still available?"
+    responses:
+      201:
+        description: Message stored
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+              example: "Message sent successfully"
+            data:
+              type: object
+              description: The stored message, as listed by GET /messages
+      400:
+        description: Invalid/missing fields, or a message to yourself
+      404:
+        description: Sender or recipient not found
+      413:
+        description: Text longer than MARKETPLACE_MAX_MESSAGE_LENGTH
+      500:
+        description: Database error
+    """
+    try:
+        sender_id, recipient_id, text = parse_message(request.get_json())
+        authorize(sender_id)
+
+        conn = get_db_connection()
+        message = message_from_row(store_message(conn, sender_id, recipient_id, text))
+        conn.close()
+        message_events.publish(conversation_topic(conversation_pair(sender_id, recipient_id)))
+
+        return jsonify({"message": "Message sent successfully", "data": message}), 201
+
+    except MessagingError as error:
+        return jsonify(error.body), error.status
+    except sqlite3.Error as error:
+        return jsonify({"message": f"Database error: {str(error)}"}), 500
+    except BadRequest as error:
+        return jsonify({"message": f"Invalid request data: {str(error)}"}), 400
+
+
+@messaging_bp.route('/messages', methods=['GET'])
+def get_messages():
+    """
+    Get Messages
+    ---
+    tags:
+      - Messages
+    summary: A page of the conversation with another user, oldest first
+    description: >
+      Without before or after, the newest messages. before=X pages back
+      through older history; after=X returns newer messages, and with wait
+      holds the request open until one arrives or wait seconds pass.
+    parameters:
+      - name: user_id
+        in: query
+        type: integer
+        required: false
+        description: The reader (defaults to the bearer token's user)
+      - name: to
+        in: query
+        type: integer
+        required: true
+        description: The other member of the conversation
+      - name: before
+        in: query
+        type: integer
+        required: false
+        description: Only messages with a smaller id
+      - name: after
+        in: query
+        type: integer
+        required: false
+        description: Only messages with a larger id
+      - name: wait
+        in: query
+        type: number
+        required: false
+        description: With after, seconds to wait for a message (capped at MAX_MESSAGE_WAIT)
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Page size (1-100, default 50)
+    responses:
+      200:
+        description: Messages in id order ([] when a wait timed out)
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              id:
+                type: integer
+                example: 42
+              conversation_id:
+                type: integer
+                example: 3
+              from:
+                type: integer
+                example: 1
+              to:
+                type: integer
+                example: 2
+              text:
+                type: string
+                example: "Is the bike still available?"
+              created_at:
+                type: string
+                example: "2025-01-01 12:00:00"
+      400:
+        description: Missing or invalid parameters
+      500:
+        description: Database error
+    """
+    try:
+        user_id = int_arg('user_id') or g.get('user_id')
+        peer_id = int_arg('to')
+        if user_id is None or peer_id is None:
+            raise MessagingError(400, "user_id and to are required")
+        authorize(user_id)
+        before, after = int_arg('before'), int_arg('after')
+        limit = int_arg('limit')
+        if limit is None:
+            limit = MESSAGE_PAGE_SIZE
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise MessagingError(400, f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        try:
+            wait = min(float(request.args.get('wait', 0)), MAX_MESSAGE_WAIT)
+        except ValueError as error:
+            raise MessagingError(400, "wait must be a number") from error
+
+        pair = conversation_pair(user_id, peer_id)
+        if after is not None and wait > 0:
+            rows = wait_for_messages(pair, after, limit, wait)
+        else:
+            rows = fetch_messages(get_db_connection(), pair, limit, before, after)
+        return jsonify([message_from_row(row) for row in rows]), 200
+
+    except MessagingError as error:
+        return jsonify(error.body), error.status
+    except sqlite3.Error as error:
+        return jsonify({"message": f"Database error: {str(error)}"}), 500
+
+
+@messaging_bp.route('/mark-messages-read', methods=['POST'])
+def mark_messages_read():
+    """
+    Mark Messages Read
+    ---
+    tags:
+      - Messages
+    summary: Move a user's read marker in a conversation
+    description: >
+      Marks the conversation with peer_id read up to last_read_id (default
+      the latest message). The unread count becomes the number of the
+      peer's messages after it.
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          required:
+            - user_id
+            - peer_id
+          properties:
+            user_id:
+              type: integer
+              example: 2
+            peer_id:
+              type: integer
+              example: 1
+            last_read_id:
+              type: integer
+              example: 42
+    responses:
+      200:
+        description: Read marker moved (it never moves back)
+        schema:
+          type: object
+          properties:
+            last_read_id:
+              type: integer
+              example: 42
+            unread_count:
+              type: integer
+              example: 0
+      400:
+        description: Invalid/missing fields
+      404:
+        description: No conversation between the users
+      500:
+        description: Database error
+    """
+    try:
+        data = request.get_json()
+        if not isinstance(data, dict) or not all(
+                isinstance(data.get(key), int) for key in ('user_id', 'peer_id')):
+            raise MessagingError(400, "Invalid/Missing fields.")
+        last_read_id = data.get('last_read_id')
+        if last_read_id is not None and not isinstance(last_read_id, int):
+            raise MessagingError(400, "last_read_id must be a message id")
+        authorize(data['user_id'])
+
+        conn = get_db_connection()
+        # Only the peer's messages after the new marker are counted: an
+        # index range over the unread tail, not the conversation
+        moved = conn.execute(
+            '''UPDATE conversation_members AS cm
+               SET last_read_id = marker.id,
+                   unread_count = (SELECT count(*) FROM messages m
+                                   WHERE m.conversation_id = cm.conversation_id
+                                   AND m.id > marker.id AND m.sender_id = cm.peer_id)
+               FROM (SELECT min(coalesce(?, last_message_id), last_message_id) AS id
+                     FROM conversation_members WHERE user_id = ? AND peer_id = ?) AS marker
+               WHERE cm.user_id = ? AND cm.peer_id = ? AND marker.id > cm.last_read_id
+               RETURNING last_read_id, unread_count''',
+            (last_read_id, data['user_id'], data['peer_id'], data['user_id'], data['peer_id'])
+        ).fetchall()
+        member = moved[0] if moved else None
+        if member is None:
+            member = conn.execute(
+                '''SELECT last_read_id, unread_count FROM conversation_members
+                   WHERE user_id = ? AND peer_id = ?''',
+                (data['user_id'], data['peer_id'])
+            ).fetchone()
+        conn.commit()
+        conn.close()
+        if member is None:
+            raise MessagingError(404, "Conversation not found")
+
+        return jsonify({"last_read_id": member['last_read_id'],
+                        "unread_count": member['unread_count']}), 200
+
+    except MessagingError as error:
+        return jsonify(error.body), error.status
+    except sqlite3.Error as error:
+        return jsonify({"message": f"Database error: {str(error)}"}), 500
+    except BadRequest as error:
+        return jsonify({"message": f"Invalid request data: {str(error)}"}), 400
+
+
+@messaging_bp.route('/get-conversations/<int:user_id>', methods=['GET'])
+def get_conversations(user_id):
+    """
+    Get Conversations
+    ---
+    tags:
+      - Messages
+    summary: A user's conversations with their unread counts, most recent first
+    parameters:
+      - name: user_id
+        in: path
+        type: integer
+        required: true
+    responses:
+      200:
+        description: Conversations and the total unread count
+        schema:
+          type: object
+          properties:
+            unread_total:
+              type: integer
+              example: 3
+            conversations:
+              type: array
+              items:
+                type: object
+                properties:
+                  conversation_id:
+                    type: integer
+                    example: 3
+                  peer_id:
+                    type: integer
+                    example: 1
+                  peer:
+                    type: string
+                    example: "john_doe"
+                  unread_count:
+                    type: integer
+                    example: 3
+                  last_message:
+                    type: object
+                    description: The latest message, as listed by GET /messages
+      500:
+        description: Database error
+    """
+    try:
+        authorize(user_id)
+        conn = get_db_connection()
+        rows = conn.execute(
+            f'''SELECT cm.conversation_id, cm.peer_id, cm.unread_count, u.username AS peer,
+                       {MESSAGE_COLUMNS}
+                FROM conversation_members cm
+                JOIN users u ON u.id = cm.peer_id
+                JOIN messages m ON m.id = cm.last_message_id
+                WHERE cm.user_id = ?
+                ORDER BY cm.last_message_id DESC''',
+            (user_id,)
+        ).fetchall()
+        conn.close()
+
+        return jsonify({
+            "unread_total": sum(row['unread_count'] for row in rows),
+            "conversations": [{
+                "conversation_id": row['conversation_id'],
+                "peer_id": row['peer_id'],
+                "peer": row['peer'],
+                "unread_count": row['unread_count'],
+                "last_message": message_from_row(row)
+            } for row in rows]
+        }), 200
+
+    except sqlite3.Error as error:
+        return jsonify({"message": f"Database error: {str(error)}"}), 500
@@ -0,0 +1,234 @@
+"""moderation.py — Bulk approval and rejection of purchase requests"""
+
+import os
+import sqlite3
+from flask import Blueprint, jsonify, request
+from werkzeug.exceptions import BadRequest
+from db import get_db_connection
+from auth import authorize
+from events import announce_request_events, record_request_events
+
+moderation_bp = Blueprint('moderation', __name__)
+
+MAX_MODERATION_BATCH = int(os.environ.get('MARKETPLACE_MAX_MODERATION_BATCH', '500'))
+
+
+class ModerationError(Exception):
+    """A moderation batch that must be refused as a whole"""
+
+    def __init__(self, status, message, request_ids=None):
+        super().__init__(message)
+        self.status = status
+        self.body = {"message": message}
+        if request_ids is not None:
+            self.body["request_ids"] = request_ids
+
+
+def placeholders(values):
+    """'?, ?, ...' for an IN (...) list over values"""
+    return ', '.join('?' for _ in values)
+
+
+def parse_id_list(data, key):
+    """Distinct request ids listed under data[key] (an empty list when absent)"""
+    ids = data.get(key, [])
+    if not isinstance(ids, list) or not all(
+            isinstance(value, int) and not isinstance(value, bool) for value in ids):
+        raise ModerationError(400, f"{key} must be a list of request ids")
+    return list(dict.fromkeys(ids))
+
+
+def parse_moderation(data):
+    """Validate a /moderate-requests body into (seller_id, approve, reject)"""
+    if not isinstance(data, dict) or not isinstance(data.get('seller_id'), int):
+        raise ModerationError(400, "Invalid/Missing fields.")
+
+    approve = parse_id_list(data, 'approve')
+    reject = parse_id_list(data, 'reject')
+    if not approve and not reject:
+        raise ModerationError(400, "Invalid/Missing fields.")
+    both = sorted(set(approve) & set(reject))
+    if both:
+        raise ModerationError(400, "A request cannot be both approved and rejected", both)
+    if len(approve) + len(reject) > MAX_MODERATION_BATCH:
+        raise ModerationError(413, f"At most {MAX_MODERATION_BATCH} requests per call")
+    return data['seller_id'], approve, reject
+
+
+def check_moderation(rows, request_ids, seller_id, approve):
+    """Refuse the batch unless every request exists, is the seller's and can be decided"""
+    missing = sorted(set(request_ids) - {row['id'] for row in rows})
+    if missing:
+        raise ModerationError(404, "Request not found", missing)
+
+    not_owned = sorted(row['id'] for row in rows if row['seller_id'] != seller_id)
+    if not_owned:
+        raise ModerationError(403, "You are not authorized to update these requests", not_owned)
+
+    approved_items = {}
+    for row in rows:
+        if row['id'] not in approve:
+            continue
+        if row['item_id'] in approved_items:
+            raise ModerationError(409, "Only one request per item can be approved",
+                                  [approved_items[row['item_id']], row['id']])
+        if row['item_status'] != 'available' and row['status'] != 'approved':
+            raise ModerationError(409, f"Item {row['item_id']} is no longer available",
+                                  [row['id']])
+        approved_items[row['item_id']] = row['id']
+    return sorted(approved_items)
+
+
+def apply_moderation(conn, seller_id, approve, reject):
+    """Check and apply a batch in one write transaction; returns (auto_rejected, sold_items)"""
+    # Hold the write lock from the checks to the commit so no competing
+    # approval for the same items can slip in between
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        request_ids = approve + reject
+        rows = conn.execute(
+            f'''SELECT r.id, r.seller_id, r.item_id, r.status, i.status AS item_status
+                FROM requests r
+                LEFT JOIN items i ON i.id = r.item_id
+                WHERE r.id IN ({placeholders(request_ids)})''',
+            request_ids
+        ).fetchall()
+        sold_items = check_moderation(rows, request_ids, seller_id, set(approve))
+
+        for status, ids in (('rejected', reject), ('approved', approve)):
+            if ids:
+                conn.execute(
+                    f'''UPDATE requests SET status = ?, updated_at = CURRENT_TIMESTAMP
+                        WHERE id IN ({placeholders(ids)})''',
+                    [status, *ids]
+                )
+
+        auto_rejected = []
+        if sold_items:
+            # Everyone else still waiting on an item that was just approved
+            auto_rejected = sorted(row['id'] for row in conn.execute(
+                f'''UPDATE requests SET status = 'rejected', updated_at = CURRENT_TIMESTAMP
+                    WHERE status = 'pending' AND item_id IN ({placeholders(sold_items)})
+                    RETURNING id''',
+                sold_items
+            ).fetchall())
+            conn.execute(
+                f"UPDATE items SET status = 'sold' WHERE id IN ({placeholders(sold_items)})",
+                sold_items
+            )
+
+        record_request_events(conn, seller_id, [
+            ('request-updated', {'request_id': request_id, 'status': status})
+            for status, ids in (('approved', approve), ('rejected', reject + auto_rejected))
+            for request_id in ids
+        ])
+    except (ModerationError, sqlite3.Error):
+        conn.rollback()
+        raise
+
+    conn.commit()
+    return auto_rejected, sold_items
+
+
+@moderation_bp.route('/moderate-requests', methods=['POST'])
+def moderate_requests():
+    """
+    Moderate Requests In Bulk
+    ---
+    tags:
+      - Requests
+    summary: Approve and reject many requests in one transaction
+    description: >
+      Applies every decision or none of them. Approving a request also
+      rejects the other pending requests for the same item and marks the
+      item sold. All requests must belong to seller_id, and at most one
+      request per item can be approved.
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          required:
+            - seller_id
+          properties:
+            seller_id:
+              type: integer
+              description: ID of the seller (for authorization)
+              example: 1
+            approve:
+              type: array
+              items:
+                type: integer
+              example: [3]
+            reject:
+              type: array
+              items:
+                type: integer
+              example: [4, 7]
+    responses:
+      200:
+        description: All decisions applied
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+              example: "Requests moderated successfully"
+            approved:
+              type: array
+              items:
+                type: integer
+              example: [3]
+            rejected:
+              type: array
+              items:
+                type: integer
+              example: [4, 7]
+            auto_rejected:
+              type: array
+              description: Other pending requests for the approved items
+              items:
+                type: integer
+              example: [5, 6]
+            sold_items:
+              type: array
+              items:
+                type: integer
+              example: [2]
+      400:
+        description: Invalid/missing fields, or an id both approved and rejected
+      403:
+        description: Some requests belong to another seller (listed in request_ids)
+      404:
+        description: Some requests do not exist (listed in request_ids)
+      409:
+        description: Two approvals for one item, or the item is no longer available
+      413:
+        description: More than MARKETPLACE_MAX_MODERATION_BATCH request ids
+      500:
+        description: Database error
+    """
+    try:
+        seller_id, approve, reject = parse_moderation(request.get_json())
+        authorize(seller_id)
+
+        conn = get_db_connection()
+        auto_rejected, sold_items = apply_moderation(conn, seller_id, approve, reject)
+        conn.close()
+        announce_request_events(seller_id)
+
+        return jsonify({
+            "message": "Requests moderated successfully",
+            "approved": approve,
+            "rejected": reject,
+            "auto_rejected": auto_rejected,
+            "sold_items": sold_items
+        }), 200
+
+    except ModerationError as error:
+        return jsonify(error.body), error.status
+    except sqlite3.Error as error:
+        return jsonify({"message": f"Database error: {str(error)}"}), 500
+    except BadRequest as error:
+        return jsonify({"message": f"Invalid request data: {str(error)}"}), 400
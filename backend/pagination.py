@@ -0,0 +1,54 @@
+"""pagination.py — Opaque keyset cursors shared by the list endpoints"""
+
+import base64
+import binascii
+import json
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class PaginationError(ValueError):
+    """Raised for a malformed limit or cursor query parameter"""
+
+
+def encode_cursor(*keys):
+    """Encode the sort key of the last row on a page as an opaque cursor"""
+    raw = json.dumps(list(keys), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Decode a cursor produced by encode_cursor back into its sort key"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        keys = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (binascii.Error, UnicodeError, ValueError) as error:
+        raise PaginationError('Invalid cursor') from error
+    if not isinstance(keys, list) or len(keys) != size:
+        raise PaginationError('Invalid cursor')
+    # Only values SQLite can bind; a crafted cursor may hold objects or arrays
+    if not all(isinstance(key, (str, int, float)) for key in keys):
+        raise PaginationError('Invalid cursor')
+    return keys
+
+
+def parse_page_args(args, default_limit=None):
+    """Read limit and cursor from request args
+
+    Returns (limit, cursor) where limit is None when the caller asked for
+    no paging at all and cursor is the raw string (or None).
+    """
+    limit = args.get('limit', default_limit)
+    cursor = args.get('cursor') or None
+    if limit is None and cursor:
+        limit = DEFAULT_PAGE_SIZE
+    if limit is None:
+        return None, None
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError) as error:
+        raise PaginationError('limit must be an integer') from error
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise PaginationError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    return limit, cursor
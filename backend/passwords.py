@@ -0,0 +1,130 @@
+"""passwords.py — Salted scrypt password hashes computed on a bounded worker pool"""
+
+import functools
+import hashlib
+import hmac
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Hashing calls in flight (running or queued) default to at most half the
+# request threads of a worker (serve.py), so a burst of logins is answered
+# with 503 while the other threads keep serving everything else
+REQUEST_THREADS = int(os.environ.get('MARKETPLACE_WORKER_THREADS', '8'))
+HASH_WORKERS = int(os.environ.get(
+    'MARKETPLACE_HASH_WORKERS',
+    str(max(1, min((os.cpu_count() or 2) // 2, REQUEST_THREADS // 2)))
+))
+HASH_QUEUE_LIMIT = int(os.environ.get('MARKETPLACE_HASH_QUEUE_LIMIT',
+                                      str(max(0, REQUEST_THREADS // 2 - HASH_WORKERS))))
+HASH_TIMEOUT = float(os.environ.get('MARKETPLACE_HASH_TIMEOUT', '10'))
+SCRYPT_COST = int(os.environ.get('MARKETPLACE_SCRYPT_COST', str(2 ** 14)))
+SCRYPT_BLOCK_SIZE = 8
+SCRYPT_PARALLELISM = 1
+SALT_BYTES = 16
+
+# Unsalted SHA-256 hex digests written before scrypt was introduced
+LEGACY_HASH = re.compile(r'[0-9a-f]{64}')
+
+
+class HasherBusy(Exception):
+    """Every hashing worker is busy and the wait queue is full"""
+
+
+def hash_password(password):
+    """Hash a password for storing: scrypt$<n>$<r>$<p>$<salt hex>$<key hex>"""
+    salt = os.urandom(SALT_BYTES)
+    key = _scrypt(password, salt, SCRYPT_COST, SCRYPT_BLOCK_SIZE, SCRYPT_PARALLELISM)
+    return (f'scrypt${SCRYPT_COST}${SCRYPT_BLOCK_SIZE}${SCRYPT_PARALLELISM}$'
+            f'{salt.hex()}${key.hex()}')
+
+
+def verify_password(password, stored_hash):
+    """Check a password against a stored hash; returns (matches, needs_rehash)
+
+    needs_rehash is True for legacy SHA-256 hashes and for scrypt hashes
+    made with other parameters than the current ones.
+    """
+    if LEGACY_HASH.fullmatch(stored_hash or ''):
+        legacy = hashlib.sha256(password.encode('utf-8')).hexdigest()
+        return hmac.compare_digest(legacy, stored_hash), True
+
+    try:
+        scheme, cost, block_size, parallelism, salt, key = stored_hash.split('$')
+        params = (int(cost), int(block_size), int(parallelism))
+        salt, key = bytes.fromhex(salt), bytes.fromhex(key)
+    except (AttributeError, ValueError):
+        return False, False
+    if scheme != 'scrypt':
+        return False, False
+
+    matches = hmac.compare_digest(_scrypt(password, salt, *params), key)
+    return matches, params != (SCRYPT_COST, SCRYPT_BLOCK_SIZE, SCRYPT_PARALLELISM)
+
+
+@functools.cache
+def dummy_hash():
+    """Hash of a random password with the current parameters
+
+    Logins for unknown usernames are verified against it, so they take as
+    long as a wrong password and do not reveal which usernames exist.
+    """
+    return hash_password(os.urandom(SALT_BYTES).hex())
+
+
+def _scrypt(password, salt, cost, block_size, parallelism):
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=cost, r=block_size,
+                          p=parallelism, maxmem=256 * cost * block_size * parallelism, dklen=32)
+
+
+class PasswordHasher:
+    """Runs password hashing on a few worker threads with a bounded wait queue
+
+    hashlib's scrypt releases the GIL, so request threads keep serving
+    cheap reads while hashes are computed, and at most `workers` cores
+    are spent on hashing. When workers + queue_limit calls are already
+    in flight, new calls fail fast with HasherBusy instead of piling up.
+    """
+
+    def __init__(self, workers=HASH_WORKERS, queue_limit=HASH_QUEUE_LIMIT,
+                 timeout=HASH_TIMEOUT):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='password-hash')
+        self.capacity = workers + queue_limit
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def run(self, function, *args):
+        """Call function(*args) on a worker and wait for its result"""
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                raise HasherBusy()
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(function, *args)
+        except RuntimeError:
+            self._finished()
+            raise
+        future.add_done_callback(self._finished)
+        return future.result(timeout=self.timeout)
+
+    def _finished(self, _future=None):
+        with self._lock:
+            self._in_flight -= 1
+
+    def hash(self, password):
+        """hash_password on a worker"""
+        return self.run(hash_password, password)
+
+    def verify(self, password, stored_hash):
+        """verify_password on a worker"""
+        return self.run(verify_password, password, stored_hash)
+
+    def shutdown(self):
+        """Stop the worker threads once queued calls are done"""
+        self._executor.shutdown(wait=True)
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,148 @@
+"""price_stats.py — Typical prices per category for sellers posting a listing
+
+category_price_stats holds each category's count and price sum over available
+listings and category_price_sketch a log-bucketed histogram of their prices
+(see init_db.PRICE_STATS_SCHEMA), both kept current by triggers on items. A
+summary reads one stats row and the category's bounded set of buckets, so it
+costs the same however many listings there are. Quantiles come from the
+sketch and are within PRICE_SKETCH_ACCURACY (relative) of a real listing's
+price at that rank.
+"""
+
+import math
+import sqlite3
+import sys
+from flask import Blueprint, jsonify, request
+from db import get_db_connection
+from init_db import PRICE_SKETCH_ACCURACY, PRICE_SKETCH_GAMMA, PRICE_SKETCH_ZERO_BUCKET
+
+price_stats_bp = Blueprint('price_stats', __name__)
+
+# Reported quantiles: name -> fraction of listings priced at or below it
+PRICE_QUANTILES = {'min': 0, 'p25': 0.25, 'median': 0.5, 'p75': 0.75, 'p90': 0.9, 'max': 1}
+# Highest bucket whose price is a float; rows stored before prices had to be
+# finite can sit above it
+MAX_PRICE_BUCKET = int(math.log(sys.float_info.max / 2) / math.log(PRICE_SKETCH_GAMMA))
+
+
+def bucket_price(bucket):
+    """Representative price of a sketch bucket"""
+    if bucket == PRICE_SKETCH_ZERO_BUCKET:
+        return 0.0
+    # Halfway (relatively) between the bucket's bounds gamma^(i-1) and gamma^i
+    return 2 * PRICE_SKETCH_GAMMA ** min(bucket, MAX_PRICE_BUCKET) / (PRICE_SKETCH_GAMMA + 1)
+
+
+def sketch_quantiles(buckets, count, fractions):
+    """Estimated prices at each of the ascending fractions
+
+    buckets are (bucket, count) pairs in ascending bucket order holding
+    count listings in total.
+    """
+    ranks = [fraction * (count - 1) for fraction in fractions]
+    prices = []
+    seen = 0
+    for bucket, bucket_count in buckets:
+        seen += bucket_count
+        while len(prices) < len(ranks) and ranks[len(prices)] < seen:
+            prices.append(round(bucket_price(bucket), 2))
+    return prices
+
+
+def price_summary(conn, category):
+    """Price summary of the available listings in category"""
+    row = conn.execute(
+        'SELECT listing_count, price_cents_sum FROM category_price_stats WHERE category = ?',
+        (category,)
+    ).fetchone()
+    count = row['listing_count'] if row else 0
+    if not count:
+        return {"category": category, "count": 0, "mean": None,
+                **dict.fromkeys(PRICE_QUANTILES)}
+
+    buckets = conn.execute(
+        '''SELECT bucket, count FROM category_price_sketch
+           WHERE category = ? AND count > 0 ORDER BY bucket''',
+        (category,)
+    ).fetchall()
+    quantiles = sketch_quantiles(buckets, count, PRICE_QUANTILES.values())
+    mean = row['price_cents_sum'] / count / 100
+    return {"category": category, "count": count,
+            "mean": round(mean, 2) if math.isfinite(mean) else None,
+            **dict(zip(PRICE_QUANTILES, quantiles))}
+
+
+@price_stats_bp.route('/get-price-stats', methods=['GET'])
+def get_price_stats():
+    """
+    Get Price Stats
+    ---
+    tags:
+      - Listings
+    summary: Typical prices of available listings per category
+    description: >
+      Count, mean and approximate quantiles of the prices of available
+      listings, read from precomputed per-category summaries. Quantiles are
+      within relative_accuracy of a real price at that rank.
+    parameters:
+      - name: category
+        in: query
+        type: string
+        required: false
+        description: Summarise one category; all categories when omitted
+    responses:
+      200:
+        description: "The category's summary, or {categories: [...]} without a category"
+        schema:
+          type: object
+          properties:
+            category:
+              type: string
+              example: Books
+            count:
+              type: integer
+              example: 120
+            mean:
+              type: number
+              example: 31.5
+            min:
+              type: number
+              example: 4.99
+            p25:
+              type: number
+              example: 12.0
+            median:
+              type: number
+              example: 24.9
+            p75:
+              type: number
+              example: 40.1
+            p90:
+              type: number
+              example: 65.0
+            max:
+              type: number
+              example: 180.2
+            relative_accuracy:
+              type: number
+              example: 0.02
+      500:
+        description: Database error
+    """
+    category = request.args.get('category')
+    try:
+        conn = get_db_connection()
+        if category is not None:
+            body = price_summary(conn, category)
+        else:
+            categories = [row['category'] for row in conn.execute(
+                'SELECT category FROM category_price_stats WHERE listing_count > 0 '
+                'ORDER BY category'
+            )]
+            body = {"categories": [price_summary(conn, name) for name in categories]}
+        conn.close()
+
+        return jsonify({**body, "relative_accuracy": PRICE_SKETCH_ACCURACY}), 200
+
+    except sqlite3.Error as error:
+        return jsonify({"message": f"Database error: {str(error)}"}), 500
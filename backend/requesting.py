@@ -4,9 +4,53 @@ import sqlite3
 from flask import Blueprint, jsonify, request
 from werkzeug.exceptions import BadRequest
 from db import get_db_connection
+from auth import authorize
+from events import announce_request_events, record_request_events
+from versioning import versioned
+from streaming import stream_json_rows, wants_stream
+from pagination import (DEFAULT_PAGE_SIZE, PaginationError, decode_cursor, encode_cursor,
+                        parse_page_args)
 
 requests_bp = Blueprint('requesting', __name__)
 
+def request_summary_from_row(req):
+    """Request as listed by /search-requests"""
+    return {
+        'id': req['id'],
+        'item': req['item'],
+        'requester': req['requester'],
+        'status': req['status'],
+        'message': req['message']
+    }
+
+def seller_request_from_row(req):
+    """Request as listed by /get-seller-requests"""
+    return {
+        'id': req['id'],
+        'item_id': req['item_id'],
+        'item_title': req['item_title'],
+        'requester': req['requester'],
+        'status': req['status'],
+        'message': req['message'],
+        'created_at': req['created_at']
+    }
+
+def buyer_request_from_row(req):
+    """Request as listed by /get-buyer-requests"""
+    return {
+        'id': req['id'],
+        'item_id': req['item_id'],
+        'item_title': req['item_title'],
+        'seller': req['seller'],
+        'status': req['status'],
+        'message': req['message'],
+        'created_at': req['created_at']
+    }
+
+def requests_tail(count, *_):
+    """Closing keys of a streamed {"requests": [...]} body"""
+    return f'], "total_count": {count}}}'
+
 @requests_bp.route('/send-request', methods=['POST'])
 def send_request():
     """
@@ -89,6 +133,7 @@ def send_request():
         item_id = data['item_id']
         buyer_id = data['buyer_id']
         message = data.get('message', '')
+        authorize(buyer_id)
 
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -135,8 +180,13 @@ def send_request():
         )
 
         request_id = cursor.lastrowid
+        record_request_events(conn, seller_id, [('request-created', {
+            'request_id': request_id, 'item_id': item_id, 'buyer_id': buyer_id,
+            'status': 'pending', 'message': message
+        })])
         conn.commit()
         conn.close()
+        announce_request_events(seller_id)
 
         return jsonify({
             "message": "Request sent successfully",
@@ -224,6 +274,7 @@ def get_approved_requests():
         return jsonify({'error': f'Data error: {str(data_error)}'}), 500
 
 @requests_bp.route('/get-incoming-requests', methods=['GET'])
+@versioned(lambda: ['requests', 'items'])
 def get_incoming_requests():
     """
     Get Incoming (Pending) Requests
@@ -255,6 +306,8 @@ def get_incoming_requests():
               message:
                 type: string
                 example: "Would like to buy this monitor"
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       500:
         description: Database error
         schema:
@@ -321,9 +374,30 @@ def search_requests():
         description: Optional status filter
         enum: ["approved", "pending"]
         example: "approved"
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Maximum number of results (1-100, default 20)
+        example: 20
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Opaque cursor taken from the X-Next-Cursor header of the previous page
+      - name: stream
+        in: query
+        type: boolean
+        required: false
+        description: >
+          Stream every match as it is read from the database. No default
+          limit applies and no X-Next-Cursor header is sent.
     responses:
       200:
-        description: Successfully retrieved filtered requests
+        description: >
+          Successfully retrieved filtered requests, newest first. When more
+          results exist the X-Next-Cursor response header holds the cursor
+          for the next page.
         schema:
           type: array
           items:
@@ -344,6 +418,14 @@ def search_requests():
               message:
                 type: string
                 example: "Interested in this laptop"
+      400:
+        description: Invalid limit or cursor
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Invalid cursor"
       500:
         description: Database error
         schema:
@@ -354,15 +436,20 @@ def search_requests():
               example: "Database error: connection failed"
     """
     try:
-        conn = get_db_connection()
-
         # Get query parameters
         search_query = request.args.get('q', '').lower()
         status_filter = request.args.get('status', None)
+        streaming = wants_stream()
+        limit, page_cursor = parse_page_args(
+            request.args, None if streaming else DEFAULT_PAGE_SIZE
+        )
+
+        conn = get_db_connection()
 
         # Build SQL query
         sql = '''
-        SELECT r.id, i.title as item, u.username as requester, r.status, r.message
+        SELECT r.id, i.title as item, u.username as requester, r.status, r.message,
+               r.created_at
         FROM requests r
         JOIN items i ON r.item_id = i.id
         JOIN users u ON r.buyer_id = u.id
@@ -370,35 +457,52 @@ def search_requests():
         '''
         params = []
 
-        # Add search filter if provided
+        # Add search filter if provided. The trigram indexes answer the
+        # substring LIKE themselves, so only matching items/buyers are joined.
         if search_query:
-            sql += ' AND (LOWER(i.title) LIKE ? OR LOWER(u.username) LIKE ?)'
-            search_param = f'%{search_query}%'
-            params.extend([search_param, search_param])
+            sql += '''
+            AND (r.item_id IN (SELECT rowid FROM items_title_trigram WHERE title LIKE ?)
+                 OR r.buyer_id IN (SELECT rowid FROM users_username_trigram
+                                   WHERE username LIKE ?))
+            '''
+            params.extend([f'%{search_query}%'] * 2)
 
         # Add status filter if provided
         if status_filter:
             sql += ' AND r.status = ?'
             params.append(status_filter)
 
-        sql += ' ORDER BY r.created_at DESC'
+        # Keyset pagination: seek past the last (created_at, id) already seen
+        if page_cursor:
+            sql += ' AND (r.created_at, r.id) < (?, ?)'
+            params.extend(decode_cursor(page_cursor, 2))
 
-        cursor = conn.execute(sql, params)
-        requests_data = cursor.fetchall()
+        sql += ' ORDER BY r.created_at DESC, r.id DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit + 1)
 
-        result = []
-        for req in requests_data:
-            result.append({
-                'id': req['id'],
-                'item': req['item'],
-                'requester': req['requester'],
-                'status': req['status'],
-                'message': req['message']
-            })
+        if streaming:
+            return stream_json_rows(conn.execute(sql, params), request_summary_from_row,
+                                    limit=limit)
+
+        requests_data = conn.execute(sql, params).fetchall()
+
+        next_cursor = None
+        if len(requests_data) > limit:
+            requests_data = requests_data[:limit]
+            next_cursor = encode_cursor(requests_data[-1]['created_at'], requests_data[-1]['id'])
+
+        result = [request_summary_from_row(req) for req in requests_data]
 
         conn.close()
-        return jsonify(result)
+        response = jsonify(result)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
 
+    except PaginationError as page_error:
+        return jsonify({'error': str(page_error)}), 400
     except sqlite3.Error as db_error:
         return jsonify({'error': f'Database error: {str(db_error)}'}), 500
     except (TypeError, KeyError) as data_error:
@@ -420,6 +524,11 @@ def get_seller_requests(seller_id):
         required: true
         description: ID of the seller
         example: 1
+      - name: stream
+        in: query
+        type: boolean
+        required: false
+        description: Stream the body as it is read from the database (same JSON shape)
     responses:
       200:
         description: Successfully retrieved seller's requests
@@ -478,19 +587,14 @@ def get_seller_requests(seller_id):
         '''
 
         cursor = conn.execute(sql, [seller_id])
+
+        if wants_stream():
+            return stream_json_rows(cursor, seller_request_from_row, '{"requests": [',
+                                    requests_tail)
+
         requests_data = cursor.fetchall()
 
-        result = []
-        for req in requests_data:
-            result.append({
-                'id': req['id'],
-                'item_id': req['item_id'],
-                'item_title': req['item_title'],
-                'requester': req['requester'],
-                'status': req['status'],
-                'message': req['message'],
-                'created_at': req['created_at']
-            })
+        result = [seller_request_from_row(req) for req in requests_data]
 
         conn.close()
         return jsonify({
@@ -526,6 +630,11 @@ def get_buyer_requests(buyer_id):
         description: Optional status filter
         enum: ["approved", "pending", "rejected"]
         example: "approved"
+      - name: stream
+        in: query
+        type: boolean
+        required: false
+        description: Stream the body as it is read from the database (same JSON shape)
     responses:
       200:
         description: Successfully retrieved buyer's requests
@@ -591,19 +700,14 @@ def get_buyer_requests(buyer_id):
         sql += ' ORDER BY r.created_at DESC'
 
         cursor = conn.execute(sql, params)
+
+        if wants_stream():
+            return stream_json_rows(cursor, buyer_request_from_row, '{"requests": [',
+                                    requests_tail)
+
         requests_data = cursor.fetchall()
 
-        result = []
-        for req in requests_data:
-            result.append({
-                'id': req['id'],
-                'item_id': req['item_id'],
-                'item_title': req['item_title'],
-                'seller': req['seller'],
-                'status': req['status'],
-                'message': req['message'],
-                'created_at': req['created_at']
-            })
+        result = [buyer_request_from_row(req) for req in requests_data]
 
         conn.close()
         return jsonify({
@@ -706,6 +810,7 @@ def update_request_status(request_id):
         # Validate status value
         if status not in ['approved', 'rejected'] or not status or not seller_id:
             return jsonify({"message": "Invalid/Missing fields."}), 400
+        authorize(seller_id)
 
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -728,8 +833,12 @@ def update_request_status(request_id):
             (status, request_id)
         )
 
+        record_request_events(conn, seller_id, [('request-updated', {
+            'request_id': request_id, 'status': status
+        })])
         conn.commit()
         conn.close()
+        announce_request_events(seller_id)
 
         return jsonify({
             "message": "Request status updated successfully",
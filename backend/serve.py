@@ -0,0 +1,341 @@
+"""serve.py — Production entry point: a prefork, multi-worker WSGI server
+
+    python backend/serve.py --workers 4 --threads 8 --port 5001
+
+The master process prepares the database, builds the app once, binds the
+listening socket and forks the workers. Each worker warms up (opens its
+connection pool and primes the response cache), then serves requests on a
+fixed pool of threads, accepting only when a thread is free so idle
+workers pick up the slack.
+
+Signals to the master:
+    SIGTERM / SIGINT  stop accepting, let in-flight requests finish (up to
+                      MARKETPLACE_GRACEFUL_TIMEOUT seconds), then exit
+    SIGHUP            graceful restart: start fresh warmed-up workers, then
+                      drain and retire the old ones
+A worker that dies unexpectedly is replaced.
+"""
+
+import argparse
+import functools
+import io
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+import db
+from cache import response_cache
+from events import stream_hub
+from messaging import message_events
+from main import create_app, initialize_app
+
+WORKERS = int(os.environ.get('MARKETPLACE_WORKERS', str(os.cpu_count() or 1)))
+WORKER_THREADS = int(os.environ.get('MARKETPLACE_WORKER_THREADS', '8'))
+GRACEFUL_TIMEOUT = float(os.environ.get('MARKETPLACE_GRACEFUL_TIMEOUT', '30'))
+# Seconds a client may go without sending before its connection is dropped
+READ_TIMEOUT = float(os.environ.get('MARKETPLACE_READ_TIMEOUT', '5'))
+
+# Requests replayed by every new worker before it accepts traffic
+WARMUP_PATHS = (
+    '/get-all-listings?limit=20',
+    '/get-incoming-requests',
+    '/get-approved-requests',
+)
+
+
+class SendfileWrapper:
+    """wsgi.file_wrapper whose file is copied to the socket by the kernel
+
+    When the wrapper is the response body the server receives (see
+    with_sendfile), iterating it yields one empty chunk, which makes the
+    server send the status line and headers, then passes the rest of the
+    file (from its position to its end) to socket.sendfile. Wrapped in
+    anything else, it reads the file in blocks like any file wrapper.
+    """
+
+    def __init__(self, connection, filelike, block_size=8192):
+        self.connection = connection
+        self.filelike = filelike
+        self.block_size = block_size
+        self.use_sendfile = False
+
+    def __iter__(self):
+        if not self.use_sendfile:
+            yield from iter(lambda: self.filelike.read(self.block_size), b'')
+            return
+        yield b''
+        start = self.filelike.tell()
+        end = self.filelike.seek(0, os.SEEK_END)
+        self.connection.sendfile(self.filelike, start, end - start)
+
+    def close(self):
+        """Close the file (called by the server once the response is sent)"""
+        self.filelike.close()
+
+
+def with_sendfile(app):
+    """WSGI app that lets SendfileWrapper bodies returned by app use sendfile"""
+    def wsgi_app(environ, start_response):
+        body = app(environ, start_response)
+        if isinstance(body, SendfileWrapper):
+            body.use_sendfile = True
+        return body
+    return wsgi_app
+
+
+class RequestHandler(WSGIRequestHandler):
+    """HTTP/1.1 handler that gives up on clients that stop sending
+
+    HTTP/1.1 lets bodies of unknown length be sent chunked (event streams).
+    Werkzeug still closes the connection after each response.
+    """
+    protocol_version = 'HTTP/1.1'
+    timeout = READ_TIMEOUT
+
+    def make_environ(self):
+        environ = super().make_environ()
+        environ['wsgi.file_wrapper'] = functools.partial(SendfileWrapper, self.connection)
+        environ['marketplace.detach'] = self.detach
+        return environ
+
+    def detach(self):
+        """Hand the connection to the caller (see events.EventStream)
+
+        Returns a non-blocking duplicate of its socket, which the caller now
+        writes and closes. Whatever the server would still write to the
+        connection (the end of the chunked body) is discarded, and the pool
+        thread is freed without shutting the connection down.
+        """
+        self.wfile.flush()
+        sock = self.connection.dup()
+        # The connection has a timeout, so its file is already non-blocking
+        # and this only changes how the duplicate waits
+        sock.settimeout(0)
+        self.wfile = io.BytesIO()  # pylint: disable=attribute-defined-outside-init
+        self.server.detached.add(self.connection)
+        return sock
+
+    def log_request(self, code='-', size='-'):
+        pass
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server handling connections on a fixed pool of threads"""
+    multithread = True
+
+    def __init__(self, app, sock, threads=WORKER_THREADS):
+        host, port = sock.getsockname()[:2]
+        super().__init__(host, port, with_sendfile(app), handler=RequestHandler,
+                         fd=sock.fileno())
+        self.executor = ThreadPoolExecutor(max_workers=threads,
+                                           thread_name_prefix='wsgi-worker')
+        self.free_threads = threading.BoundedSemaphore(threads)
+        self.detached = set()
+
+    def process_request(self, request, client_address):
+        # Blocks the accept loop while every thread is busy, leaving new
+        # connections in the shared backlog for the other workers
+        self.free_threads.acquire()  # pylint: disable=consider-using-with
+        self.executor.submit(self.handle_connection, request, client_address)
+
+    def handle_connection(self, request, client_address):
+        """Serve one connection on a pool thread"""
+        try:
+            self.finish_request(request, client_address)
+        except Exception:  # pylint: disable=broad-except
+            self.handle_error(request, client_address)
+        finally:
+            if request in self.detached:
+                # Owned by the duplicate now; shutdown() would end it for both
+                self.detached.discard(request)
+                request.close()
+            else:
+                self.shutdown_request(request)
+            self.free_threads.release()
+
+    def drain(self, timeout=GRACEFUL_TIMEOUT):
+        """Wait up to timeout seconds for in-flight connections; True when all finished"""
+        # Our listening socket is a duplicate of the shared one; stop listening on it
+        self.server_close()
+        waiter = threading.Thread(target=self.executor.shutdown, daemon=True)
+        waiter.start()
+        waiter.join(timeout)
+        return not waiter.is_alive()
+
+
+def warm_up(app):
+    """Open this worker's connection pool and prime its caches"""
+    db.configure_pool(app.config.get('DATABASE'), app.config.get('DB_POOL_SIZE')).prefill()
+    response_cache.clear()
+    client = app.test_client()
+    for path in WARMUP_PATHS:
+        client.get(path)
+
+
+def run_worker(app, sock, threads, ready_fd=None):
+    """Body of a forked worker process; returns its exit code
+
+    Once warmed up, the worker writes one byte to ready_fd (if given).
+    """
+    server = None
+    stopping = threading.Event()
+
+    def stop(_signum, _frame):
+        stopping.set()
+        if server is not None:
+            # shutdown() waits for serve_forever, which runs on this very thread
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    warm_up(app)
+    server = PooledWSGIServer(app, sock, threads)
+    if ready_fd is not None:
+        os.write(ready_fd, b'.')
+        os.close(ready_fd)
+    if not stopping.is_set():
+        server.serve_forever()
+    # Long-polls would otherwise hold their threads until they time out
+    message_events.close()
+    stream_hub.close()
+    drained = server.drain()
+    db.get_pool().close_all()
+    return 0 if drained else 1
+
+
+class Arbiter:
+    """Master process: forks, watches, replaces and retires workers"""
+
+    def __init__(self, app, sock, workers=WORKERS, threads=WORKER_THREADS):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.threads = threads
+        self.pids = set()
+        self.retiring = {}
+        self.pending = []
+
+    def spawn(self, ready_fd=None):
+        """Fork one worker"""
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = run_worker(self.app, self.sock, self.threads, ready_fd)
+            finally:
+                os._exit(code)  # pylint: disable=protected-access
+        self.pids.add(pid)
+
+    def restart(self):
+        """Start a new generation of workers and retire the old one once it is warm"""
+        old = set(self.pids)
+        ready_read, ready_write = os.pipe()
+        for _ in range(self.workers):
+            self.spawn(ready_write)
+        os.close(ready_write)
+
+        ready = 0
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        while ready < self.workers and time.monotonic() < deadline:
+            if select.select([ready_read], [], [], 0.1)[0]:
+                chunk = os.read(ready_read, self.workers)
+                if not chunk:
+                    break  # every new worker exited or wrote its byte
+                ready += len(chunk)
+        os.close(ready_read)
+        self.retire(old)
+
+    def retire(self, pids):
+        """Ask workers to drain and exit; they are killed after GRACEFUL_TIMEOUT"""
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT + 5
+        for pid in pids:
+            self.pids.discard(pid)
+            self.retiring[pid] = deadline
+            self.signal(pid, signal.SIGTERM)
+
+    @staticmethod
+    def signal(pid, signum):
+        """Send signum to pid, ignoring workers that already exited"""
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def reap(self):
+        """Collect exited workers; returns how many active workers died"""
+        died = 0
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if pid in self.pids:
+                self.pids.discard(pid)
+                died += 1
+            self.retiring.pop(pid, None)
+        now = time.monotonic()
+        for pid, deadline in list(self.retiring.items()):
+            if now > deadline:
+                self.signal(pid, signal.SIGKILL)
+        return died
+
+    def run(self):
+        """Serve until SIGTERM/SIGINT; SIGHUP restarts the workers gracefully"""
+        signal.signal(signal.SIGTERM, lambda *_: self.pending.append('stop'))
+        signal.signal(signal.SIGINT, lambda *_: self.pending.append('stop'))
+        signal.signal(signal.SIGHUP, lambda *_: self.pending.append('restart'))
+
+        for _ in range(self.workers):
+            self.spawn()
+
+        while 'stop' not in self.pending:
+            if 'restart' in self.pending:
+                self.pending.remove('restart')
+                self.restart()
+            for _ in range(self.reap()):
+                self.spawn()
+            time.sleep(0.1)
+
+        self.retire(set(self.pids))
+        while self.retiring:
+            self.reap()
+            time.sleep(0.1)
+        self.sock.close()
+
+
+def bind_socket(host, port, backlog=2048):
+    """Listening socket shared by every worker"""
+    return socket.create_server((host, port), backlog=backlog)
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    parser.add_argument('--host', default='0.0.0.0', help='interface to listen on')
+    parser.add_argument('--port', type=int, default=5001, help='port to listen on')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='worker processes')
+    parser.add_argument('--threads', type=int, default=WORKER_THREADS,
+                        help='request threads per worker')
+    args = parser.parse_args(argv)
+
+    initialize_app()
+    app = create_app()
+    sock = bind_socket(args.host, args.port)
+    print(f"Serving on http://{args.host}:{sock.getsockname()[1]} with "
+          f"{args.workers} workers x {args.threads} threads", flush=True)
+    Arbiter(app, sock, args.workers, args.threads).run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""static_files.py — Conditional, ranged file responses a WSGI server can sendfile
+
+file_response answers If-None-Match / If-Modified-Since with 304 and Range
+with 206 (werkzeug's make_conditional), then hands the open file to the
+server's wsgi.file_wrapper. backend/serve.py provides one that copies the
+bytes with sendfile(2); other servers fall back to werkzeug's FileWrapper.
+"""
+
+import mimetypes
+import os
+from flask import Response, request
+from werkzeug.wsgi import wrap_file
+
+FILE_BLOCK_SIZE = 64 * 1024
+# One year, the longest max-age caches are expected to honour
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class FileSlice:
+    """Read-only window [start, start + length) of an open binary file
+
+    Positions are those of the underlying file, so fileno(), tell() and an
+    offset can be passed straight to sendfile; seeking to the end lands on
+    the end of the window rather than the end of the file.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.start = start
+        self.end = start + length
+        file.seek(start)
+
+    def fileno(self):
+        """Descriptor of the underlying file"""
+        return self.file.fileno()
+
+    def tell(self):
+        """Current position in the underlying file"""
+        return self.file.tell()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """Move within the underlying file; SEEK_END is relative to the window's end"""
+        if whence == os.SEEK_END:
+            return self.file.seek(self.end + offset)
+        return self.file.seek(offset, whence)
+
+    def seekable(self):
+        """Windows are always seekable"""
+        return True
+
+    def read(self, size=-1):
+        """Read at most size bytes, never past the end of the window"""
+        remaining = max(self.end - self.file.tell(), 0)
+        return self.file.read(remaining if size < 0 else min(size, remaining))
+
+    def close(self):
+        """Close the underlying file"""
+        self.file.close()
+
+
+def file_response(path, etag, max_age, immutable=False, mimetype=None):
+    """Response for the file at path, honouring conditional and Range requests
+
+    immutable marks the response as never changing for max_age seconds,
+    which is only true when the URL names the content (e.g. by its hash).
+    """
+    stat = os.stat(path)
+    response = Response(mimetype=mimetype or mimetypes.guess_type(path)[0]
+                        or 'application/octet-stream', direct_passthrough=True)
+    response.set_etag(etag)
+    response.last_modified = int(stat.st_mtime)
+    response.content_length = stat.st_size
+    response.accept_ranges = 'bytes'
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    if immutable:
+        response.cache_control.immutable = True
+
+    # Sets 206/304/412 and the range headers, or raises 416
+    response.make_conditional(request.environ, accept_ranges=True,
+                              complete_length=stat.st_size)
+    if response.status_code == 206:
+        start, length = response.content_range.start, response.content_length
+    elif response.status_code == 200:
+        start, length = 0, stat.st_size
+    else:
+        return response
+
+    # Closed by the server through the wrapper's close()
+    file = open(path, 'rb')  # pylint: disable=consider-using-with
+    response.response = wrap_file(request.environ, FileSlice(file, start, length),
+                                  FILE_BLOCK_SIZE)
+    return response
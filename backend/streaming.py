@@ -0,0 +1,50 @@
+"""streaming.py — Incrementally written JSON arrays for large list endpoints"""
+
+import json
+import os
+from flask import Response, request, stream_with_context
+
+STREAM_BATCH_SIZE = int(os.environ.get('MARKETPLACE_STREAM_BATCH_SIZE', '500'))
+
+
+def encode(value):
+    """JSON-encode a row dict; strings are taken as already serialized JSON"""
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def wants_stream():
+    """True when the client asked for a streamed response (?stream=1)"""
+    return request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def stream_json_rows(cursor, row_to_dict, head='[', tail=lambda count, more, last: ']',
+                     limit=None):
+    """Stream the rows of an executed cursor as a JSON array
+
+    Rows are pulled with fetchmany and encoded one batch at a time, so peak
+    memory is bounded by STREAM_BATCH_SIZE rather than the result size.
+    row_to_dict may also return pre-serialized JSON text. head is written
+    before the array; tail(count, has_more, last_row) is called after it,
+    once the row count is known. With limit, at most limit rows
+    are written and has_more tells whether the cursor had another one.
+    """
+    def generate():
+        yield head
+        count = 0
+        last_row = None
+        has_more = False
+        while not has_more:
+            rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+            if not rows:
+                break
+            if limit is not None and count + len(rows) > limit:
+                rows = rows[:limit - count]
+                has_more = True
+            if rows:
+                chunk = ','.join(encode(row_to_dict(row)) for row in rows)
+                yield (',' if count else '') + chunk
+                count += len(rows)
+                last_row = rows[-1]
+        yield tail(count, has_more, last_row)
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
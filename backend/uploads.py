@@ -0,0 +1,208 @@
+"""uploads.py — Streaming multipart image uploads, stored once per distinct content"""
+
+import hashlib
+import os
+import tempfile
+from flask import Blueprint, g, jsonify, request
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+from auth import authorize
+from images import UPLOAD_DIR, UPLOADED_URL_PREFIX, uploaded_image_path
+
+uploads_bp = Blueprint('uploads', __name__)
+
+MAX_UPLOAD_BYTES = int(os.environ.get('MARKETPLACE_MAX_UPLOAD_BYTES', str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Allowance on top of the image for boundaries, part headers and small fields
+MULTIPART_OVERHEAD = 64 * 1024
+# Partially received uploads, on the same filesystem as UPLOAD_DIR so that
+# finished ones can be renamed into place
+INCOMING_DIR = os.path.join(UPLOAD_DIR, 'incoming')
+
+# Leading bytes of each accepted image type -> extension of the stored file
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+
+class UploadError(Exception):
+    """An upload that is refused, with the HTTP status to answer"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def image_extension(head):
+    """Extension for an image starting with the bytes head, or None if not an image"""
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+class IncomingImage:
+    """Image part written to a temporary file and hashed as its chunks arrive"""
+
+    def __init__(self):
+        os.makedirs(INCOMING_DIR, exist_ok=True)
+        descriptor, self.path = tempfile.mkstemp(dir=INCOMING_DIR)
+        self.file = os.fdopen(descriptor, 'wb')
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+
+    def write(self, data):
+        """Append one chunk, refusing the upload once it passes MAX_UPLOAD_BYTES"""
+        self.size += len(data)
+        if self.size > MAX_UPLOAD_BYTES:
+            raise UploadError(413, f"Images are limited to {MAX_UPLOAD_BYTES} bytes")
+        if len(self.head) < 12:
+            self.head += data[:12 - len(self.head)]
+        self.digest.update(data)
+        self.file.write(data)
+
+    def store(self):
+        """Move the finished image to its content address; returns (image_id, created)"""
+        self.file.close()
+        extension = image_extension(self.head)
+        if extension is None:
+            self.discard()
+            raise UploadError(415, "Only JPEG, PNG, GIF and WebP images are accepted")
+
+        image_id = f'{self.digest.hexdigest()}.{extension}'
+        target = uploaded_image_path(image_id)
+        if os.path.exists(target):
+            self.discard()
+            return image_id, False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(self.path, target)
+        return image_id, True
+
+    def discard(self):
+        """Close and delete the temporary file"""
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def receive_image(stream, boundary):
+    """Stream a multipart body, writing its 'image' file part to an IncomingImage
+
+    Other parts are read and dropped. At most MAX_UPLOAD_BYTES plus
+    MULTIPART_OVERHEAD bytes are read, whatever the Content-Length said.
+    """
+    decoder = MultipartDecoder(boundary, max_form_memory_size=MULTIPART_OVERHEAD)
+    image = None
+    receiving = False
+    received = 0
+    try:
+        while True:
+            event = decoder.next_event()
+            if isinstance(event, NeedData):
+                if decoder.complete:
+                    raise UploadError(400, "Incomplete multipart body")
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                received += len(chunk)
+                if received > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD:
+                    raise UploadError(413, f"Images are limited to {MAX_UPLOAD_BYTES} bytes")
+                decoder.receive_data(chunk or None)
+            elif isinstance(event, File) and event.name == 'image' and image is None:
+                image = IncomingImage()
+                receiving = True
+            elif isinstance(event, (Field, File)):
+                receiving = False
+            elif isinstance(event, Data) and receiving:
+                image.write(event.data)
+            elif isinstance(event, Epilogue):
+                break
+    except (UploadError, ValueError, RequestEntityTooLarge):
+        if image is not None:
+            image.discard()
+        raise
+
+    if image is None:
+        raise UploadError(400, "Missing 'image' file part")
+    return image
+
+
+@uploads_bp.route('/upload-image', methods=['POST'])
+def upload_image():
+    """
+    Upload An Image
+    ---
+    tags:
+      - Images
+    summary: Store a listing photo and get the id to put in a listing's images
+    description: >
+      multipart/form-data with the photo in a file part named image. The body
+      is streamed to disk and hashed on the way, so identical photos are
+      stored once and get the same id. Bodies larger than
+      MARKETPLACE_MAX_UPLOAD_BYTES are refused before they are read.
+    consumes:
+      - multipart/form-data
+    parameters:
+      - name: image
+        in: formData
+        type: file
+        required: true
+        description: JPEG, PNG, GIF or WebP image
+    responses:
+      201:
+        description: Image stored
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+              example: "Image uploaded successfully"
+            image_id:
+              type: string
+              example: 9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08.jpg
+            url:
+              type: string
+              example: /images/9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08.jpg
+            size:
+              type: integer
+              example: 187376
+            deduplicated:
+              type: boolean
+              example: false
+      200:
+        description: The same image was already stored; its existing id is returned
+      400:
+        description: Not a multipart body, or no image part
+      413:
+        description: Image larger than MARKETPLACE_MAX_UPLOAD_BYTES
+      415:
+        description: The file is not a JPEG, PNG, GIF or WebP image
+    """
+    authorize(g.get('user_id'))
+    boundary = request.mimetype_params.get('boundary')
+    if request.mimetype != 'multipart/form-data' or not boundary:
+        return jsonify({"message": "Expected a multipart/form-data body"}), 400
+    if (request.content_length or 0) > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD:
+        return jsonify({"message": f"Images are limited to {MAX_UPLOAD_BYTES} bytes"}), 413
+
+    try:
+        image = receive_image(request.stream, boundary.encode())
+        image_id, created = image.store()
+    except UploadError as error:
+        return jsonify({"message": str(error)}), error.status
+    except RequestEntityTooLarge:
+        return jsonify({"message": "Form fields are too large"}), 413
+    except ValueError as error:
+        return jsonify({"message": f"Invalid multipart body: {str(error)}"}), 400
+
+    return jsonify({
+        "message": "Image uploaded successfully",
+        "image_id": image_id,
+        "url": UPLOADED_URL_PREFIX + image_id,
+        "size": image.size,
+        "deduplicated": not created
+    }), 201 if created else 200
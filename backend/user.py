@@ -1,19 +1,27 @@
 """user.py — API endpoints for user with database integration"""
 
-import hashlib
+import concurrent.futures
 import sqlite3
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, g, jsonify, request
 from werkzeug.exceptions import BadRequest
-from db import get_db_connection
+from db import get_db_connection, release_db_connection
+from passwords import HasherBusy, dummy_hash, password_hasher
+from auth import authorize, issue_token, revoke_token
 
 user_bp = Blueprint('user_api', __name__)
 
-def hash_password(password):
-    """Hash a password for storing"""
-    return hashlib.sha256(password.encode('utf-8')).hexdigest()
+@user_bp.errorhandler(HasherBusy)
+# Not the builtin TimeoutError before Python 3.11
+@user_bp.errorhandler(concurrent.futures.TimeoutError)
+def busy_response(_error):
+    """503 for when the password hashing workers are saturated"""
+    response = jsonify({"message": "Server is busy, please try again shortly"})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
 
 @user_bp.route('/register', methods=['POST'])
-def register():
+def register():  # pylint: disable=too-many-return-statements
     """
     User Registration
     ---
@@ -69,6 +77,8 @@ def register():
             message:
               type: string
               example: "Database error: connection failed"
+      503:
+        description: Password hashing queue is full; retry after the Retry-After delay
     """
     try:
         data = request.get_json()
@@ -96,11 +106,17 @@ def register():
             conn.close()
             return jsonify({"message": "Username or email already exists"}), 400
 
-        # Create new user
+        # Hand the connection back while hashing on the worker pool, so slow
+        # or queued hashes never hold pooled connections other requests need
+        release_db_connection()
+        password_hash = password_hasher.hash(password)
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
         cursor.execute(
             '''INSERT INTO users (username, email, password_hash)
                VALUES (?, ?, ?)''',
-            (username, email, hash_password(password))
+            (username, email, password_hash)
         )
 
         user_id = cursor.lastrowid
@@ -112,6 +128,9 @@ def register():
             "user_id": user_id
         }), 201
 
+    except sqlite3.IntegrityError:
+        # Registered by a concurrent request while this one was hashing
+        return jsonify({"message": "Username or email already exists"}), 400
     except sqlite3.Error as error:
         return jsonify({"message": f"Database error: {str(error)}"}), 500
     except (KeyError, BadRequest) as error:
@@ -153,7 +172,12 @@ def login():
               example: "Login successful"
             token:
               type: string
-              example: "mock-jwt-token-1"
+              description: "Send as: Authorization: Bearer <token>"
+              example: "1.1767225600.9f86d081884c7d65.kHx3v1Zr0aT0nq8m0k1cYl2i2m8b4pWm3yq1rjRKc2o"
+            expires_at:
+              type: integer
+              description: Unix time the token stops being accepted
+              example: 1767225600
             user_id:
               type: integer
               example: 1
@@ -183,6 +207,8 @@ def login():
             message:
               type: string
               example: "Invalid username or password"
+      503:
+        description: Password hashing queue is full; retry after the Retry-After delay
     """
     try:
         data = request.get_json()
@@ -199,17 +225,37 @@ def login():
         conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute(
-            '''SELECT id, username, email
-               FROM users WHERE username = ? AND password_hash = ?''',
-            (username, hash_password(password))
+            'SELECT id, username, email, password_hash FROM users WHERE username = ?',
+            (username,)
         )
         user = cursor.fetchone()
-        conn.close()
 
-        if user:
+        # No pooled connection is held while hashing (see register)
+        release_db_connection()
+        # Unknown usernames are checked against a dummy hash so their
+        # answer takes as long as a wrong password's
+        matches, needs_rehash = password_hasher.verify(
+            password, user['password_hash'] if user else dummy_hash()
+        )
+        matches = matches and user is not None
+
+        # Move legacy SHA-256 (or outdated scrypt) hashes to the current scheme
+        if matches and needs_rehash:
+            password_hash = password_hasher.hash(password)
+            conn = get_db_connection()
+            conn.execute(
+                'UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?',
+                (password_hash, user['id'], user['password_hash'])
+            )
+            conn.commit()
+            conn.close()
+
+        if matches:
+            token, expires_at = issue_token(user['id'])
             return jsonify({
                 "message": "Login successful",
-                "token": f"mock-jwt-token-{user['id']}",
+                "token": token,
+                "expires_at": expires_at,
                 "user_id": user['id'],
                 "user_info": {
                     "username": user['username'],
@@ -224,6 +270,38 @@ def login():
     except (KeyError, BadRequest) as error:
         return jsonify({"message": f"Invalid request data: {str(error)}"}), 400
 
+@user_bp.route('/logout', methods=['POST'])
+def logout():
+    """
+    User Logout
+    ---
+    tags:
+      - User
+    summary: Revoke the bearer token of this request
+    parameters:
+      - name: Authorization
+        in: header
+        type: string
+        required: true
+        example: "Bearer <token>"
+    responses:
+      200:
+        description: Token revoked
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+              example: "Logged out"
+      401:
+        description: Missing, invalid or expired token
+    """
+    if g.user_id is None:
+        return jsonify({"message": "Authentication required"}), 401
+
+    revoke_token(g.token_id, g.token_expires)
+    return jsonify({"message": "Logged out"}), 200
+
 @user_bp.route('/get-user-profile/<int:user_id>', methods=['GET'])
 def get_user_profile(user_id):
     """
@@ -365,6 +443,7 @@ def update_user_profile():
             return jsonify({"message": "user_id is required"}), 400
 
         user_id = data['user_id']
+        authorize(user_id)
         conn = get_db_connection()
         cursor = conn.cursor()
 
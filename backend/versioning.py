@@ -0,0 +1,57 @@
+"""versioning.py — Data version counters and conditional (ETag) responses"""
+
+import functools
+import zlib
+from flask import Response, g, request
+from db import get_db_connection
+
+
+def get_versions(conn, scopes):
+    """Read the change counters for the given scopes (0 when never written)"""
+    placeholders = ', '.join('?' for _ in scopes)
+    rows = conn.execute(
+        f'SELECT scope, version FROM data_versions WHERE scope IN ({placeholders})',
+        list(scopes)
+    ).fetchall()
+    found = {row['scope']: row['version'] for row in rows}
+    return [found.get(scope, 0) for scope in scopes]
+
+
+def current_versions(scopes):
+    """Change counters for this request, read at most once per request"""
+    seen = g.setdefault('data_versions', {})
+    missing = [scope for scope in scopes if scope not in seen]
+    if missing:
+        seen.update(zip(missing, get_versions(get_db_connection(), missing)))
+    return [seen[scope] for scope in scopes]
+
+
+def versioned(scopes_for_request):
+    """Answer If-None-Match with 304 when none of the data scopes changed
+
+    scopes_for_request() returns the data_versions scopes the response is
+    built from. Their counters are read before the view runs, so a tag can
+    only ever be older than the body it is attached to, never newer.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            scopes = scopes_for_request()
+            if not scopes:
+                return view(*args, **kwargs)
+
+            versions = current_versions(scopes)
+            query = zlib.crc32(request.query_string)
+            etag = f"{request.endpoint}-{'.'.join(map(str, versions))}-{query:08x}"
+
+            if request.if_none_match.contains_weak(etag):
+                not_modified = Response(status=304)
+                not_modified.set_etag(etag, weak=True)
+                return not_modified
+
+            response = view(*args, **kwargs)
+            if isinstance(response, Response) and response.status_code == 200:
+                response.set_etag(etag, weak=True)
+            return response
+        return wrapper
+    return decorator
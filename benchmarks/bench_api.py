@@ -0,0 +1,493 @@
+"""bench_api.py — Seed a database at scale and measure every API endpoint
+
+Usage (from the project root):
+
+    python -m benchmarks.bench_api --items 100000 --output bench.json
+    python -m benchmarks.bench_api --items 100000 --baseline benchmarks/baseline.json
+
+    python -m benchmarks.bench_api --modes dev,http,prefork --workers 4
+
+Each endpoint is driven sequentially through the Flask test client (pure
+handler + SQLite cost) and concurrently over HTTP (adds the WSGI server).
+The HTTP modes compare servers: http is a threaded Werkzeug server, dev adds
+the interactive debugger as app.run(debug=True) does, and prefork runs the
+production launcher backend/serve.py. The report is JSON with p50/p95/p99
+latency in milliseconds and throughput in requests per second. With
+--baseline the run exits non-zero when any endpoint's p50 or p95 regressed
+by more than --threshold.
+"""
+
+import argparse
+import collections
+import contextlib
+import hashlib
+import io
+import json
+import os
+import random
+import signal
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests as http_requests
+from werkzeug.debug import DebuggedApplication
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# pylint: disable=wrong-import-position
+import db
+from cache import response_cache
+import init_db
+from images import IMAGE_DIR
+from pagination import encode_cursor
+
+REGRESSION_METRICS = ('p50_ms', 'p95_ms')
+# Bundled photo used by the image scenarios
+BENCH_IMAGE = 'bike1.jpg'
+# Users 1..CHAT_USERS message their next neighbour, so conversations grow
+CHAT_USERS = 10
+
+# Scenario body sent as multipart/form-data with one file part
+Upload = collections.namedtuple('Upload', 'field filename data')
+
+
+def seed_database(db_path, items, users=None, requests=None, seed=0):
+    """Create a database at db_path filled with synthetic users, items and requests"""
+    users = users or max(10, items // 10)
+    requests = requests if requests is not None else items // 2
+    return init_db.seed_database(db_path, users, items, requests, seed)
+
+
+def sample_requests(db_path, size=1000, batch=20):
+    """Seeded requests for the request-writing scenarios
+
+    Returns (owned, seller_id, pending): up to size random (request_id,
+    seller_id) pairs, and the seller with the most pending requests together
+    with up to batch of their pending request ids.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        owned = conn.execute('SELECT id, seller_id FROM requests ORDER BY random() LIMIT ?',
+                             (size,)).fetchall()
+        busiest = conn.execute(
+            """SELECT seller_id FROM requests WHERE status = 'pending'
+               GROUP BY seller_id ORDER BY count(*) DESC LIMIT 1"""
+        ).fetchone()
+        seller_id = busiest[0] if busiest else None
+        pending = [row[0] for row in conn.execute(
+            "SELECT id FROM requests WHERE status = 'pending' AND seller_id = ? LIMIT ?",
+            (seller_id, batch)
+        )]
+    finally:
+        conn.close()
+    return owned, seller_id, pending
+
+
+def messaging_scenarios(users):
+    """Scenarios of the direct-message endpoints (see build_scenarios)"""
+    chat_users = max(1, min(CHAT_USERS, users - 1))
+
+    # Call n of each messaging scenario uses the same conversation
+    def chat_pair(serial):
+        user_id = serial % chat_users + 1
+        return user_id, user_id + 1
+
+    def send_message(_rng, serial):
+        sender_id, recipient_id = chat_pair(serial)
+        return ('POST', '/messages', {
+            'sender_id': sender_id, 'recipient_id': recipient_id, 'text': f'Bench message {serial}'
+        })
+
+    def get_messages(_rng, serial):
+        user_id, peer_id = chat_pair(serial)
+        return ('GET', f'/messages?user_id={peer_id}&to={user_id}', None)
+
+    def mark_messages_read(_rng, serial):
+        user_id, peer_id = chat_pair(serial)
+        return ('POST', '/mark-messages-read', {'user_id': peer_id, 'peer_id': user_id})
+
+    return {
+        'POST /messages': send_message,
+        'GET /messages': get_messages,
+        'GET /get-conversations':
+            lambda rng, n: ('GET', f'/get-conversations/{chat_pair(n)[0]}', None),
+        'POST /mark-messages-read': mark_messages_read,
+    }
+
+
+def image_scenarios():
+    """Scenarios of the image upload and serving endpoints (see build_scenarios)"""
+    with open(os.path.join(IMAGE_DIR, BENCH_IMAGE), 'rb') as image:
+        photo = image.read()
+    # Uploads are stored under their content hash
+    uploaded_id = f'{hashlib.sha256(photo).hexdigest()}.jpg'
+    return {
+        'POST /upload-image':
+            lambda rng, n: ('POST', '/upload-image', Upload('image', BENCH_IMAGE, photo)),
+        'GET /images/<id>':
+            lambda rng, n: ('GET', f'/images/{uploaded_id}', None),
+        'GET /static/images/<name>':
+            lambda rng, n: ('GET', f'/static/images/{BENCH_IMAGE}', None),
+        'GET /image-derivatives (thumbnail)':
+            lambda rng, n: ('GET', f'/image-derivatives/thumbnail/{BENCH_IMAGE}.webp', None),
+    }
+
+
+def build_scenarios(counts, requests_sample=((), None, ())):
+    """Endpoint name -> function(rng, serial) returning (method, path, body)
+
+    body is JSON, an Upload or None. requests_sample is sample_requests()
+    of the database; the scenarios that change requests are left out
+    without one. GET /request-events is not driven: its streams stay open
+    for minutes rather than answer.
+    """
+    users, items = counts['users'], counts['items']
+    owned, moderating_seller, pending = requests_sample
+    middle = items // 2
+    posted = init_db.SEED_START + middle * init_db.SEED_POST_INTERVAL
+    middle_cursor = encode_cursor(time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(posted)), middle)
+
+    def word(rng):
+        return rng.choice(init_db.SEED_WORDS)
+
+    def update_request_status(rng, _serial):
+        request_id, seller_id = rng.choice(owned)
+        return ('POST', f'/update-request-status/{request_id}', {
+            'status': rng.choice(('approved', 'rejected')), 'seller_id': seller_id
+        })
+
+    # Rejecting is repeatable, so every call runs the whole transaction
+    def moderate_requests(rng, _serial):
+        return ('POST', '/moderate-requests', {
+            'seller_id': moderating_seller, 'reject': rng.sample(pending, len(pending))
+        })
+
+    scenarios = {
+        'GET /get-all-listings (first page)':
+            lambda rng, n: ('GET', '/get-all-listings?limit=20', None),
+        'GET /get-all-listings (middle page)':
+            lambda rng, n: ('GET', f'/get-all-listings?limit=20&cursor={middle_cursor}', None),
+        'GET /get-item-listing':
+            lambda rng, n: ('GET', f'/get-item-listing?item_id={rng.randint(1, items)}', None),
+        'GET /get-my-listings':
+            lambda rng, n: ('GET', f'/get-my-listings?user_id={rng.randint(1, users)}', None),
+        'GET /search-listings':
+            lambda rng, n: ('GET', f'/search-listings?q={word(rng)}&limit=20', None),
+        'POST /post-listing':
+            lambda rng, n: ('POST', '/post-listing', {
+                'title': f'{word(rng)} bench {n}', 'description': 'Benchmark listing',
+                'price': 42.0, 'category': rng.choice(init_db.SEED_CATEGORIES),
+                'condition': rng.choice(init_db.SEED_CONDITIONS),
+                'seller_id': rng.randint(1, users), 'location': rng.choice(init_db.SEED_LOCATIONS)
+            }),
+        'POST /post-listings (50 per call)':
+            lambda rng, n: ('POST', '/post-listings', [{
+                'title': f'{word(rng)} batch {n}.{k}', 'description': 'Benchmark batch listing',
+                'price': 42.0, 'category': rng.choice(init_db.SEED_CATEGORIES),
+                'condition': rng.choice(init_db.SEED_CONDITIONS),
+                'seller_id': rng.randint(1, users), 'location': rng.choice(init_db.SEED_LOCATIONS)
+            } for k in range(50)]),
+        'GET /get-incoming-requests':
+            lambda rng, n: ('GET', '/get-incoming-requests', None),
+        'GET /get-approved-requests':
+            lambda rng, n: ('GET', '/get-approved-requests', None),
+        'GET /search-requests':
+            lambda rng, n: ('GET', f'/search-requests?q={word(rng)[:4]}&limit=20', None),
+        'GET /get-seller-requests':
+            lambda rng, n: ('GET', f'/get-seller-requests/{rng.randint(1, users)}', None),
+        'GET /get-buyer-requests':
+            lambda rng, n: ('GET', f'/get-buyer-requests/{rng.randint(1, users)}', None),
+        'POST /send-request':
+            lambda rng, n: ('POST', '/send-request', {
+                'item_id': rng.randint(1, items), 'buyer_id': rng.randint(1, users),
+                'message': 'Benchmark request'
+            }),
+        'POST /register':
+            lambda rng, n: ('POST', '/register', {
+                'username': f'bench_new_{n}_{rng.getrandbits(32)}',
+                'email': f'bench_new_{n}_{rng.getrandbits(32)}@example.com',
+                'password': init_db.SEED_PASSWORD
+            }),
+        'POST /login':
+            lambda rng, n: ('POST', '/login', {
+                'username': f'user_{rng.randint(1, users)}', 'password': init_db.SEED_PASSWORD
+            }),
+        'GET /get-user-profile':
+            lambda rng, n: ('GET', f'/get-user-profile/{rng.randint(1, users)}', None),
+        'POST /update-user-profile':
+            lambda rng, n: ('POST', '/update-user-profile', {
+                'user_id': rng.randint(1, users), 'email': f'bench_mail_{n}@example.com'
+            }),
+        'GET /users':
+            lambda rng, n: ('GET', '/users', None),
+        'GET /browse-listings':
+            lambda rng, n: ('GET', '/browse-listings?limit=20', None),
+        'GET /browse-listings (filtered)':
+            lambda rng, n: ('GET', f'/browse-listings?limit=20'
+                                   f'&category={rng.choice(init_db.SEED_CATEGORIES)}'
+                                   f'&condition={rng.choice(init_db.SEED_CONDITIONS)}'
+                                   '&max_price=100', None),
+        'GET /get-price-stats':
+            lambda rng, n: ('GET', '/get-price-stats?category='
+                                   f'{rng.choice(init_db.SEED_CATEGORIES)}', None),
+        'GET /get-price-stats (all categories)':
+            lambda rng, n: ('GET', '/get-price-stats', None),
+        'GET /get-user-counters':
+            lambda rng, n: ('GET', f'/get-user-counters/{rng.randint(1, users)}', None),
+    }
+    scenarios.update(messaging_scenarios(users))
+    scenarios.update(image_scenarios())
+    if owned:
+        scenarios['POST /update-request-status'] = update_request_status
+    if pending:
+        scenarios['POST /moderate-requests'] = moderate_requests
+    return scenarios
+
+
+def summarize(latencies, errors, wall_seconds):
+    """Percentiles (ms) and throughput for one endpoint run"""
+    ordered = sorted(latencies)
+    cuts = statistics.quantiles(ordered, n=100, method='inclusive') if len(ordered) > 1 \
+        else [ordered[0]] * 99
+    return {
+        'count': len(ordered),
+        'errors': errors,
+        'p50_ms': round(cuts[49] * 1000, 3),
+        'p95_ms': round(cuts[94] * 1000, 3),
+        'p99_ms': round(cuts[98] * 1000, 3),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'throughput_rps': round(len(ordered) / wall_seconds, 1) if wall_seconds else None
+    }
+
+
+def run_test_client(app, scenarios, iterations, seed=0):
+    """Drive each scenario sequentially through the Flask test client"""
+    client = app.test_client()
+    rng = random.Random(seed)
+
+    def one_call(method, path, body):
+        if isinstance(body, Upload):
+            payload = {'data': {body.field: (io.BytesIO(body.data), body.filename)}}
+        else:
+            payload = {'json': body}
+        before = time.perf_counter()
+        response = client.open(path, method=method, **payload)
+        response.get_data()
+        return time.perf_counter() - before, response.status_code >= 500
+
+    results = {}
+    for name, scenario in scenarios.items():
+        started = time.perf_counter()
+        outcomes = [one_call(*scenario(rng, serial)) for serial in range(iterations)]
+        results[name] = summarize([latency for latency, _ in outcomes],
+                                  sum(failed for _, failed in outcomes),
+                                  time.perf_counter() - started)
+    return results
+
+
+def run_http_load(base_url, scenarios, iterations, concurrency, seed=0):
+    """Drive each scenario with concurrent HTTP clients against base_url"""
+    local = threading.local()
+
+    def one_call(args):
+        scenario, serial = args
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = http_requests.Session()
+            local.rng = random.Random(seed + threading.get_ident())
+        method, path, body = scenario(local.rng, serial)
+        if isinstance(body, Upload):
+            payload = {'files': {body.field: (body.filename, body.data)}}
+        else:
+            payload = {'json': body}
+        before = time.perf_counter()
+        response = session.request(method, base_url + path, **payload)
+        return time.perf_counter() - before, response.status_code >= 500
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for name, scenario in scenarios.items():
+            started = time.perf_counter()
+            calls = ((scenario, serial) for serial in range(iterations))
+            outcomes = list(pool.map(one_call, calls))
+            wall = time.perf_counter() - started
+            results[name] = summarize([latency for latency, _ in outcomes],
+                                      sum(failed for _, failed in outcomes), wall)
+    return results
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler that skips the per-request access log line"""
+
+    def log_request(self, code='-', size='-'):
+        pass
+
+
+def serve_in_thread(app):
+    """Start a threaded WSGI server for app on a free port; returns (server, base_url)"""
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def compare_to_baseline(report, baseline, threshold):
+    """List every endpoint/metric that regressed by more than threshold (a fraction)"""
+    regressions = []
+    for mode, results in report['results'].items():
+        for name, current in results.items():
+            previous = baseline.get('results', {}).get(mode, {}).get(name)
+            if not previous:
+                continue
+            for metric in REGRESSION_METRICS:
+                if previous[metric] and current[metric] > previous[metric] * (1 + threshold):
+                    regressions.append(
+                        f'{mode} {name}: {metric} {previous[metric]} -> {current[metric]}'
+                    )
+    return regressions
+
+
+def prepare_database(args):
+    """Reuse args.db when it exists, otherwise seed a new database; returns (path, counts)"""
+    if args.db and os.path.exists(args.db):
+        conn = sqlite3.connect(args.db)
+        counts = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                  for table in ('users', 'items', 'requests')}
+        conn.close()
+        return args.db, counts
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'bench.db')
+    started = time.perf_counter()
+    counts = seed_database(db_path, args.items, args.users, args.requests, args.seed)
+    counts['seed_seconds'] = round(time.perf_counter() - started, 2)
+    return db_path, counts
+
+
+def serve_prefork(db_path, workers):
+    """Start backend/serve.py on a free port against db_path; returns (process, base_url)"""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    process = subprocess.Popen(  # pylint: disable=consider-using-with
+        [sys.executable, os.path.join(BACKEND_DIR, 'serve.py'), '--host', '127.0.0.1',
+         '--port', str(port), '--workers', str(workers)],
+        env={**os.environ, 'MARKETPLACE_DB_PATH': db_path}, stdout=subprocess.DEVNULL
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            http_requests.get(base_url + '/', timeout=1)
+            return process, base_url
+        except http_requests.ConnectionError as error:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError('serve.py did not start') from error
+            time.sleep(0.1)
+
+
+@contextlib.contextmanager
+def http_target(mode, app, db_path, args):
+    """Base URL to load-test for an HTTP mode, with its server running meanwhile
+
+    http    -- threaded Werkzeug server in this process (or --url)
+    dev     -- the same with the interactive debugger, like app.run(debug=True)
+    prefork -- backend/serve.py with --workers processes
+    """
+    if mode == 'prefork':
+        process, base_url = serve_prefork(db_path, args.workers)
+        try:
+            yield base_url
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=60)
+    elif mode == 'http' and args.url:
+        yield args.url
+    else:
+        server, base_url = serve_in_thread(
+            DebuggedApplication(app, evalex=True) if mode == 'dev' else app
+        )
+        try:
+            yield base_url
+        finally:
+            server.shutdown()
+
+
+def run(args, app=None):
+    """Seed (or reuse) a database, run the requested modes and build the report"""
+    db_path, counts = prepare_database(args)
+
+    db.configure_pool(db_path)
+    response_cache.clear()
+    if app is None:
+        from main import app  # pylint: disable=import-outside-toplevel,redefined-outer-name
+
+    scenarios = build_scenarios(counts, sample_requests(db_path))
+    if args.only:
+        scenarios = {name: fn for name, fn in scenarios.items() if args.only in name}
+
+    report = {'meta': {'database': db_path, 'iterations': args.iterations,
+                       'concurrency': args.concurrency, **counts}, 'results': {}}
+    for mode in args.modes.split(','):
+        if mode == 'client':
+            report['results']['test_client'] = run_test_client(app, scenarios, args.iterations,
+                                                               args.seed)
+            continue
+        with http_target(mode, app, db_path, args) as base_url:
+            if mode == 'http':
+                report['meta']['url'] = base_url
+            report['results'][mode] = run_http_load(base_url, scenarios, args.iterations,
+                                                    args.concurrency, args.seed)
+    return report
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    parser.add_argument('--items', type=int, default=10000, help='items to seed (10k/100k/1M)')
+    parser.add_argument('--users', type=int, default=None, help='users to seed (items/10)')
+    parser.add_argument('--requests', type=int, default=None, help='requests to seed (items/2)')
+    parser.add_argument('--db', help='reuse/create the database at this path')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--iterations', type=int, default=200, help='calls per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8, help='parallel HTTP clients')
+    parser.add_argument('--modes', default='client,http',
+                        help='comma-separated: client, http, dev, prefork')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes for the prefork mode')
+    parser.add_argument('--url', help='benchmark an already running server instead')
+    parser.add_argument('--only', help='only endpoints whose name contains this text')
+    parser.add_argument('--output', help='write the JSON report here (default: stdout)')
+    parser.add_argument('--baseline', help='fail when slower than this stored report')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed p50/p95 slowdown vs the baseline (0.25 = 25%%)')
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            output.write(text + '\n')
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            regressions = compare_to_baseline(report, json.load(baseline_file), args.threshold)
+        if regressions:
+            print('Latency regressions:\n  ' + '\n  '.join(regressions), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
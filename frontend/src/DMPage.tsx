@@ -2,9 +2,10 @@ import { useState, useEffect } from 'react'
 import type { CSSProperties } from 'react'
 
 type User = { id: number | string; name: string }
-type Message = { from: string; to: string; text: string }
+type Message = { id: number; from: number; to: number; text: string }
 
-const CURRENT_USER_ID = 'yourUserId' 
+const API_URL = 'http://localhost:5001'
+const CURRENT_USER_ID = Number(localStorage.getItem('user_id'))
 const boxStyle: CSSProperties = {
   minHeight: '100vh',
   width: '100vw',
@@ -69,13 +70,55 @@ function DMPage() {
   }, [])
 
   useEffect(() => {
-    if (selectedUser) {
-      fetch(`/api/messages?to=${selectedUser.id}`)
-        .then(res => res.json())
-        .then(setMessages)
+    if (!selectedUser) return
+    const query = `user_id=${CURRENT_USER_ID}&to=${selectedUser.id}`
+    const markRead = () => fetch(`${API_URL}/mark-messages-read`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ user_id: CURRENT_USER_ID, peer_id: Number(selectedUser.id) }),
+    })
+    let active = true
+
+    // Load the latest page, then long-poll for anything newer
+    const follow = async () => {
+      let page: Message[] = await fetch(`${API_URL}/messages?${query}`).then(res => res.json())
+      setMessages(page)
+      let lastId = page.length ? page[page.length - 1].id : 0
+      while (active) {
+        if (page.length) markRead()
+        try {
+          page = await fetch(`${API_URL}/messages?${query}&after=${lastId}&wait=25`)
+            .then(res => res.json())
+        } catch {
+          await new Promise(resolve => setTimeout(resolve, 2000))
+          continue
+        }
+        if (!active) break
+        if (page.length) {
+          lastId = page[page.length - 1].id
+          setMessages(prev => [...prev, ...page])
+        }
+      }
     }
+    follow()
+    return () => { active = false }
   }, [selectedUser])
 
+  const sendMessage = async () => {
+    if (!selectedUser || !input.trim()) return
+    await fetch(`${API_URL}/messages`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        sender_id: CURRENT_USER_ID,
+        recipient_id: Number(selectedUser.id),
+        text: input,
+      }),
+    })
+    // The long-poll picks the message up, so it shows once it is stored
+    setInput('')
+  }
+
   return (
     <div style={boxStyle}>
       <h2 style={{ marginBottom: 16, fontWeight: 600 }}>DM</h2>
@@ -98,8 +141,8 @@ function DMPage() {
         <>
           <div style={messagesStyle}>
             {messages.length === 0 && <div style={{ opacity: 0.5 }}>No messages yet.</div>}
-            {messages.map((msg, idx) => (
-              <div key={idx} style={messageStyle(msg.from === CURRENT_USER_ID)}>
+            {messages.map(msg => (
+              <div key={msg.id} style={messageStyle(msg.from === CURRENT_USER_ID)}>
                 <span>{msg.text}</span>
               </div>
             ))}
@@ -110,8 +153,10 @@ function DMPage() {
               type="text"
               value={input}
               onChange={e => setInput(e.target.value)}
+              onKeyDown={e => { if (e.key === 'Enter') sendMessage() }}
               placeholder="Type a message..."
             />
+            <button onClick={sendMessage}>Send</button>
           </div>
         </>
       )}
@@ -1,9 +1,18 @@
 import React, { useState } from 'react';
 import './ListingCard.css';
 
+type ImageVariants = {
+  original: string;
+  thumbnail: string;
+  thumbnail_webp: string;
+  medium: string;
+  medium_webp: string;
+};
+
 type Listing = {
   id?: number;
   images?: string[];
+  image_variants?: ImageVariants[];
   title: string;
   price: number | string;
   description?: string;
@@ -38,7 +47,7 @@ const ListingCard: React.FC<ListingCardProps> = ({ listing }) => {
 
   const getImageSrc = (imgPath?: string) => {
     if (!imgPath) return '';
-    return imgPath.startsWith('/static')
+    return imgPath.startsWith('/static') || imgPath.startsWith('/image-derivatives')
       ? `${IMAGE_BASE_URL}${imgPath}`
       : imgPath;
   };
@@ -94,7 +103,16 @@ const ListingCard: React.FC<ListingCardProps> = ({ listing }) => {
     <>
       <div className="listing-card" onClick={() => setShowModal(true)}>
         <div className="listing-image">
-          {listing.images && listing.images.length > 0 ? (
+          {listing.image_variants && listing.image_variants.length > 0 ? (
+            <picture>
+              <source srcSet={getImageSrc(listing.image_variants[0].thumbnail_webp)} type="image/webp" />
+              <img
+                src={getImageSrc(listing.image_variants[0].thumbnail)}
+                alt={listing.title || 'Listing Image'}
+                className="listing-img"
+              />
+            </picture>
+          ) : listing.images && listing.images.length > 0 ? (
             <img
               src={getImageSrc(listing.images[0])}
               alt={listing.title || 'Listing Image'}
@@ -123,7 +141,16 @@ const ListingCard: React.FC<ListingCardProps> = ({ listing }) => {
           <div className="listing-modal" onClick={e => e.stopPropagation()}>
             <button className="close-btn" onClick={() => setShowModal(false)}>×</button>
             <div className="listing-modal-image">
-              {listing.images && listing.images.length > 0 ? (
+              {listing.image_variants && listing.image_variants.length > 0 ? (
+                <picture>
+                  <source srcSet={getImageSrc(listing.image_variants[0].medium_webp)} type="image/webp" />
+                  <img
+                    src={getImageSrc(listing.image_variants[0].medium)}
+                    alt={listing.title || 'Listing Image'}
+                    className="listing-img"
+                  />
+                </picture>
+              ) : listing.images && listing.images.length > 0 ? (
                 <img
                   src={getImageSrc(listing.images[0])}
                   alt={listing.title || 'Listing Image'}
@@ -8,6 +8,7 @@ interface Listing {
   category: string;
   condition: string;
   images: string[];
+  image_variants?: { thumbnail: string; thumbnail_webp: string }[];
   date_posted: string;
 }
 
@@ -34,7 +35,7 @@ const IMAGE_BASE_URL = "http://localhost:5001";
 
 const getImageSrc = (imgPath?: string) => {
   if (!imgPath) return '';
-  return imgPath.startsWith('/static')
+  return imgPath.startsWith('/static') || imgPath.startsWith('/image-derivatives')
     ? `${IMAGE_BASE_URL}${imgPath}`
     : imgPath;
 };
@@ -45,7 +46,7 @@ const MyListingsTable: React.FC<Props> = ({ listings }) => {
 
   useEffect(() => {
     // Fetch incoming requests for this seller
-    fetch('http://localhost:5001/get-incoming-requests')
+    const loadRequests = () => fetch('http://localhost:5001/get-incoming-requests')
       .then(res => res.json())
       .then((data: IncomingRequest[]) => {
         // Group requests by item id
@@ -61,6 +62,16 @@ const MyListingsTable: React.FC<Props> = ({ listings }) => {
         });
         setRequestsByItem(grouped);
       });
+    loadRequests();
+
+    // Refetch whenever a request for one of our items is created or changes
+    const sellerId = localStorage.getItem('user_id');
+    if (!sellerId) return;
+    const events = new EventSource(`http://localhost:5001/request-events?seller_id=${sellerId}`);
+    ['request-created', 'request-updated', 'resync'].forEach(name =>
+      events.addEventListener(name, loadRequests)
+    );
+    return () => events.close();
   }, []);
 
   const getRequests = (listingId: number) => requestsByItem[listingId] || [];
@@ -86,7 +97,12 @@ const MyListingsTable: React.FC<Props> = ({ listings }) => {
               <td>
                 <div style={{ display: 'flex', alignItems: 'center', gap: '10px' }}>
                   <div className="mylistings-image">
-                    {listing.images && listing.images.length > 0 ? (
+                    {listing.image_variants && listing.image_variants.length > 0 ? (
+                      <picture>
+                        <source srcSet={getImageSrc(listing.image_variants[0].thumbnail_webp)} type="image/webp" />
+                        <img src={getImageSrc(listing.image_variants[0].thumbnail)} alt={listing.title} style={{ width: '100%', height: '100%', objectFit: 'cover' }} />
+                      </picture>
+                    ) : listing.images && listing.images.length > 0 ? (
                       <img src={getImageSrc(listing.images[0])} alt={listing.title} style={{ width: '100%', height: '100%', objectFit: 'cover' }} />
                     ) : (
                       <span>📷</span>
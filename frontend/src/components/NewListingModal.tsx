@@ -1,4 +1,4 @@
-import React, { useState } from 'react'
+import React, { useEffect, useState } from 'react'
 
 interface Props {
   isOpen: boolean;
@@ -19,6 +19,14 @@ const defaultListing = {
   images: ['']
 }
 
+interface PriceStats {
+  count: number;
+  median: number | null;
+  p25: number | null;
+  p75: number | null;
+  p90: number | null;
+}
+
 const categories = ['Electronics', 'Books', 'Sports', 'Furniture']
 const conditions = ['Excellent', 'Like New', 'Good', 'Fair']
 
@@ -26,11 +34,45 @@ const NewListingModal: React.FC<Props> = ({ isOpen, onClose, onCreated, sellerId
   const [form, setForm] = useState(defaultListing)
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState<string | null>(null)
+  const [priceStats, setPriceStats] = useState<PriceStats | null>(null)
+
+  useEffect(() => {
+    setPriceStats(null)
+    if (!form.category) return
+    let cancelled = false
+    fetch(`http://localhost:5001/get-price-stats?category=${encodeURIComponent(form.category)}`)
+      .then(res => (res.ok ? res.json() : null))
+      .then(data => { if (!cancelled) setPriceStats(data) })
+      .catch(() => {})
+    return () => { cancelled = true }
+  }, [form.category])
 
   const handleChange = (e: React.ChangeEvent<HTMLInputElement | HTMLSelectElement>) => {
     setForm({ ...form, [e.target.name]: e.target.value })
   }
 
+  const handleImageFile = async (e: React.ChangeEvent<HTMLInputElement>) => {
+    const file = e.target.files?.[0]
+    if (!file) return
+    setLoading(true)
+    setError(null)
+    try {
+      const body = new FormData()
+      body.append('image', file)
+      const res = await fetch('http://localhost:5001/upload-image', { method: 'POST', body })
+      const data = await res.json()
+      if (!res.ok) {
+        setError(data.message || 'Failed to upload image')
+      } else {
+        setForm({ ...form, images: [data.image_id] })
+      }
+    } catch {
+      setError('Network error')
+    } finally {
+      setLoading(false)
+    }
+  }
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault()
     setLoading(true)
@@ -75,13 +117,19 @@ const NewListingModal: React.FC<Props> = ({ isOpen, onClose, onCreated, sellerId
             <option value="">Category</option>
             {categories.map(c => <option key={c} value={c}>{c}</option>)}
           </select>
+          {priceStats && priceStats.count > 0 && (
+            <div style={{ fontSize: 13, color: '#555', marginBottom: 8 }}>
+              Typical price: ${priceStats.median} (most ${priceStats.p25}–${priceStats.p75},
+              90% under ${priceStats.p90}) across {priceStats.count} listings
+            </div>
+          )}
           <select name="condition" value={form.condition} onChange={handleChange} required>
             <option value="">Condition</option>
             {conditions.map(c => <option key={c} value={c}>{c}</option>)}
           </select>
           <input name="seller_name" placeholder="Your Name" value={form.seller_name} onChange={handleChange} required />
           <input name="location" placeholder="Location" value={form.location} onChange={handleChange} required />
-          <input name="images" placeholder="Image URL" value={form.images[0]} onChange={e => setForm({ ...form, images: [e.target.value] })} />
+          <input name="image_file" type="file" accept="image/jpeg,image/png,image/gif,image/webp" onChange={handleImageFile} />
           {error && <div style={{ color: 'red', marginBottom: 8 }}>{error}</div>}
           <button type="submit" disabled={loading} className="mylistings-btn">
             {loading ? 'Creating...' : 'Create'}
@@ -7,11 +7,23 @@ import threading
 import time
 import requests as http_requests
 import socket
+import tempfile
+import uuid
 
-# Add the project root to Python path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Add the project root and backend package to Python path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'backend'))
+
+# Point the app at a throwaway database before it is imported
+os.environ.setdefault(
+    'MARKETPLACE_DB_PATH',
+    os.path.join(tempfile.mkdtemp(), 'marketplace-test.db')
+)
 
 from backend.main import app
+from init_db import init_database
+import db
 
 def is_port_available(host, port):
     """Check if a port is available."""
@@ -25,6 +37,7 @@ def is_port_available(host, port):
 @pytest.fixture(scope="session")
 def flask_app():
     """Create and configure a test Flask app."""
+    init_database(db.DB_PATH)
     app.config['TESTING'] = True
     app.config['DEBUG'] = False
     return app
@@ -76,4 +89,37 @@ def live_server(flask_app):
 @pytest.fixture
 def api_base_url(live_server):
     """Base URL for API endpoints."""
-    return live_server
\ No newline at end of file
+    return live_server
+
+@pytest.fixture
+def make_user(api_base_url):
+    """Register a fresh user through the API and return its id."""
+    def _make_user(username=None):
+        username = username or f"user_{uuid.uuid4().hex[:10]}"
+        response = http_requests.post(f"{api_base_url}/register", json={
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": "password123"
+        })
+        assert response.status_code == 201
+        return response.json()["user_id"]
+    return _make_user
+
+@pytest.fixture
+def make_listing(api_base_url):
+    """Post a listing through the API and return the created listing."""
+    def _make_listing(seller_id, **overrides):
+        data = {
+            "title": "Test Listing",
+            "description": "Listing created by the test suite",
+            "price": 25.00,
+            "category": "Electronics",
+            "condition": "Good",
+            "seller_id": seller_id,
+            "location": "Test Location"
+        }
+        data.update(overrides)
+        response = http_requests.post(f"{api_base_url}/post-listing", json=data)
+        assert response.status_code == 201
+        return response.json()["listing"]
+    return _make_listing
@@ -0,0 +1,108 @@
+import time
+import requests
+import auth
+
+
+def login(api_base_url, make_user):
+    """Register and log in a fresh user; returns (user_id, token)."""
+    user_id = make_user()
+    username = requests.get(f"{api_base_url}/get-user-profile/{user_id}").json()["username"]
+    response = requests.post(f"{api_base_url}/login", json={
+        "username": username, "password": "password123"
+    })
+    assert response.status_code == 200
+    return user_id, response.json()["token"]
+
+
+class TestSignedTokens:
+    """Test class for HMAC-signed session tokens."""
+
+    def test_issue_and_verify(self, flask_app):
+        """Test tokens round-trip and tampered or expired tokens are refused."""
+        token, expires = auth.issue_token(42)
+        user_id, token_id, token_expires = auth.verify_token(token)
+        assert (user_id, token_expires) == (42, expires) and token_id
+
+        forged = token.replace("42.", "43.", 1)
+        assert auth.verify_token(forged) is None
+        assert auth.verify_token("garbage") is None
+        assert auth.verify_token(auth.issue_token(42, ttl=-1)[0]) is None
+        assert auth.verify_token(token[:-1] + "\u00e9") is None
+
+        started = time.perf_counter()
+        for _ in range(1000):
+            auth.verify_token(token)
+        assert (time.perf_counter() - started) / 1000 < 0.001
+
+    def test_revoked_tokens_lru_is_bounded(self):
+        """Test the revocation list keeps only the newest entries."""
+        revoked = auth.RevokedTokens(max_entries=2)
+        for token_id in ("a", "b", "c"):
+            revoked.add(token_id, time.time() + 60)
+        assert "a" not in revoked and "b" in revoked and "c" in revoked
+        assert len(revoked) == 2
+
+        revoked.add("old", time.time() - 1)
+        assert "old" not in revoked
+
+    def test_bearer_token_identifies_the_caller(self, api_base_url, make_user):
+        """Test a token may only act as its own user, and bad tokens get 401."""
+        user_id, token = login(api_base_url, make_user)
+        other_id = make_user()
+        headers = {"Authorization": f"Bearer {token}"}
+        listing = {
+            "title": "Token Listing", "description": "Posted with a token", "price": 5,
+            "category": "Books", "condition": "Good", "location": "Library"
+        }
+
+        own = requests.post(f"{api_base_url}/post-listing", headers=headers,
+                            json={**listing, "seller_id": user_id})
+        assert own.status_code == 201
+        other = requests.post(f"{api_base_url}/post-listing", headers=headers,
+                              json={**listing, "seller_id": other_id})
+        assert other.status_code == 403
+
+        batch = requests.post(f"{api_base_url}/post-listings", headers=headers, json=[
+            {**listing, "seller_id": user_id}, {**listing, "seller_id": other_id}
+        ]).json()
+        assert [entry["index"] for entry in batch["created"]] == [0]
+        assert [error["index"] for error in batch["errors"]] == [1]
+
+        bad = requests.get(f"{api_base_url}/get-all-listings",
+                           headers={"Authorization": f"Bearer {token}x"})
+        assert bad.status_code == 401
+
+    def test_logout_revokes_token(self, api_base_url, make_user):
+        """Test a logged-out token is refused on later requests."""
+        _, token = login(api_base_url, make_user)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        assert requests.post(f"{api_base_url}/logout", headers=headers).status_code == 200
+        assert requests.get(f"{api_base_url}/users", headers=headers).status_code == 401
+        assert requests.post(f"{api_base_url}/logout").status_code == 401
+
+    def test_logout_is_shared_between_processes(self, api_base_url, make_user, monkeypatch):
+        """Test a worker that did not see the logout still refuses the token."""
+        _, token = login(api_base_url, make_user)
+        headers = {"Authorization": f"Bearer {token}"}
+        assert requests.post(f"{api_base_url}/logout", headers=headers).status_code == 200
+
+        monkeypatch.setattr(auth, "revoked_tokens", auth.RevokedTokens())
+        assert requests.get(f"{api_base_url}/users", headers=headers).status_code == 401
+
+    def test_token_checks_read_revocations_once_per_interval(self, flask_app, monkeypatch):
+        """Test verifying tokens does not hit the database for each token."""
+        reads = []
+        real_connection = auth.get_db_connection
+        monkeypatch.setattr(auth, "get_db_connection",
+                            lambda: reads.append(1) or real_connection())
+        monkeypatch.setattr(auth, "revoked_tokens", auth.RevokedTokens())
+        for _ in range(100):
+            assert auth.verify_token(auth.issue_token(42)[0]) is not None
+        assert len(reads) == 1
+
+    def test_non_ascii_token_is_refused(self, api_base_url):
+        """Test a malformed token gets 401 rather than a server error."""
+        bad = requests.get(f"{api_base_url}/get-all-listings",
+                           headers={"Authorization": "Bearer a.b.c.\u00e9".encode("utf-8")})
+        assert bad.status_code == 401
@@ -0,0 +1,98 @@
+import argparse
+import io
+import random
+import pytest
+import db
+import images
+import uploads
+from cache import response_cache
+from benchmarks import bench_api
+
+
+@pytest.fixture
+def bench_args(tmp_path):
+    """Arguments for a tiny benchmark run on its own database."""
+    return argparse.Namespace(
+        db=str(tmp_path / 'bench.db'), items=200, users=20, requests=100, seed=1,
+        iterations=3, concurrency=2, modes='client,http', url=None, only=None,
+        workers=2
+    )
+
+
+@pytest.fixture
+def image_dirs(tmp_path, monkeypatch):
+    """Keep benchmark uploads and renditions out of the source tree."""
+    monkeypatch.setattr(images, 'UPLOAD_DIR', str(tmp_path / 'uploads'))
+    monkeypatch.setattr(uploads, 'INCOMING_DIR', str(tmp_path / 'uploads' / 'incoming'))
+    monkeypatch.setattr(images, 'IMAGE_CACHE_DIR', str(tmp_path / 'cache'))
+
+
+class TestBenchmarkSuite:
+    """Test class for the API benchmark suite."""
+
+    def test_every_endpoint_runs_without_errors(self, flask_app, bench_args, image_dirs):
+        """Test a small-scale run covers each endpoint in both modes with no 5xx."""
+        try:
+            report = bench_api.run(bench_args, flask_app)
+        finally:
+            db.configure_pool(db.DB_PATH)
+            response_cache.clear()
+
+        assert report['meta']['items'] == 200
+        for mode in ('test_client', 'http'):
+            results = report['results'][mode]
+            assert set(results) == set(bench_api.build_scenarios(
+                report['meta'], bench_api.sample_requests(report['meta']['database'])
+            ))
+            assert 'POST /moderate-requests' in results
+            for name, stats in results.items():
+                assert stats['errors'] == 0, name
+                assert stats['p50_ms'] <= stats['p95_ms'] <= stats['p99_ms']
+                assert stats['throughput_rps'] > 0
+
+    def test_compare_to_baseline_flags_regressions(self):
+        """Test only metrics slower than the threshold are reported."""
+        baseline = {'results': {'http': {'GET /users': {'p50_ms': 10.0, 'p95_ms': 20.0}}}}
+        fine = {'results': {'http': {'GET /users': {'p50_ms': 11.0, 'p95_ms': 24.0}}}}
+        slow = {'results': {'http': {'GET /users': {'p50_ms': 11.0, 'p95_ms': 30.0}}}}
+
+        assert bench_api.compare_to_baseline(fine, baseline, 0.25) == []
+        assert bench_api.compare_to_baseline(slow, baseline, 0.25) == [
+            'http GET /users: p95_ms 20.0 -> 30.0'
+        ]
+
+    def test_request_writes_hit_the_database(self, flask_app, bench_args):
+        """Test the request-writing scenarios succeed rather than fail validation."""
+        db_path, counts = bench_api.prepare_database(bench_args)
+        scenarios = bench_api.build_scenarios(counts, bench_api.sample_requests(db_path))
+        db.configure_pool(db_path)
+        try:
+            client = flask_app.test_client()
+            rng = random.Random(0)
+            for name in ('POST /update-request-status', 'POST /moderate-requests'):
+                method, path, body = scenarios[name](rng, 0)
+                assert client.open(path, method=method, json=body).status_code == 200, name
+        finally:
+            db.configure_pool(db.DB_PATH)
+            response_cache.clear()
+
+    def test_scenarios_answer_successfully(self, flask_app, bench_args, image_dirs):
+        """Test every scenario, run once in order, gets a 2xx rather than a 4xx."""
+        db_path, counts = bench_api.prepare_database(bench_args)
+        scenarios = bench_api.build_scenarios(counts, bench_api.sample_requests(db_path))
+        db.configure_pool(db_path)
+        try:
+            client = flask_app.test_client()
+            rng = random.Random(0)
+            for name, scenario in scenarios.items():
+                method, path, body = scenario(rng, 0)
+                if isinstance(body, bench_api.Upload):
+                    response = client.open(path, method=method, data={
+                        body.field: (io.BytesIO(body.data), body.filename)
+                    })
+                else:
+                    response = client.open(path, method=method, json=body)
+                assert 200 <= response.status_code < 300, name
+        finally:
+            db.configure_pool(db.DB_PATH)
+            response_cache.clear()
@@ -0,0 +1,61 @@
+import uuid
+import pytest
+import requests
+import browse
+
+
+class TestBrowseListings:
+    """Test class for filtered browsing and its facet counts."""
+
+    @pytest.fixture
+    def browse_location(self, make_user, make_listing):
+        """A location of its own holding four listings from one seller."""
+        location = f"Browse {uuid.uuid4().hex[:8]}"
+        seller_id = make_user()
+        for category, condition, price in (("Books", "Good", 10), ("Books", "New", 60),
+                                           ("Electronics", "Good", 120),
+                                           ("Electronics", "Good", 600)):
+            make_listing(seller_id, category=category, condition=condition, price=price,
+                         location=location)
+        return location
+
+    def test_filters_combine_and_facets_count_the_other_filters(self, api_base_url,
+                                                               browse_location):
+        """Test filters narrow the listings while each facet ignores its own filter."""
+        url = f"{api_base_url}/browse-listings"
+        body = requests.get(url, params={"location": browse_location,
+                                         "category": "Books"}).json()
+        assert sorted(item["price"] for item in body["listings"]) == [10, 60]
+        facets = body["facets"]
+        assert facets["category"] == [{"value": "Books", "count": 2},
+                                      {"value": "Electronics", "count": 2}]
+        assert facets["condition"] == [{"value": "Good", "count": 1},
+                                       {"value": "New", "count": 1}]
+        assert [bucket["count"] for bucket in facets["price"]] == [1, 0, 1, 0, 0, 0]
+        assert {"value": browse_location, "count": 2} in facets["location"]
+
+        wide = requests.get(url, params={"location": browse_location, "min_price": 50,
+                                         "condition": ["Good", "New"]}).json()
+        assert sorted(item["price"] for item in wide["listings"]) == [60, 120, 600]
+        assert requests.get(url, params={"min_price": "cheap"}).status_code == 400
+
+    def test_facets_are_cached_per_filter_set(self, api_base_url, browse_location,
+                                              make_user, make_listing, monkeypatch):
+        """Test pages of one browse share facets until a listing changes."""
+        calls = []
+        original = browse.browse_facets
+        monkeypatch.setattr(browse, "browse_facets",
+                            lambda conn, filters: calls.append(filters) or original(conn, filters))
+        url = f"{api_base_url}/browse-listings"
+
+        first = requests.get(url, params={"location": browse_location, "limit": 2}).json()
+        second = requests.get(url, params={"location": browse_location, "limit": 2,
+                                           "cursor": first["next_cursor"]}).json()
+        assert len(first["listings"]) == len(second["listings"]) == 2
+        assert second["facets"] == first["facets"]
+        assert len(calls) == 1
+
+        make_listing(make_user(), category="Books", location=browse_location)
+        fresh = requests.get(url, params={"location": browse_location, "limit": 2}).json()
+        assert len(calls) == 2
+        assert {"value": "Books", "count": 3} in fresh["facets"]["category"]
@@ -0,0 +1,47 @@
+import requests
+import pytest
+from cache import ResponseCache
+
+
+class TestResponseCache:
+    """Test class for the in-process response cache."""
+
+    def test_lru_eviction_by_entries_and_bytes(self):
+        """Test the least recently used entries go first when a bound is hit."""
+        cache = ResponseCache(ttl=60, max_entries=2, max_bytes=10)
+        cache.put('a', (1,), b'aaa')
+        cache.put('b', (1,), b'bbb')
+        assert cache.get('a', (1,)) == b'aaa'
+
+        cache.put('c', (1,), b'ccc')
+        assert cache.get('b', (1,)) is None
+        assert cache.get('a', (1,)) == b'aaa'
+
+        cache.put('d', (1,), b'dddddddd')
+        assert cache.stats()['bytes'] <= 10
+        assert cache.stats()['evictions'] == 3
+
+    def test_version_change_and_ttl_invalidate(self):
+        """Test an entry is dropped once its data version moves or it expires."""
+        cache = ResponseCache(ttl=60, max_entries=10, max_bytes=100)
+        cache.put('feed', (1,), b'old')
+        assert cache.get('feed', (2,)) is None
+        assert cache.stats()['invalidations'] == 1
+        assert cache.stats()['entries'] == 0
+
+        expired = ResponseCache(ttl=-1, max_entries=10, max_bytes=100)
+        expired.put('feed', (1,), b'old')
+        assert expired.get('feed', (1,)) is None
+        assert expired.stats()['expirations'] == 1
+
+    def test_listing_reads_are_cached_until_a_write(self, api_base_url, make_user, make_listing):
+        """Test repeated feed reads hit the cache and posting a listing invalidates it."""
+        url = f"{api_base_url}/get-all-listings?limit=3"
+        first = requests.get(url).json()
+        hits = requests.get(f"{api_base_url}/cache-stats").json()["hits"]
+
+        assert requests.get(url).json() == first
+        assert requests.get(f"{api_base_url}/cache-stats").json()["hits"] == hits + 1
+
+        listing = make_listing(make_user())
+        assert requests.get(url).json()["listings"][0]["id"] == listing["id"]
@@ -0,0 +1,55 @@
+import gzip
+import json
+import pytest
+import compression
+
+
+class TestCompression:
+    """Test class for negotiated response compression."""
+
+    def test_large_json_is_gzipped_for_clients_that_accept_it(self, flask_app):
+        """Test the API spec is gzipped, marked and decodes to the plain body."""
+        client = flask_app.test_client()
+        plain = client.get("/apispec.json")
+        assert "Content-Encoding" not in plain.headers
+        assert "Accept-Encoding" in plain.headers["Vary"]
+
+        zipped = client.get("/apispec.json", headers={"Accept-Encoding": "gzip, deflate"})
+        assert zipped.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in zipped.headers["Vary"]
+        assert int(zipped.headers["Content-Length"]) < len(plain.data) / 3
+        assert json.loads(gzip.decompress(zipped.data)) == plain.get_json()
+
+    def test_small_and_binary_bodies_stay_plain(self, flask_app):
+        """Test bodies under the threshold and images are never compressed."""
+        client = flask_app.test_client()
+        headers = {"Accept-Encoding": "gzip"}
+
+        small = client.get("/", headers=headers)
+        assert len(small.data) < compression.COMPRESS_MIN_SIZE
+        assert "Content-Encoding" not in small.headers
+        image = client.get("/static/images/lamp1.jpg", headers=headers)
+        assert "Content-Encoding" not in image.headers
+        image.close()
+
+    def test_brotli_is_preferred_when_installed(self, flask_app):
+        """Test br is chosen over gzip when the brotli module is available."""
+        brotli = pytest.importorskip("brotli")
+        response = flask_app.test_client().get(
+            "/apispec.json", headers={"Accept-Encoding": "gzip, br"}
+        )
+        assert response.headers["Content-Encoding"] == "br"
+        assert json.loads(brotli.decompress(response.data))
+
+    def test_compressed_bodies_are_cached_by_content(self, flask_app, monkeypatch):
+        """Test the same body is compressed once however many clients ask for it."""
+        calls = []
+        monkeypatch.setitem(compression.ENCODINGS, "gzip",
+                            lambda body: calls.append(body) or gzip.compress(body))
+        compression.compressed_cache.clear()
+        client = flask_app.test_client()
+
+        bodies = {client.get("/apispec.json", headers={"Accept-Encoding": "gzip"}).data
+                  for _ in range(3)}
+        assert len(bodies) == 1 and len(calls) == 1
+        assert client.get("/cache-stats").get_json()["compressed"]["hits"] >= 2
@@ -0,0 +1,62 @@
+import sqlite3
+import requests
+import counters
+import init_db
+
+
+def user_counters(api_base_url, user_id):
+    """The /get-user-counters body of user_id, without the id."""
+    body = requests.get(f"{api_base_url}/get-user-counters/{user_id}").json()
+    assert body.pop("user_id") == user_id
+    return body
+
+
+class TestUserCounters:
+    """Test class for the trigger-maintained per-user counters."""
+
+    def test_counters_follow_listings_and_requests(self, api_base_url, make_user, make_listing):
+        """Test counters move with new listings, requests and approvals."""
+        seller, buyer, rival = make_user(), make_user(), make_user()
+        assert user_counters(api_base_url, seller) == {
+            "active_listings": 0, "pending_requests": 0, "open_requests": 0
+        }
+        item = make_listing(seller)
+        make_listing(seller)
+        request_ids = [requests.post(f"{api_base_url}/send-request", json={
+            "item_id": item["id"], "buyer_id": user, "message": "Interested"
+        }).json()["request_id"] for user in (buyer, rival)]
+
+        assert user_counters(api_base_url, seller) == {
+            "active_listings": 2, "pending_requests": 2, "open_requests": 0
+        }
+        assert user_counters(api_base_url, buyer)["open_requests"] == 1
+
+        # Approving sells the item and auto-rejects the rival's request
+        requests.post(f"{api_base_url}/moderate-requests", json={
+            "seller_id": seller, "approve": [request_ids[0]]
+        })
+        assert user_counters(api_base_url, seller) == {
+            "active_listings": 1, "pending_requests": 0, "open_requests": 0
+        }
+        assert user_counters(api_base_url, rival)["open_requests"] == 0
+
+    def test_reconciliation_reports_and_repairs_drift(self, tmp_path):
+        """Test the job finds counters that disagree with the base tables and fixes them."""
+        path = str(tmp_path / "counters.db")
+        init_db.main(["--db", path, "--users", "20", "--items", "300", "--requests", "500"])
+        assert counters.main(["--db", path]) == []
+
+        conn = sqlite3.connect(path)
+        user_id, listings = conn.execute(
+            "SELECT user_id, active_listings FROM user_counters WHERE active_listings > 0"
+        ).fetchone()
+        conn.execute("UPDATE user_counters SET active_listings = active_listings + 5 "
+                     "WHERE user_id = ?", (user_id,))
+        conn.commit()
+        conn.close()
+
+        drift = [{"user_id": user_id, "counter": "active_listings",
+                  "stored": listings + 5, "actual": listings}]
+        assert counters.main(["--db", path, "--dry-run"]) == drift
+        assert counters.main(["--db", path]) == drift
+        assert counters.main(["--db", path]) == []
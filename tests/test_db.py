@@ -0,0 +1,52 @@
+import sqlite3
+import pytest
+import db
+
+
+class TestConnectionPool:
+    """Test class for the pooled database connections."""
+
+    def test_connections_are_pre_tuned(self, flask_app):
+        """Test pooled connections come with the performance pragmas applied."""
+        conn = db.get_db_connection()
+        try:
+            assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+            assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1
+            assert conn.execute('PRAGMA temp_store').fetchone()[0] == 2
+            assert conn.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+            assert isinstance(conn.execute('SELECT 1 AS one').fetchone(), sqlite3.Row)
+        finally:
+            conn.close()
+
+    def test_connection_reused_within_and_across_requests(self, flask_app):
+        """Test a request keeps one connection and teardown returns it to the pool."""
+        with flask_app.test_request_context('/'):
+            first = db.get_db_connection()
+            first.close()
+            assert db.get_db_connection() is first
+
+        with flask_app.test_request_context('/'):
+            assert db.get_db_connection() is first
+
+    def test_teardown_rolls_back_uncommitted_work(self, flask_app):
+        """Test a connection is handed back without a dangling transaction."""
+        with flask_app.test_request_context('/'):
+            conn = db.get_db_connection()
+            conn.execute("INSERT INTO users (username, email, password_hash) "
+                         "VALUES ('rollback_me', 'rollback@example.com', 'x')")
+            assert conn.in_transaction
+
+        assert not conn.in_transaction
+        row = conn.execute("SELECT id FROM users WHERE username = 'rollback_me'").fetchone()
+        assert row is None
+
+    def test_pool_exhaustion_raises_database_error(self, tmp_path):
+        """Test a full pool surfaces as a sqlite3 error instead of blocking forever."""
+        pool = db.ConnectionPool(str(tmp_path / 'pool.db'), size=1, timeout=0.01)
+        conn = pool.acquire()
+        with pytest.raises(sqlite3.OperationalError):
+            pool.acquire()
+        conn.close()
+        assert pool.acquire() is conn
+        pool.release(conn)
+        pool.close_all()
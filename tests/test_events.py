@@ -0,0 +1,96 @@
+import json
+import sqlite3
+import requests
+import db
+import events
+
+
+def read_event(lines):
+    """Next (event name, data) from an SSE line iterator, skipping comments."""
+    name, data = None, None
+    for line in lines:
+        if line.startswith("event: "):
+            name = line[len("event: "):]
+        elif line.startswith("data: "):
+            data = json.loads(line[len("data: "):])
+        elif not line and name:
+            return name, data
+    raise AssertionError("stream ended before an event")
+
+
+class TestRequestEvents:
+    """Test class for server-sent purchase request events."""
+
+    def test_last_event_id_resumes_from_retained_events(self, flask_app, monkeypatch):
+        """Test resuming replays the seller's later events, or resyncs when it cannot."""
+        conn = sqlite3.connect(db.DB_PATH)
+        conn.row_factory = sqlite3.Row
+        seller_id = conn.execute("SELECT coalesce(max(id), 0) + 1000 FROM users").fetchone()[0]
+        with conn:
+            events.record_request_events(conn, seller_id, [
+                ("request-created", {"request_id": 1}), ("request-updated", {"request_id": 1})
+            ])
+            events.record_request_events(conn, seller_id + 1, [("request-created", {})])
+        first, second = [row["id"] for row in events.fetch_request_events(conn, 0, seller_id)]
+
+        assert events.replay_start(conn, str(first)) == (first, False)
+        assert [dict(row) for row in events.fetch_request_events(conn, first, seller_id)] == [{
+            "id": second, "seller_id": seller_id, "name": "request-updated",
+            "data": json.dumps({"request_id": 1})
+        }]
+        newest = events.replay_start(conn, None)
+        assert newest == (second + 1, False)
+        assert events.replay_start(conn, "deadbeef-1") == (newest[0], True)
+        assert events.replay_start(conn, str(newest[0] + 1)) == (newest[0], True)
+
+        monkeypatch.setattr(events, "EVENT_HISTORY", 2)
+        with conn:
+            events.record_request_events(conn, seller_id + 1, [("request-created", {})] * 2)
+        assert events.replay_start(conn, str(first)) == (newest[0] + 2, True)
+        conn.close()
+
+    def test_seller_stream_receives_request_changes(self, api_base_url, make_user, make_listing):
+        """Test a seller's open stream sees requests being created and approved."""
+        seller_id, buyer_id = make_user(), make_user()
+        item = make_listing(seller_id)
+        stream = requests.get(f"{api_base_url}/request-events",
+                              params={"seller_id": seller_id}, stream=True, timeout=10)
+        assert stream.status_code == 200
+        assert stream.headers["Content-Type"].startswith("text/event-stream")
+        lines = stream.iter_lines(decode_unicode=True)
+        # The stream is subscribed once the retry hint arrives
+        assert next(lines).startswith("retry: ")
+
+        request_id = requests.post(f"{api_base_url}/send-request", json={
+            "item_id": item["id"], "buyer_id": buyer_id, "message": "Still for sale?"
+        }).json()["request_id"]
+        assert read_event(lines) == ("request-created", {
+            "request_id": request_id, "item_id": item["id"], "buyer_id": buyer_id,
+            "status": "pending", "message": "Still for sale?"
+        })
+
+        requests.post(f"{api_base_url}/update-request-status/{request_id}", json={
+            "status": "approved", "seller_id": seller_id
+        })
+        assert read_event(lines) == ("request-updated", {
+            "request_id": request_id, "status": "approved"
+        })
+        stream.close()
+
+    def test_stream_sees_events_committed_by_another_process(self, api_base_url):
+        """Test a stream picks up request_events rows no one announced in this process."""
+        seller_id = 10 ** 9
+        stream = requests.get(f"{api_base_url}/request-events",
+                              params={"seller_id": seller_id}, stream=True, timeout=10)
+        lines = stream.iter_lines(decode_unicode=True)
+        assert next(lines).startswith("retry: ")
+
+        # Another worker's write: committed to the database, no local wake-up
+        conn = sqlite3.connect(db.DB_PATH)
+        with conn:
+            events.record_request_events(conn, seller_id, [
+                ("request-updated", {"request_id": 5, "status": "rejected"})
+            ])
+        conn.close()
+        assert read_event(lines) == ("request-updated", {"request_id": 5, "status": "rejected"})
+        stream.close()
@@ -0,0 +1,92 @@
+import io
+import os
+import sqlite3
+import pytest
+import requests
+import images
+import init_db
+
+
+@pytest.fixture
+def image_cache(tmp_path, monkeypatch):
+    """Render derivatives into a throwaway cache directory."""
+    monkeypatch.setattr(images, 'IMAGE_CACHE_DIR', str(tmp_path))
+    return tmp_path
+
+
+class TestImageDerivatives:
+    """Test class for resized listing image renditions."""
+
+    def test_listing_payload_lists_renditions(self, api_base_url, make_user, make_listing):
+        """Test each listing image carries thumbnail and medium URLs in both formats."""
+        listing = make_listing(make_user(), images=["/static/images/bike1.jpg",
+                                                    "https://example.com/photo.png"])
+        local, remote = listing["image_variants"]
+
+        assert listing["images"] == [local["original"], remote["original"]]
+        assert local["thumbnail"] == "/image-derivatives/thumbnail/bike1.jpg.jpg"
+        assert local["medium_webp"] == "/image-derivatives/medium/bike1.jpg.webp"
+        assert set(remote.values()) == {"https://example.com/photo.png"}
+
+    def test_thumbnail_is_rendered_once_and_cached(self, api_base_url, image_cache):
+        """Test the first request renders a smaller image and later ones reuse the file."""
+        pil = pytest.importorskip("PIL.Image")
+        url = f"{api_base_url}/image-derivatives/thumbnail/bike1.jpg.webp"
+
+        response = requests.get(url)
+        assert response.status_code == 200
+        assert response.headers["Content-Type"] == "image/webp"
+        original_size = os.path.getsize(os.path.join(images.IMAGE_DIR, "bike1.jpg"))
+        assert len(response.content) < original_size / 4
+        assert pil.open(io.BytesIO(response.content)).width == images.IMAGE_PRESETS["thumbnail"]
+
+        cached = list(image_cache.rglob("*.webp"))
+        assert len(cached) == 1
+        modified = cached[0].stat().st_mtime_ns
+        again = requests.get(url, headers={"If-None-Match": response.headers["ETag"]})
+        assert again.status_code == 304
+        assert requests.get(url).content == response.content
+        assert cached[0].stat().st_mtime_ns == modified
+
+    def test_falls_back_to_original_without_pillow(self, api_base_url, image_cache,
+                                                   monkeypatch):
+        """Test renditions redirect to the original when they cannot be rendered."""
+        monkeypatch.setattr(images, 'Image', None)
+        response = requests.get(f"{api_base_url}/image-derivatives/medium/lamp1.jpg.jpg",
+                                allow_redirects=False)
+        assert response.status_code == 302
+        assert response.headers["Location"].endswith("/static/images/lamp1.jpg")
+        assert not list(image_cache.rglob("*.jpg"))
+
+    def test_unknown_images_are_not_found(self, api_base_url):
+        """Test bad presets, formats and paths outside the image directory get 404."""
+        for path in ("huge/bike1.jpg.jpg", "thumbnail/bike1.jpg.gif", "thumbnail/missing.jpg.jpg"):
+            response = requests.get(f"{api_base_url}/image-derivatives/{path}")
+            assert response.status_code == 404
+        with pytest.raises(FileNotFoundError):
+            images.generate_derivatives("../main.py")
+
+    def test_migration_rerenders_listings_in_the_new_shape(self, tmp_path):
+        """Test an older listing_json trigger is replaced and existing rows re-rendered."""
+        path = str(tmp_path / 'old.db')
+        init_db.init_database(path)
+        conn = sqlite3.connect(path)
+        conn.execute("INSERT INTO users (username, email, password_hash) VALUES ('a', 'a', 'x')")
+        conn.execute("DROP TRIGGER items_listing_json_insert")
+        conn.execute("""CREATE TRIGGER items_listing_json_insert AFTER INSERT ON items BEGIN
+                            UPDATE items SET listing_json = '{}' WHERE id = new.id;
+                        END""")
+        conn.execute("""INSERT INTO items (title, description, price, category, condition,
+                                           seller_id, location, images, status)
+                        VALUES ('t', 'd', 1, 'Books', 'Good', 1, 'l',
+                                '["/static/images/lamp1.jpg"]', 'available')""")
+        conn.commit()
+        conn.close()
+
+        init_db.migrate_database(path)
+        conn = sqlite3.connect(path)
+        thumbnail = conn.execute(
+            "SELECT listing_json ->> '$.image_variants[0].thumbnail' FROM items"
+        ).fetchone()[0]
+        conn.close()
+        assert thumbnail == "/image-derivatives/thumbnail/lamp1.jpg.jpg"
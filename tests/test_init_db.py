@@ -0,0 +1,72 @@
+import sqlite3
+import pytest
+import init_db
+
+
+@pytest.fixture(scope="module")
+def seeded_db(tmp_path_factory):
+    """A small synthetic database built by the seeding CLI."""
+    path = str(tmp_path_factory.mktemp('seed') / 'seeded.db')
+    init_db.main(['--db', path, '--users', '50', '--items', '2000', '--requests', '3000'])
+    conn = sqlite3.connect(path)
+    yield conn
+    conn.close()
+
+
+class TestSeedDatabase:
+    """Test class for the synthetic data generator."""
+
+    def test_counts_and_skewed_distributions(self, seeded_db):
+        """Test row counts and that a few sellers and items dominate."""
+        counts = [seeded_db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                  for table in ('users', 'items', 'requests')]
+        assert counts == [50, 2000, 3000]
+
+        top_seller = seeded_db.execute(
+            'SELECT COUNT(*) FROM items GROUP BY seller_id ORDER BY 1 DESC LIMIT 1'
+        ).fetchone()[0]
+        hottest_item = seeded_db.execute(
+            'SELECT COUNT(*) FROM requests GROUP BY item_id ORDER BY 1 DESC LIMIT 1'
+        ).fetchone()[0]
+        assert top_seller > 5 * 2000 / 50
+        assert hottest_item > 20 * 3000 / 2000
+
+        statuses = dict(seeded_db.execute('SELECT status, COUNT(*) FROM requests GROUP BY 1'))
+        assert set(statuses) == {'pending', 'approved', 'rejected'}
+        assert seeded_db.execute(
+            'SELECT COUNT(*) FROM requests WHERE buyer_id = seller_id'
+        ).fetchone()[0] == 0
+        assert seeded_db.execute(
+            '''SELECT COUNT(*) FROM requests r JOIN items i ON i.id = r.item_id
+               WHERE r.seller_id != i.seller_id'''
+        ).fetchone()[0] == 0
+
+    def test_sold_items_match_approved_requests(self, seeded_db):
+        """Test exactly the items with an approved request are marked sold."""
+        sold = {row[0] for row in seeded_db.execute("SELECT id FROM items WHERE status = 'sold'")}
+        approved = {row[0] for row in seeded_db.execute(
+            "SELECT item_id FROM requests WHERE status = 'approved'"
+        )}
+        assert sold and sold == approved
+
+    def test_derived_schema_is_built_after_loading(self, seeded_db):
+        """Test indexes, search tables and listing JSON match what the triggers produce."""
+        names = {row[0] for row in seeded_db.execute('SELECT name FROM sqlite_master')}
+        assert {'idx_items_status_date_posted', 'items_fts', 'items_listing_json_update',
+                'data_versions'} <= names
+        assert seeded_db.execute(
+            "SELECT COUNT(*) FROM items_fts WHERE items_fts MATCH 'macbook'"
+        ).fetchone()[0] > 0
+
+        stored = dict(seeded_db.execute('SELECT id, listing_json FROM items'))
+        seeded_db.execute('UPDATE items SET listing_json = NULL')
+        init_db.create_preserialized_listings(seeded_db.cursor())
+        assert dict(seeded_db.execute('SELECT id, listing_json FROM items')) == stored
+        seeded_db.rollback()
+
+    def test_refuses_to_overwrite_existing_database(self, tmp_path):
+        """Test seeding never writes into an existing database."""
+        path = tmp_path / 'existing.db'
+        path.write_bytes(b'')
+        with pytest.raises(FileExistsError):
+            init_db.seed_database(str(path), 10, 10, 10)
@@ -1,5 +1,9 @@
+import json
+import sqlite3
 import requests
 import pytest
+from init_db import init_database, migrate_database
+from pagination import encode_cursor
 
 class TestListingsAPI:
     """Test class for listings API endpoints."""
@@ -48,4 +52,253 @@ class TestListingsAPI:
         
         response = requests.get(url)
         
-        assert True
\ No newline at end of file
+        assert True
+
+    def test_get_all_listings_keyset_pagination(self, api_base_url, make_user, make_listing):
+        """Test paging through the feed with limit and next_cursor."""
+        seller_id = make_user()
+        created = [make_listing(seller_id, title=f"Paged {n}")["id"] for n in range(5)]
+
+        seen = []
+        url = f"{api_base_url}/get-all-listings?limit=2"
+        next_url = url
+        while next_url:
+            body = requests.get(next_url).json()
+            assert len(body["listings"]) <= 2
+            seen.extend(listing["id"] for listing in body["listings"])
+            next_url = f"{url}&cursor={body['next_cursor']}" if body["next_cursor"] else None
+
+        assert len(seen) == len(set(seen))
+        mine = [listing_id for listing_id in seen if listing_id in created]
+        assert mine == sorted(created, reverse=True)
+
+    def test_get_all_listings_invalid_cursor(self, api_base_url):
+        """Test a malformed cursor or limit is rejected."""
+        response = requests.get(f"{api_base_url}/get-all-listings?cursor=not-a-cursor")
+        assert response.status_code == 400
+
+        response = requests.get(f"{api_base_url}/get-all-listings",
+                                params={"cursor": encode_cursor({"a": 1}, [2])})
+        assert response.status_code == 400
+
+        response = requests.get(f"{api_base_url}/get-all-listings?limit=0")
+        assert response.status_code == 400
+
+    def test_search_listings(self, api_base_url, make_user, make_listing):
+        """Test full-text search ranks and highlights matching listings."""
+        seller_id = make_user()
+        best = make_listing(seller_id, title="Zephyrcycle racing bike",
+                            description="Zephyrcycle frame, Zephyrcycle wheels")
+        other = make_listing(seller_id, title="Helmet", description="Fits a zephyrcycle")
+        make_listing(seller_id, title="Desk lamp", description="Bright")
+
+        body = requests.get(f"{api_base_url}/search-listings?q=zephyrcyc").json()
+        ids = [listing["id"] for listing in body["listings"]]
+
+        assert ids == [best["id"], other["id"]]
+        assert "<mark>" in body["listings"][0]["snippet"]
+
+        first = requests.get(f"{api_base_url}/search-listings?q=zephyrcycle&limit=1").json()
+        assert [listing["id"] for listing in first["listings"]] == [best["id"]]
+        second = requests.get(
+            f"{api_base_url}/search-listings?q=zephyrcycle&limit=1&cursor={first['next_cursor']}"
+        ).json()
+        assert [listing["id"] for listing in second["listings"]] == [other["id"]]
+        assert second["next_cursor"] is None
+
+    def test_search_listings_requires_query(self, api_base_url):
+        """Test searching without any words is rejected."""
+        response = requests.get(f"{api_base_url}/search-listings?q=%22%20")
+        assert response.status_code == 400
+
+    def test_get_all_listings_etag(self, api_base_url, make_user, make_listing):
+        """Test polling with If-None-Match gets 304 until a listing is posted."""
+        url = f"{api_base_url}/get-all-listings?limit=5"
+        first = requests.get(url)
+        etag = first.headers["ETag"]
+        assert etag.startswith('W/')
+
+        unchanged = requests.get(url, headers={"If-None-Match": etag})
+        assert unchanged.status_code == 304
+        assert unchanged.content == b""
+
+        make_listing(make_user())
+        changed = requests.get(url, headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != etag
+
+    def test_get_my_listings_etag_is_per_seller(self, api_base_url, make_user, make_listing):
+        """Test a seller's ETag only changes when that seller's listings change."""
+        seller_id = make_user()
+        make_listing(seller_id)
+        url = f"{api_base_url}/get-my-listings?user_id={seller_id}"
+        etag = requests.get(url).headers["ETag"]
+
+        make_listing(make_user())
+        assert requests.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+        make_listing(seller_id)
+        assert requests.get(url, headers={"If-None-Match": etag}).status_code == 200
+
+    def test_post_listings_batch(self, api_base_url, make_user):
+        """Test a batch creates the valid listings and reports the rest by index."""
+        first_seller, second_seller = make_user(), make_user()
+        listing = {
+            "title": "Batch Listing", "description": "Posted in bulk", "price": 12.5,
+            "category": "Books", "condition": "Good", "location": "Library"
+        }
+        batch = [
+            {**listing, "seller_id": first_seller},
+            {**listing, "seller_id": 987654321},
+            {**listing, "seller_id": second_seller, "images": ["a.jpg"]},
+            {"title": "Incomplete"},
+            {**listing, "seller_id": first_seller, "price": "free"},
+            {**listing, "seller_id": first_seller, "title": "Batch Listing 2"},
+            {**listing, "seller_id": first_seller, "price": "inf"},
+            {**listing, "seller_id": first_seller, "price": True},
+        ]
+        response = requests.post(f"{api_base_url}/post-listings", json=batch)
+        assert response.status_code == 201
+        data = response.json()
+        assert [entry["index"] for entry in data["created"]] == [0, 2, 5]
+        assert [error["index"] for error in data["errors"]] == [1, 3, 4, 6, 7]
+        assert data["errors"][0]["error"] == "Seller 987654321 not found"
+
+        for entry in data["created"]:
+            item = requests.get(
+                f"{api_base_url}/get-item-listing?item_id={entry['id']}"
+            ).json()
+            assert item["seller_id"] == batch[entry["index"]]["seller_id"]
+            assert item["title"] == batch[entry["index"]]["title"]
+        assert len(requests.get(
+            f"{api_base_url}/get-my-listings?user_id={first_seller}"
+        ).json()["user_listings"]) == 2
+
+    def test_post_listings_rejects_bad_batches(self, api_base_url):
+        """Test non-arrays and batches without a valid listing are rejected."""
+        url = f"{api_base_url}/post-listings"
+        assert requests.post(url, json={"title": "not a list"}).status_code == 400
+        assert requests.post(url, json=[]).status_code == 400
+        response = requests.post(url, json=[{"title": "Incomplete"}])
+        assert response.status_code == 400
+        assert response.json()["created"] == []
+
+
+class TestListingSearchIndex:
+    """Test class for the items_fts triggers."""
+
+    def test_triggers_follow_item_writes(self, tmp_path):
+        """Test inserts, updates and deletes on items are mirrored in items_fts."""
+        db_path = str(tmp_path / 'search.db')
+        init_database(db_path)
+        conn = sqlite3.connect(db_path)
+
+        def matches(term):
+            return [row[0] for row in conn.execute(
+                'SELECT rowid FROM items_fts WHERE items_fts MATCH ?', (term,))]
+
+        conn.execute("INSERT INTO items (id, title, price, seller_id, location) "
+                     "VALUES (1, 'Oak table', 40, 1, 'North Campus')")
+        assert matches('oak') == [1]
+        assert matches('north') == [1]
+
+        conn.execute("UPDATE items SET title = 'Pine table' WHERE id = 1")
+        assert matches('oak') == []
+        assert matches('pine') == [1]
+
+        conn.execute("DELETE FROM items WHERE id = 1")
+        assert matches('pine') == []
+        conn.close()
+
+
+class TestPreserializedListings:
+    """Test class for the trigger-maintained items.listing_json."""
+
+    def test_listing_payload_shape(self, api_base_url, make_user, make_listing):
+        """Test the stored JSON carries every listing field with the right types."""
+        seller_id = make_user()
+        listing = make_listing(seller_id, price=12, images=["a.jpg", "b.jpg"])
+        assert listing["price"] == 12.0 and isinstance(listing["price"], float)
+        assert listing["images"] == ["a.jpg", "b.jpg"]
+        assert listing["seller_id"] == seller_id
+        assert listing["seller_name"].startswith("user_")
+        assert listing["status"] == "available"
+        assert listing["date_posted"]
+
+        item = requests.get(f"{api_base_url}/get-item-listing?item_id={listing['id']}").json()
+        assert item == listing
+        mine = requests.get(f"{api_base_url}/get-my-listings?user_id={seller_id}").json()
+        assert mine["user_listings"] == [listing]
+        assert mine["total_count"] == 1 and mine["user_id"] == seller_id
+
+    def test_triggers_rerender_on_writes(self, tmp_path):
+        """Test item and seller name changes re-render the stored JSON."""
+        db_path = str(tmp_path / 'render.db')
+        init_database(db_path)
+        conn = sqlite3.connect(db_path)
+        conn.execute("INSERT INTO users (id, username, email, password_hash) "
+                     "VALUES (1, 'alice', 'alice@example.com', 'x')")
+        conn.execute("INSERT INTO items (id, title, price, seller_id, images) "
+                     "VALUES (1, 'Chair', 15, 1, NULL)")
+
+        def rendered():
+            return json.loads(conn.execute(
+                'SELECT listing_json FROM items WHERE id = 1').fetchone()[0])
+
+        assert rendered()["seller_name"] == "alice"
+        assert rendered()["images"] == []
+
+        conn.execute("UPDATE items SET status = 'sold', price = 20 WHERE id = 1")
+        assert rendered()["status"] == "sold"
+        assert rendered()["price"] == 20.0
+
+        conn.execute("UPDATE users SET username = 'alice2' WHERE id = 1")
+        assert rendered()["seller_name"] == "alice2"
+        conn.close()
+
+    def test_rendering_bumps_versions_once(self, tmp_path):
+        """Test each item write counts as one change even with listing_json re-rendered."""
+        db_path = str(tmp_path / 'versions.db')
+        init_database(db_path)
+        conn = sqlite3.connect(db_path)
+        conn.execute("INSERT INTO users (id, username, email, password_hash) "
+                     "VALUES (1, 'carol', 'carol@example.com', 'x')")
+
+        def versions():
+            return dict(conn.execute('SELECT scope, version FROM data_versions'))
+
+        for n in range(5):
+            conn.execute("INSERT INTO items (title, price, seller_id) VALUES (?, 10, 1)",
+                         (f"Lamp {n}",))
+        assert versions() == {"items": 5, "items:1": 5}
+        conn.execute("UPDATE items SET price = 12 WHERE title = 'Lamp 0'")
+        conn.execute("UPDATE users SET username = 'carol2' WHERE id = 1")
+        assert versions() == {"items": 7, "items:1": 7}
+
+        # Databases migrated from the unconditional update trigger get the new one
+        conn.execute("DROP TRIGGER items_version_update")
+        conn.execute("""CREATE TRIGGER items_version_update AFTER UPDATE ON items BEGIN
+                            UPDATE data_versions SET version = version + 1;
+                        END""")
+        conn.commit()
+        migrate_database(db_path)
+        conn.execute("UPDATE items SET listing_json = NULL")
+        assert versions() == {"items": 7, "items:1": 7}
+        conn.close()
+
+    def test_migration_renders_missing_json(self, tmp_path):
+        """Test migrate_database fills in listing_json for rows written before it existed."""
+        db_path = str(tmp_path / 'backfill.db')
+        init_database(db_path)
+        conn = sqlite3.connect(db_path)
+        conn.execute("INSERT INTO users (id, username, email, password_hash) "
+                     "VALUES (1, 'bob', 'bob@example.com', 'x')")
+        conn.execute("INSERT INTO items (id, title, price, seller_id) VALUES (1, 'Desk', 30, 1)")
+        conn.execute("UPDATE items SET listing_json = NULL")
+        conn.commit()
+
+        migrate_database(db_path)
+
+        stored = conn.execute('SELECT listing_json FROM items WHERE id = 1').fetchone()[0]
+        assert json.loads(stored)["title"] == "Desk"
+        conn.close()
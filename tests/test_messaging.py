@@ -0,0 +1,112 @@
+import sqlite3
+import threading
+import time
+import pytest
+import requests
+import db
+
+
+@pytest.fixture
+def send_message(api_base_url):
+    """Send a direct message through the API and return the stored message."""
+    def _send_message(sender_id, recipient_id, text="Hello"):
+        response = requests.post(f"{api_base_url}/messages", json={
+            "sender_id": sender_id, "recipient_id": recipient_id, "text": text
+        })
+        assert response.status_code == 201
+        return response.json()["data"]
+    return _send_message
+
+
+def conversations(api_base_url, user_id):
+    """The /get-conversations body of user_id."""
+    return requests.get(f"{api_base_url}/get-conversations/{user_id}").json()
+
+
+class TestMessaging:
+    """Test class for direct messages, their history pages and unread counts."""
+
+    def test_history_pages_back_with_before(self, api_base_url, make_user, send_message):
+        """Test the newest page comes first and before= walks back without gaps."""
+        alice, bob = make_user(), make_user()
+        sent = [send_message(*((alice, bob) if n % 2 else (bob, alice)), text=f"m{n}")["id"]
+                for n in range(7)]
+        url = f"{api_base_url}/messages"
+
+        newest = requests.get(url, params={"user_id": alice, "to": bob, "limit": 3}).json()
+        assert [message["id"] for message in newest] == sent[4:]
+        assert newest[-1]["text"] == "m6" and newest[-1]["from"] == bob
+
+        seen = [message["id"] for message in newest]
+        while True:
+            page = requests.get(url, params={"user_id": bob, "to": alice, "limit": 3,
+                                             "before": seen[0]}).json()
+            if not page:
+                break
+            seen = [message["id"] for message in page] + seen
+        assert seen == sent
+
+        after = requests.get(url, params={"user_id": alice, "to": bob, "after": sent[4]}).json()
+        assert [message["id"] for message in after] == sent[5:]
+
+    def test_unread_counts_follow_sends_and_reads(self, api_base_url, make_user, send_message):
+        """Test unread counts grow on receipt and fall back as the reader catches up."""
+        seller, buyer = make_user(), make_user()
+        first = send_message(buyer, seller, "Is it available?")
+        send_message(buyer, seller, "I can pick it up today")
+
+        inbox = conversations(api_base_url, seller)
+        assert inbox["unread_total"] == 2
+        assert inbox["conversations"][0]["peer_id"] == buyer
+        assert inbox["conversations"][0]["last_message"]["text"] == "I can pick it up today"
+        assert conversations(api_base_url, buyer)["unread_total"] == 0
+
+        url = f"{api_base_url}/mark-messages-read"
+        partly = requests.post(url, json={"user_id": seller, "peer_id": buyer,
+                                          "last_read_id": first["id"]}).json()
+        assert partly == {"last_read_id": first["id"], "unread_count": 1}
+        assert requests.post(url, json={"user_id": seller, "peer_id": buyer}).json()[
+            "unread_count"] == 0
+
+        send_message(seller, buyer, "Yes, come by at 5")
+        assert conversations(api_base_url, buyer)["unread_total"] == 1
+        assert conversations(api_base_url, seller)["unread_total"] == 0
+
+    def test_long_poll_returns_when_a_message_arrives(self, api_base_url, make_user,
+                                                      send_message):
+        """Test a waiting fetch answers with the new message instead of sleeping out."""
+        alice, bob = make_user(), make_user()
+        last = send_message(alice, bob)["id"]
+        threading.Timer(0.3, send_message, (alice, bob, "Are you there?")).start()
+
+        started = time.monotonic()
+        arrived = requests.get(f"{api_base_url}/messages", params={
+            "user_id": bob, "to": alice, "after": last, "wait": 10
+        }).json()
+        assert time.monotonic() - started < 5
+        assert [message["text"] for message in arrived] == ["Are you there?"]
+
+    def test_messages_are_append_only(self, api_base_url, make_user, send_message):
+        """Test stored messages cannot be edited or deleted in the database."""
+        message = send_message(make_user(), make_user())
+        conn = sqlite3.connect(db.DB_PATH)
+        try:
+            with pytest.raises(sqlite3.IntegrityError, match="append-only"):
+                conn.execute("UPDATE messages SET body = 'edited' WHERE id = ?", (message["id"],))
+            with pytest.raises(sqlite3.IntegrityError, match="append-only"):
+                conn.execute("DELETE FROM messages WHERE id = ?", (message["id"],))
+        finally:
+            conn.close()
+
+    def test_rejects_unknown_users_and_bad_limits(self, api_base_url, make_user):
+        """Test phantom senders get 404 and limit=0 is out of range rather than the default."""
+        user_id = make_user()
+        response = requests.post(f"{api_base_url}/messages", json={
+            "sender_id": 987654321, "recipient_id": user_id, "text": "Hi"
+        })
+        assert response.status_code == 404
+        assert conversations(api_base_url, user_id)["conversations"] == []
+
+        response = requests.get(f"{api_base_url}/messages",
+                                params={"user_id": user_id, "to": make_user(), "limit": 0})
+        assert response.status_code == 400
@@ -0,0 +1,83 @@
+import requests
+import pytest
+
+
+@pytest.fixture
+def send_request(api_base_url):
+    """Send a purchase request through the API and return its id."""
+    def _send_request(item_id, buyer_id):
+        response = requests.post(f"{api_base_url}/send-request", json={
+            "item_id": item_id, "buyer_id": buyer_id
+        })
+        assert response.status_code == 201
+        return response.json()["request_id"]
+    return _send_request
+
+
+def request_statuses(api_base_url, seller_id):
+    """Map request id -> status for a seller's incoming requests."""
+    rows = requests.get(f"{api_base_url}/get-seller-requests/{seller_id}").json()["requests"]
+    return {row["id"]: row["status"] for row in rows}
+
+
+class TestModerateRequests:
+    """Test class for the bulk moderation endpoint."""
+
+    def test_approval_rejects_competitors_and_sells_item(self, api_base_url, make_user,
+                                                         make_listing, send_request):
+        """Test one call approves, rejects, auto-rejects competitors and sells the item."""
+        seller_id = make_user()
+        hot, other = make_listing(seller_id), make_listing(seller_id)
+        buyers = [make_user() for _ in range(3)]
+        winner, *losers = [send_request(hot["id"], buyer) for buyer in buyers]
+        declined, waiting = [send_request(other["id"], buyer) for buyer in buyers[:2]]
+
+        response = requests.post(f"{api_base_url}/moderate-requests", json={
+            "seller_id": seller_id, "approve": [winner], "reject": [declined]
+        })
+        assert response.status_code == 200
+        body = response.json()
+        assert body["auto_rejected"] == sorted(losers)
+        assert body["sold_items"] == [hot["id"]]
+
+        assert request_statuses(api_base_url, seller_id) == {
+            winner: "approved", losers[0]: "rejected", losers[1]: "rejected",
+            declined: "rejected", waiting: "pending"
+        }
+        item = requests.get(f"{api_base_url}/get-item-listing?item_id={hot['id']}").json()
+        assert item["status"] == "sold"
+
+        again = requests.post(f"{api_base_url}/moderate-requests", json={
+            "seller_id": seller_id, "approve": [losers[0]]
+        })
+        assert again.status_code == 409
+
+    def test_batch_is_all_or_nothing(self, api_base_url, make_user, make_listing,
+                                     send_request):
+        """Test a batch with any invalid decision changes nothing."""
+        seller_id, stranger_id = make_user(), make_user()
+        item = make_listing(seller_id)
+        mine = [send_request(item["id"], make_user()) for _ in range(2)]
+        theirs = send_request(make_listing(stranger_id)["id"], make_user())
+        url = f"{api_base_url}/moderate-requests"
+
+        forbidden = requests.post(url, json={
+            "seller_id": seller_id, "approve": [mine[0]], "reject": [theirs]
+        })
+        assert forbidden.status_code == 403
+        assert forbidden.json()["request_ids"] == [theirs]
+
+        missing = requests.post(url, json={"seller_id": seller_id, "reject": [mine[1], 0]})
+        assert missing.status_code == 404
+        assert missing.json()["request_ids"] == [0]
+
+        competing = requests.post(url, json={"seller_id": seller_id, "approve": mine})
+        assert competing.status_code == 409
+
+        both = requests.post(url, json={
+            "seller_id": seller_id, "approve": [mine[0]], "reject": [mine[0]]
+        })
+        assert both.status_code == 400
+        assert requests.post(url, json={"seller_id": seller_id}).status_code == 400
+
+        assert set(request_statuses(api_base_url, seller_id).values()) == {"pending"}
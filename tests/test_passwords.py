@@ -0,0 +1,131 @@
+import hashlib
+import threading
+import time
+import uuid
+import requests
+from flask import g
+import db
+import passwords
+import user
+
+
+class TestPasswordHashing:
+    """Test class for scrypt hashing and the bounded hashing pool."""
+
+    def test_hash_and_verify(self):
+        """Test hashes are salted scrypt and only the right password verifies."""
+        first = passwords.hash_password("correct horse")
+        second = passwords.hash_password("correct horse")
+        assert first.startswith("scrypt$") and first != second
+
+        assert passwords.verify_password("correct horse", first) == (True, False)
+        assert passwords.verify_password("wrong horse", first)[0] is False
+        assert passwords.verify_password("anything", "not-a-hash") == (False, False)
+
+    def test_login_upgrades_legacy_hash(self, api_base_url):
+        """Test a legacy SHA-256 hash still logs in and is replaced by scrypt."""
+        username = f"legacy_{uuid.uuid4().hex[:10]}"
+        legacy = hashlib.sha256(b"old-password").hexdigest()
+        conn = db.get_db_connection()
+        conn.execute(
+            "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
+            (username, f"{username}@example.com", legacy)
+        )
+        conn.commit()
+
+        url = f"{api_base_url}/login"
+        assert requests.post(url, json={"username": username,
+                                        "password": "wrong"}).status_code == 401
+        assert requests.post(url, json={"username": username,
+                                        "password": "old-password"}).status_code == 200
+
+        stored = conn.execute("SELECT password_hash FROM users WHERE username = ?",
+                              (username,)).fetchone()[0]
+        conn.close()
+        assert stored.startswith("scrypt$")
+        assert requests.post(url, json={"username": username,
+                                        "password": "old-password"}).status_code == 200
+
+    def test_full_queue_answers_503(self, flask_app, monkeypatch):
+        """Test hashing calls beyond workers + queue limit fail fast with 503."""
+        hasher = passwords.PasswordHasher(workers=1, queue_limit=0)
+        monkeypatch.setattr(user, "password_hasher", hasher)
+        release = threading.Event()
+        blocker = threading.Thread(target=hasher.run, args=(release.wait,))
+        blocker.start()
+        try:
+            while hasher._in_flight == 0:
+                time.sleep(0.01)
+            username = f"busy_{uuid.uuid4().hex[:10]}"
+            response = flask_app.test_client().post("/register", json={
+                "username": username, "email": f"{username}@example.com",
+                "password": "password123"
+            })
+            assert response.status_code == 503
+            assert response.headers["Retry-After"] == "1"
+        finally:
+            release.set()
+            blocker.join()
+            hasher.shutdown()
+
+    def test_hash_timeout_answers_503(self, flask_app, monkeypatch):
+        """Test a hash that outlives the timeout gets 503 rather than a server error."""
+        hasher = passwords.PasswordHasher(workers=1, queue_limit=1, timeout=0.05)
+        release = threading.Event()
+        monkeypatch.setattr(passwords, "hash_password", lambda _password: release.wait())
+        monkeypatch.setattr(user, "password_hasher", hasher)
+        try:
+            username = f"slow_{uuid.uuid4().hex[:10]}"
+            response = flask_app.test_client().post("/register", json={
+                "username": username, "email": f"{username}@example.com",
+                "password": "password123"
+            })
+            assert response.status_code == 503
+        finally:
+            release.set()
+            hasher.shutdown()
+
+    def test_no_connection_is_held_while_hashing(self, flask_app, monkeypatch):
+        """Test register and login give the pooled connection back before hashing."""
+        held = []
+
+        class CheckingHasher:
+            """Records whether the request still holds a connection on each call."""
+
+            def hash(self, password):
+                held.append("db_conn" in g)
+                return passwords.hash_password(password)
+
+            def verify(self, password, stored_hash):
+                held.append("db_conn" in g)
+                return passwords.verify_password(password, stored_hash)
+
+        monkeypatch.setattr(user, "password_hasher", CheckingHasher())
+        client = flask_app.test_client()
+        username = f"pool_{uuid.uuid4().hex[:10]}"
+        assert client.post("/register", json={
+            "username": username, "email": f"{username}@example.com", "password": "password123"
+        }).status_code == 201
+        assert client.post("/login", json={
+            "username": username, "password": "password123"
+        }).status_code == 200
+        assert held == [False, False]
+
+    def test_unknown_username_is_hashed_like_a_wrong_password(self, flask_app, monkeypatch):
+        """Test a login for a missing user still verifies one scrypt hash."""
+        checked = []
+
+        class CountingHasher:
+            """Records the stored hash each verify is made against."""
+
+            def verify(self, password, stored_hash):
+                checked.append(stored_hash)
+                return passwords.verify_password(password, stored_hash)
+
+        monkeypatch.setattr(user, "password_hasher", CountingHasher())
+        response = flask_app.test_client().post("/login", json={
+            "username": f"nobody_{uuid.uuid4().hex[:10]}", "password": "password123"
+        })
+        assert response.status_code == 401
+        assert checked == [passwords.dummy_hash()]
+        assert checked[0].startswith(f"scrypt${passwords.SCRYPT_COST}$")
@@ -0,0 +1,95 @@
+import random
+import sqlite3
+import uuid
+import requests
+import db
+import init_db
+
+
+def price_stats(api_base_url, category):
+    """The /get-price-stats body of category."""
+    return requests.get(f"{api_base_url}/get-price-stats", params={"category": category}).json()
+
+
+class TestPriceStats:
+    """Test class for the trigger-maintained category price summaries."""
+
+    def test_summary_tracks_listings_within_sketch_accuracy(self, api_base_url, make_user,
+                                                           make_listing):
+        """Test quantiles stay near the exact ones and sold listings drop out."""
+        category = f"Prices {uuid.uuid4().hex}"
+        assert price_stats(api_base_url, category)["count"] == 0
+
+        seller = make_user()
+        rng = random.Random(7)
+        prices = sorted(round(rng.lognormvariate(3, 1), 2) for _ in range(40))
+        listings = [make_listing(seller, category=category, price=price) for price in prices]
+
+        stats = price_stats(api_base_url, category)
+        assert stats["count"] == len(prices)
+        assert stats["mean"] == round(sum(prices) / len(prices), 2)
+        for name, fraction in (("min", 0), ("median", 0.5), ("p90", 0.9), ("max", 1)):
+            exact = prices[int(fraction * (len(prices) - 1))]
+            assert abs(stats[name] - exact) <= exact * stats["relative_accuracy"] + 0.01
+
+        conn = sqlite3.connect(db.DB_PATH)
+        with conn:
+            conn.execute("UPDATE items SET status = 'sold' WHERE id = ?", (listings[-1]["id"],))
+        conn.close()
+        stats = price_stats(api_base_url, category)
+        assert stats["count"] == len(prices) - 1
+        assert abs(stats["max"] - prices[-2]) <= prices[-2] * stats["relative_accuracy"] + 0.01
+
+    def test_non_finite_prices_are_refused(self, api_base_url, make_user, make_listing):
+        """Test "inf" and "nan" prices get a 400 and a stored one cannot break the summary."""
+        category = f"Prices {uuid.uuid4().hex}"
+        seller = make_user()
+        for price in ("inf", "nan", "-inf"):
+            response = requests.post(f"{api_base_url}/post-listing", json={
+                "title": "Priceless", "description": "Not for sale", "price": price,
+                "category": category, "condition": "Good", "seller_id": seller,
+                "location": "Nowhere"
+            })
+            assert response.status_code == 400
+        assert price_stats(api_base_url, category)["count"] == 0
+
+        # A row written before prices were validated
+        make_listing(seller, category=category, price=10)
+        conn = sqlite3.connect(db.DB_PATH)
+        with conn:
+            bad_id = conn.execute(
+                """INSERT INTO items (title, description, price, category, condition,
+                                      seller_id, location, images, status)
+                   VALUES ('Priceless', '', ?, ?, 'Good', ?, '', '[]', 'available')""",
+                (float("inf"), category, seller)
+            ).lastrowid
+        try:
+            response = requests.get(f"{api_base_url}/get-price-stats",
+                                    params={"category": category})
+            assert response.status_code == 200
+            assert response.json()["count"] == 2 and response.json()["min"] < 11
+        finally:
+            # Other tests read the whole feed, which cannot carry an infinite price
+            with conn:
+                conn.execute("DELETE FROM items WHERE id = ?", (bad_id,))
+            conn.close()
+
+    def test_backfill_matches_triggers(self, tmp_path):
+        """Test summaries filled on creation equal those the triggers maintain."""
+        path = str(tmp_path / "prices.db")
+        init_db.main(["--db", path, "--users", "20", "--items", "300", "--requests", "100"])
+        conn = sqlite3.connect(path)
+        backfilled = [conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2").fetchall()
+                      for table in ("category_price_stats", "category_price_sketch")]
+        assert backfilled[0]
+
+        # Re-insert every item into emptied summaries, one trigger run per row
+        conn.execute("CREATE TEMP TABLE saved_items AS SELECT * FROM items")
+        conn.execute("DELETE FROM items")
+        conn.execute("DELETE FROM category_price_stats")
+        conn.execute("DELETE FROM category_price_sketch")
+        conn.execute("INSERT INTO items SELECT * FROM saved_items")
+        maintained = [conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2").fetchall()
+                      for table in ("category_price_stats", "category_price_sketch")]
+        conn.close()
+        assert maintained == backfilled
@@ -0,0 +1,106 @@
+import sqlite3
+import pytest
+import db
+from init_db import INDEXES, init_database, migrate_database
+
+
+@pytest.fixture
+def traced_client(flask_app, tmp_path):
+    """Test client on a seeded database that records every SQL statement run."""
+    db_path = str(tmp_path / 'plans.db')
+    init_database(db_path)
+
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        'INSERT INTO users (id, username, email, password_hash) VALUES (?, ?, ?, ?)',
+        [(n, f'user{n}', f'user{n}@example.com', 'x') for n in range(1, 4)]
+    )
+    conn.executemany(
+        'INSERT INTO items (id, title, price, seller_id, status) VALUES (?, ?, ?, ?, ?)',
+        [(n, f'Item {n}', 10, 1, 'available') for n in range(1, 4)]
+    )
+    conn.executemany(
+        'INSERT INTO requests (item_id, buyer_id, seller_id, status) VALUES (?, ?, ?, ?)',
+        [(1, 2, 1, 'pending'), (2, 2, 1, 'approved'), (3, 3, 1, 'rejected')]
+    )
+    conn.commit()
+    conn.close()
+
+    statements = []
+    pool = db.configure_pool(db_path, 1)
+    pooled = pool.acquire()
+    pooled.set_trace_callback(statements.append)
+    pool.release(pooled)
+
+    yield flask_app.test_client(), statements, db_path
+
+    pooled.set_trace_callback(None)
+    db.configure_pool(db.DB_PATH)
+
+
+def full_scans(db_path, statements):
+    """Return the plan lines of every traced SELECT that scans a whole table.
+
+    Walking a partial index (e.g. only pending requests) is not a full scan.
+    """
+    conn = sqlite3.connect(db_path)
+    partial_indexes = {
+        row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND sql LIKE '% WHERE %'"
+        )
+    }
+    scans = []
+    for sql in statements:
+        if not sql.lstrip().upper().startswith('SELECT'):
+            continue
+        for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}'):
+            detail = row[3]
+            if not detail.startswith('SCAN'):
+                continue
+            if 'INDEX ' in detail and detail.split('INDEX ')[1].split()[0] in partial_indexes:
+                continue
+            scans.append((sql, detail))
+    conn.close()
+    return scans
+
+
+class TestRequestsQueryPlans:
+    """EXPLAIN QUERY PLAN checks for the requests table hot paths."""
+
+    @pytest.mark.parametrize('method,url,body', [
+        ('get', '/get-seller-requests/1', None),
+        ('get', '/get-buyer-requests/2', None),
+        ('get', '/get-buyer-requests/2?status=pending', None),
+        ('get', '/get-incoming-requests', None),
+        ('get', '/get-approved-requests', None),
+        ('post', '/send-request', {'item_id': 1, 'buyer_id': 2, 'message': 'hi'}),
+    ])
+    def test_endpoint_uses_indexes(self, traced_client, method, url, body):
+        """Test the endpoint's queries never fall back to a full table scan."""
+        client, statements, db_path = traced_client
+        response = getattr(client, method)(url, json=body)
+        assert response.status_code < 500
+
+        selects = [sql for sql in statements if 'requests' in sql]
+        assert selects
+        assert full_scans(db_path, statements) == []
+
+    def test_migration_adds_indexes_to_existing_database(self, tmp_path):
+        """Test migrate_database backfills the indexes on an older database file."""
+        db_path = str(tmp_path / 'old.db')
+        init_database(db_path)
+        conn = sqlite3.connect(db_path)
+        for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'"
+        ).fetchall():
+            conn.execute(f'DROP INDEX {name}')
+        conn.commit()
+
+        migrate_database(db_path)
+        migrate_database(db_path)
+
+        names = {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'"
+        )}
+        conn.close()
+        assert len(names) == len(INDEXES)
@@ -0,0 +1,67 @@
+import uuid
+import requests
+import pytest
+
+class TestRequestsAPI:
+    """Test class for requests API endpoints."""
+
+    def test_search_requests_by_substring(self, api_base_url, make_user, make_listing):
+        """Test search matches item titles and requester names anywhere in the text."""
+        tag = uuid.uuid4().hex[:8]
+        seller_id = make_user()
+        buyer_id = make_user(f"buyer_{tag}_name")
+        item = make_listing(seller_id, title=f"Vintage {tag} Camera")
+
+        response = requests.post(f"{api_base_url}/send-request", json={
+            "item_id": item["id"], "buyer_id": buyer_id, "message": "Still available?"
+        })
+        assert response.status_code == 201
+        request_id = response.json()["request_id"]
+
+        by_title = requests.get(f"{api_base_url}/search-requests?q={tag.upper()} cam").json()
+        assert [req["id"] for req in by_title] == [request_id]
+
+        by_buyer = requests.get(f"{api_base_url}/search-requests?q={tag}_na").json()
+        assert [req["id"] for req in by_buyer] == [request_id]
+
+        approved = requests.get(
+            f"{api_base_url}/search-requests?q={tag}&status=approved"
+        ).json()
+        assert approved == []
+
+    def test_search_requests_pagination(self, api_base_url, make_user, make_listing):
+        """Test results are limited and the next page is reachable via X-Next-Cursor."""
+        tag = uuid.uuid4().hex[:8]
+        seller_id = make_user()
+        buyer_id = make_user()
+        request_ids = []
+        for n in range(3):
+            item = make_listing(seller_id, title=f"{tag} lot {n}")
+            response = requests.post(f"{api_base_url}/send-request", json={
+                "item_id": item["id"], "buyer_id": buyer_id
+            })
+            request_ids.append(response.json()["request_id"])
+
+        url = f"{api_base_url}/search-requests?q={tag}&limit=2"
+        first = requests.get(url)
+        assert [req["id"] for req in first.json()] == request_ids[:0:-1]
+        cursor = first.headers["X-Next-Cursor"]
+
+        second = requests.get(f"{url}&cursor={cursor}")
+        assert [req["id"] for req in second.json()] == request_ids[:1]
+        assert "X-Next-Cursor" not in second.headers
+
+        bad = requests.get(f"{api_base_url}/search-requests?limit=500")
+        assert bad.status_code == 400
+
+    def test_get_incoming_requests_etag(self, api_base_url, make_user, make_listing):
+        """Test incoming requests answer 304 until a request is sent."""
+        url = f"{api_base_url}/get-incoming-requests"
+        etag = requests.get(url).headers["ETag"]
+        assert requests.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+        item = make_listing(make_user())
+        requests.post(f"{api_base_url}/send-request", json={
+            "item_id": item["id"], "buyer_id": make_user()
+        })
+        assert requests.get(url, headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,92 @@
+import signal
+import socket
+import sqlite3
+import threading
+import time
+import requests
+from flask import Flask
+import db
+import events
+import serve
+from benchmarks import bench_api
+from test_events import read_event
+
+
+class TestPreforkServer:
+    """Test class for the production multi-worker launcher."""
+
+    def test_drain_finishes_in_flight_requests(self):
+        """Test shutdown stops accepting but lets a running request complete."""
+        app = Flask(__name__)
+        started = threading.Event()
+
+        @app.route('/slow')
+        def slow():
+            started.set()
+            time.sleep(0.3)
+            return 'done'
+
+        sock = serve.bind_socket('127.0.0.1', 0)
+        server = serve.PooledWSGIServer(app, sock, threads=2)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        address = sock.getsockname()[:2]
+        url = f"http://127.0.0.1:{address[1]}/slow"
+
+        results = []
+        client = threading.Thread(target=lambda: results.append(
+            requests.get(url, headers={"Connection": "close"})
+        ))
+        client.start()
+        assert started.wait(5)
+        server.shutdown()
+        assert server.drain(timeout=5)
+        client.join()
+        sock.close()
+
+        assert results[0].status_code == 200 and results[0].text == 'done'
+        with socket.socket() as probe:
+            assert probe.connect_ex(address) != 0
+
+    def test_event_streams_do_not_hold_request_threads(self, flask_app):
+        """Test open /request-events streams leave the only request thread free and still get events."""
+        sock = serve.bind_socket('127.0.0.1', 0)
+        server = serve.PooledWSGIServer(flask_app, sock, threads=1)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+        seller_id = 10 ** 9 + 1
+        streams = [requests.get(f"{base_url}/request-events", params={"seller_id": seller_id},
+                                stream=True, timeout=10) for _ in range(3)]
+        try:
+            lines = [stream.iter_lines(decode_unicode=True) for stream in streams]
+            for stream_lines in lines:
+                assert next(stream_lines).startswith("retry: ")
+            assert requests.get(f"{base_url}/", timeout=5).status_code == 200
+
+            conn = sqlite3.connect(db.DB_PATH)
+            with conn:
+                events.record_request_events(conn, seller_id, [
+                    ("request-created", {"request_id": 9})
+                ])
+            conn.close()
+            for stream_lines in lines:
+                assert read_event(stream_lines) == ("request-created", {"request_id": 9})
+        finally:
+            for stream in streams:
+                stream.close()
+            server.shutdown()
+            sock.close()
+
+    def test_graceful_restart_and_sigterm(self, tmp_path):
+        """Test SIGHUP swaps workers without failed requests and SIGTERM exits cleanly."""
+        process, base_url = bench_api.serve_prefork(str(tmp_path / 'serve.db'), workers=2)
+        try:
+            assert requests.get(f"{base_url}/").status_code == 200
+
+            process.send_signal(signal.SIGHUP)
+            deadline = time.monotonic() + 2
+            while time.monotonic() < deadline:
+                response = requests.get(f"{base_url}/get-all-listings?limit=5")
+                assert response.status_code == 200
+        finally:
+            process.send_signal(signal.SIGTERM)
+            assert process.wait(timeout=30) == 0
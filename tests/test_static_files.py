@@ -0,0 +1,87 @@
+import io
+import os
+import socket
+import threading
+import pytest
+import requests
+import images
+import serve
+import uploads
+
+
+def read_image(name):
+    """Bytes of one of the bundled listing images."""
+    with open(os.path.join(images.IMAGE_DIR, name), 'rb') as image:
+        return image.read()
+
+
+@pytest.fixture
+def pooled_server(flask_app):
+    """The production worker server (with sendfile) on a free port."""
+    sock = serve.bind_socket('127.0.0.1', 0)
+    server = serve.PooledWSGIServer(flask_app, sock, threads=2)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{sock.getsockname()[1]}"
+    server.shutdown()
+    server.drain(timeout=5)
+    sock.close()
+
+
+class TestImageServing:
+    """Test class for conditional, ranged and cacheable image responses."""
+
+    def test_bundled_image_revalidates_and_serves_ranges(self, api_base_url):
+        """Test ETag and Last-Modified revalidation and byte ranges on bundled images."""
+        url = f"{api_base_url}/static/images/bike1.jpg"
+        photo = read_image("bike1.jpg")
+
+        response = requests.get(url)
+        assert response.status_code == 200 and response.content == photo
+        assert response.headers["Accept-Ranges"] == "bytes"
+        assert response.headers["Cache-Control"] == f"public, max-age={images.IMAGE_MAX_AGE}"
+
+        assert requests.get(url, headers={
+            "If-None-Match": response.headers["ETag"]
+        }).status_code == 304
+        assert requests.get(url, headers={
+            "If-Modified-Since": response.headers["Last-Modified"]
+        }).status_code == 304
+
+        ranged = requests.get(url, headers={"Range": "bytes=100-199"})
+        assert ranged.status_code == 206
+        assert ranged.content == photo[100:200]
+        assert ranged.headers["Content-Range"] == f"bytes 100-199/{len(photo)}"
+        unsatisfiable = requests.get(url, headers={"Range": f"bytes={len(photo)}-"})
+        assert unsatisfiable.status_code == 416
+
+    def test_uploaded_images_are_immutable(self, flask_app, tmp_path, monkeypatch):
+        """Test content-addressed uploads are cached for a year without revalidation."""
+        monkeypatch.setattr(images, 'UPLOAD_DIR', str(tmp_path))
+        monkeypatch.setattr(uploads, 'INCOMING_DIR', str(tmp_path / 'incoming'))
+        client = flask_app.test_client()
+        url = client.post("/upload-image", data={
+            "image": (io.BytesIO(read_image("lamp1.jpg")), "lamp.jpg")
+        }).get_json()["url"]
+
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+        response.close()
+
+    def test_worker_server_uses_sendfile(self, pooled_server, monkeypatch):
+        """Test the production server copies file bodies with sendfile, ranges included."""
+        sent = []
+        original = socket.socket.sendfile
+
+        def spy(sock, file, offset=0, count=None):
+            sent.append((offset, count))
+            return original(sock, file, offset, count)
+
+        monkeypatch.setattr(socket.socket, 'sendfile', spy)
+        photo = read_image("macbook1.jpg")
+        url = f"{pooled_server}/static/images/macbook1.jpg"
+
+        assert requests.get(url).content == photo
+        ranged = requests.get(url, headers={"Range": "bytes=-500"})
+        assert ranged.status_code == 206 and ranged.content == photo[-500:]
+        assert sent == [(0, len(photo)), (len(photo) - 500, 500)]
@@ -0,0 +1,46 @@
+import requests
+import pytest
+import streaming
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    """Force several fetchmany batches even for a handful of rows."""
+    monkeypatch.setattr(streaming, 'STREAM_BATCH_SIZE', 2)
+
+
+class TestStreamingResponses:
+    """Test class for the ?stream=1 mode of the list endpoints."""
+
+    def test_streamed_feed_matches_buffered_feed(self, api_base_url, make_user, make_listing,
+                                                 small_batches):
+        """Test the streamed feed has the same body, paging included."""
+        seller_id = make_user()
+        for n in range(5):
+            make_listing(seller_id, title=f"Streamed {n}")
+
+        for query in ("limit=3", "limit=2", ""):
+            url = f"{api_base_url}/get-all-listings?{query}"
+            buffered = requests.get(url).json()
+            streamed = requests.get(f"{url}&stream=1")
+            assert "Content-Length" not in streamed.headers
+            assert streamed.json() == buffered
+
+    def test_streamed_request_lists_match(self, api_base_url, make_user, make_listing,
+                                          small_batches):
+        """Test seller, buyer and search request lists stream the same data."""
+        seller_id = make_user()
+        buyer_id = make_user()
+        for n in range(3):
+            item = make_listing(seller_id, title=f"Streamable {n}")
+            requests.post(f"{api_base_url}/send-request", json={
+                "item_id": item["id"], "buyer_id": buyer_id
+            })
+
+        for path in (f"get-seller-requests/{seller_id}?", f"get-buyer-requests/{buyer_id}?",
+                     "search-requests?q=streamable&limit=2&"):
+            url = f"{api_base_url}/{path}"
+            assert requests.get(f"{url}stream=1").json() == requests.get(url).json()
+
+        everything = requests.get(f"{api_base_url}/search-requests?q=streamable&stream=1")
+        assert len(everything.json()) == 3
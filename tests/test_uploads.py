@@ -0,0 +1,86 @@
+import hashlib
+import io
+import os
+import pytest
+import requests
+import images
+import uploads
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    """Store uploads (and their renditions) in throwaway directories."""
+    monkeypatch.setattr(images, 'UPLOAD_DIR', str(tmp_path / 'uploads'))
+    monkeypatch.setattr(uploads, 'INCOMING_DIR', str(tmp_path / 'uploads' / 'incoming'))
+    monkeypatch.setattr(images, 'IMAGE_CACHE_DIR', str(tmp_path / 'cache'))
+    return tmp_path / 'uploads'
+
+
+def read_image(name):
+    """Bytes of one of the bundled listing images."""
+    with open(os.path.join(images.IMAGE_DIR, name), 'rb') as image:
+        return image.read()
+
+
+def stored_files(upload_dir):
+    """Every file under the upload directory, temporary ones included."""
+    return [path for path in upload_dir.rglob('*') if path.is_file()]
+
+
+class TestImageUploads:
+    """Test class for the streaming, deduplicating image upload endpoint."""
+
+    def test_upload_is_content_addressed_and_deduplicated(self, api_base_url, upload_dir,
+                                                          make_user, make_listing):
+        """Test identical uploads share one stored file and its id works in listings."""
+        photo = read_image("lamp1.jpg")
+        first = requests.post(f"{api_base_url}/upload-image",
+                              files={"image": ("lamp.jpg", photo, "image/jpeg")})
+        assert first.status_code == 201
+        body = first.json()
+        image_id = hashlib.sha256(photo).hexdigest() + ".jpg"
+        assert body["image_id"] == image_id and body["size"] == len(photo)
+        assert not body["deduplicated"]
+
+        again = requests.post(f"{api_base_url}/upload-image",
+                              files={"image": ("copy.jpeg", photo, "image/jpeg")})
+        assert again.status_code == 200 and again.json()["deduplicated"]
+        assert again.json()["image_id"] == image_id
+        assert len(stored_files(upload_dir)) == 1
+
+        served = requests.get(f"{api_base_url}{body['url']}")
+        assert served.status_code == 200 and served.content == photo
+
+        listing = make_listing(make_user(), images=[image_id])
+        assert listing["images"] == [f"/images/{image_id}"]
+        thumbnail = listing["image_variants"][0]["thumbnail"]
+        assert thumbnail == f"/image-derivatives/thumbnail/{image_id}.jpg"
+        assert requests.get(f"{api_base_url}{thumbnail}").status_code == 200
+
+    def test_size_limit_is_enforced_before_and_while_reading(self, flask_app, upload_dir,
+                                                             monkeypatch):
+        """Test oversized bodies are refused up front and oversized parts mid-stream."""
+        monkeypatch.setattr(uploads, 'MAX_UPLOAD_BYTES', 1000)
+        client = flask_app.test_client()
+
+        declared = client.post("/upload-image", data={
+            "image": (io.BytesIO(read_image("bike1.jpg")), "bike.jpg")
+        })
+        assert declared.status_code == 413
+
+        streamed = client.post("/upload-image", data={
+            "image": (io.BytesIO(read_image("lamp1.jpg")), "lamp.jpg")
+        })
+        assert streamed.status_code == 413
+        assert not stored_files(upload_dir)
+
+    def test_rejects_non_images_and_missing_parts(self, flask_app, upload_dir):
+        """Test non-image files, missing parts and non-multipart bodies are refused."""
+        client = flask_app.test_client()
+
+        text = client.post("/upload-image", data={"image": (io.BytesIO(b"hello"), "a.jpg")})
+        assert text.status_code == 415
+        missing = client.post("/upload-image", data={"photo": (io.BytesIO(b"x"), "a.jpg")})
+        assert missing.status_code == 400
+        assert client.post("/upload-image", json={"image": "a.jpg"}).status_code == 400
+        assert not stored_files(upload_dir)